@@ -61,6 +61,9 @@ class ClickhouseCheck(AgentCheck):
         self._query_manager.execute()
         self.collect_version()
 
+    def cancel(self):
+        self._query_manager.close()
+
     def collect_version(self):
         version = list(self.execute_query_raw('SELECT version()'))[0][0]
 
@@ -57,6 +57,14 @@ def test_error_query(instance):
     check.log.error.assert_any_call('Error querying %s: %s', 'system.metrics', mock.ANY)
 
 
+def test_cancel(instance):
+    check = ClickhouseCheck('clickhouse', {}, [instance])
+    check._query_manager = mock.MagicMock()
+
+    check.cancel()
+    check._query_manager.close.assert_called_once_with()
+
+
 @pytest.mark.parametrize(
     'metrics, ignored_columns, metric_source_url',
     [
@@ -23,6 +23,7 @@ from ..utils.http import RequestsWrapper
 from ..utils.limiter import Limiter
 from ..utils.metadata import MetadataManager
 from ..utils.proxy import config_proxy_skip
+from ..utils.tag_cache import TagCache
 
 try:
     import datadog_agent
@@ -54,6 +55,24 @@ if datadog_agent.get_config('disable_unsafe_yaml'):
 # Metric types for which it's only useful to submit once per set of tags
 ONE_PER_CONTEXT_METRIC_TYPES = [aggregator.GAUGE, aggregator.RATE, aggregator.MONOTONIC_COUNT]
 
+# Metric types that can be submitted with `submit_batch`, by the name of their submission method
+BATCH_METRIC_TYPES = {
+    'gauge': aggregator.GAUGE,
+    'count': aggregator.COUNT,
+    'monotonic_count': aggregator.MONOTONIC_COUNT,
+    'rate': aggregator.RATE,
+    'histogram': aggregator.HISTOGRAM,
+    'historate': aggregator.HISTORATE,
+}
+
+# Metrics reporting the number of contexts of the metrics with the highest cardinality, see `cardinality_top_n`
+CARDINALITY_METRIC = 'datadog.integration.metric_contexts'
+CARDINALITY_DROPPED_METRIC = 'datadog.integration.metric_contexts.dropped'
+
+# Metrics reporting the hits and misses of the tag cache, see `tag_cache_size`
+TAG_CACHE_HITS_METRIC = 'datadog.integration.tag_cache.hits'
+TAG_CACHE_MISSES_METRIC = 'datadog.integration.tag_cache.misses'
+
 
 class __AgentCheck(object):
     """The base class for any Agent based integrations.
@@ -65,6 +84,13 @@ class __AgentCheck(object):
         sets of tags for other metric types. The first N sets of tags in submission order will
         be sent to the aggregator, the rest are dropped. The state is reset after each run.
         See https://github.com/DataDog/integrations-core/pull/2093 for more informations.
+        Instances can also set budgets of contexts per metric name with `metric_context_budgets`,
+        and of distinct values per tag key with `tag_value_budgets`. With `cardinality_top_n`, the
+        number of contexts of the N metrics with the most contexts is reported every run.
+    :cvar DEFAULT_TAG_CACHE_SIZE: allows to cache the normalized tags of up to this number of distinct
+        sets of tags, so that checks submitting the same sets of tags many times share a single
+        normalized copy of them. It can be overridden with the `tag_cache_size` instance option.
+        Its hits and misses are reported every run when the `telemetry` instance option is enabled.
     :ivar log: is a logger instance that prints to the Agent's main log file. You can set the
         log level in the Agent config file 'datadog.yaml'.
     """
@@ -102,6 +128,7 @@ class __AgentCheck(object):
     MULTIPLE_UNDERSCORE_CLEANUP = re.compile(br'__+')
     DOT_UNDERSCORE_CLEANUP = re.compile(br'_*\._*')
     DEFAULT_METRIC_LIMIT = 0
+    DEFAULT_TAG_CACHE_SIZE = 0
 
     def __init__(self, *args, **kwargs):
         """In general, you don't need to and you should not override anything from the base
@@ -140,6 +167,10 @@ class __AgentCheck(object):
         self.agentConfig = kwargs.get('agentConfig', {})
         self.warnings = []
         self.metric_limiter = None
+        self.tag_cache = None
+
+        # Names of the metrics with the most contexts at the last run that dropped some
+        self._cardinality_top_names = None
 
         if len(args) > 0:
             self.name = args[0]
@@ -226,8 +257,33 @@ class __AgentCheck(object):
                 )
         except Exception:
             metric_limit = self.DEFAULT_METRIC_LIMIT
-        if metric_limit > 0:
-            self.metric_limiter = Limiter(self.name, 'metrics', metric_limit, self.warning)
+
+        # Setup cardinality accounting, done by the metric limiter
+        instance = (self.instances[0] if self.instances else None) or {}
+        try:
+            self.cardinality_top_n = int(instance.get('cardinality_top_n', 0))
+        except Exception:
+            self.cardinality_top_n = 0
+        metric_context_budgets = instance.get('metric_context_budgets')
+        tag_value_budgets = instance.get('tag_value_budgets')
+        if metric_limit > 0 or metric_context_budgets or tag_value_budgets or self.cardinality_top_n > 0:
+            self.metric_limiter = Limiter(
+                self.name,
+                'metrics',
+                metric_limit,
+                self.warning,
+                name_budgets=metric_context_budgets,
+                tag_budgets=tag_value_budgets,
+            )
+
+        # Setup tag cache
+        try:
+            tag_cache_size = int(self.instances[0].get('tag_cache_size', self.DEFAULT_TAG_CACHE_SIZE))
+        except Exception:
+            tag_cache_size = self.DEFAULT_TAG_CACHE_SIZE
+        if tag_cache_size > 0:
+            self.tag_cache = TagCache(tag_cache_size)
+        self.tag_cache_telemetry = is_affirmative(instance.get('telemetry', False))
 
         # Functions that will be called exactly once (if successful) before the first check run
         self.check_initializations = deque([self.send_config_metadata])
@@ -286,8 +342,41 @@ class __AgentCheck(object):
 
         return config_proxy_skip(proxies, uri, skip)
 
+    def _report_cardinality(self):
+        limiter = self.metric_limiter
+
+        if limiter.reached_limit or limiter.rejected:
+            top = limiter.top(5)
+            message = 'Metrics with the most contexts this run: %s'
+            details = ', '.join(
+                '{} ({} sent, {} dropped)'.format(name, accepted, rejected) for name, accepted, rejected in top
+            )
+
+            # Only warn when the culprits change, not at every run
+            names = [name for name, _, _ in top]
+            if names != self._cardinality_top_names:
+                self._cardinality_top_names = names
+                self.warning(message, details)
+            else:
+                self.log.debug(message, details)
+        else:
+            self._cardinality_top_names = None
+
+        for name, accepted, rejected in limiter.top(self.cardinality_top_n):
+            tags = ['metric_name:{}'.format(name)]
+            aggregator.submit_metric(self, self.check_id, aggregator.GAUGE, CARDINALITY_METRIC, accepted, tags, '')
+            aggregator.submit_metric(
+                self, self.check_id, aggregator.GAUGE, CARDINALITY_DROPPED_METRIC, rejected, tags, ''
+            )
+
+    def _report_tag_cache(self):
+        hits, misses = self.tag_cache.flush_stats()
+        if self.tag_cache_telemetry:
+            aggregator.submit_metric(self, self.check_id, aggregator.COUNT, TAG_CACHE_HITS_METRIC, hits, [], '')
+            aggregator.submit_metric(self, self.check_id, aggregator.COUNT, TAG_CACHE_MISSES_METRIC, misses, [], '')
+
     def _context_uid(self, mtype, name, tags=None, hostname=None):
-        return '{}-{}-{}-{}'.format(mtype, name, tags if tags is None else hash(frozenset(tags)), hostname)
+        return hash((mtype, name, tags if tags is None else frozenset(tags), hostname))
 
     def submit_histogram_bucket(self, name, value, lower_bound, upper_bound, monotonic, hostname, tags):
         if value is None:
@@ -323,15 +412,16 @@ class __AgentCheck(object):
         if hostname is None:
             hostname = ''
 
+        name = self._format_namespace(name, raw)
         if self.metric_limiter:
             if mtype in ONE_PER_CONTEXT_METRIC_TYPES:
                 # Fast path for gauges, rates, monotonic counters, assume one set of tags per call
-                if self.metric_limiter.is_reached():
+                if self.metric_limiter.is_reached(name=name, tags=tags):
                     return
             else:
                 # Other metric types have a legit use case for several calls per set of tags, track unique sets of tags
                 context = self._context_uid(mtype, name, tags, hostname)
-                if self.metric_limiter.is_reached(context):
+                if self.metric_limiter.is_reached(context, name, tags):
                     return
 
         try:
@@ -345,7 +435,93 @@ class __AgentCheck(object):
             self.warning(err_msg)
             return
 
-        aggregator.submit_metric(self, self.check_id, mtype, self._format_namespace(name, raw), value, tags, hostname)
+        aggregator.submit_metric(self, self.check_id, mtype, name, value, tags, hostname)
+
+    def submit_batch(self, method, name, samples, tags=None, hostname=None, raw=False):
+        """Submit several samples of the same metric at once.
+
+        The metric name is formatted, the shared tags and each distinct set of sample tags are normalized
+        and the metric limit is checked once per batch rather than once per sample, which is much cheaper
+        for checks submitting many samples of the same metric.
+
+        :param str method: the submission method, one of ``gauge``, ``count``, ``monotonic_count``,
+            ``rate``, ``histogram`` or ``historate``.
+        :param str name: the name of the metric.
+        :param samples: an iterable of ``(value, tags)`` or ``(value, tags, hostname)`` tuples. The tags
+            of each sample are added to the shared ``tags``.
+        :param list tags: (optional) a list of tags to associate with every sample.
+        :param str hostname: (optional) a hostname to associate with samples that do not define one.
+            Defaults to the current host.
+        :param bool raw: (optional) whether to ignore any defined namespace prefix
+        """
+        mtype = BATCH_METRIC_TYPES.get(method)
+        if mtype is None:
+            raise ValueError(
+                'Unknown submission method `{}`, must be one of: {}'.format(
+                    method, ' | '.join(sorted(BATCH_METRIC_TYPES))
+                )
+            )
+
+        shared_tags = tuple(self._normalize_tags_type(tags, metric_name=name))
+        if hostname is None:
+            hostname = ''
+        name = self._format_namespace(name, raw)
+
+        # Samples usually share a few distinct sets of tags, normalize each of them once per batch
+        batch_tags = {}
+        batch = []
+        for sample in samples:
+            value = sample[0]
+            if value is None:
+                # ignore metric sample
+                continue
+
+            try:
+                value = float(value)
+            except ValueError:
+                err_msg = 'Metric: {} has non float value: {}. Only float values can be submitted as metrics.'.format(
+                    repr(name), repr(value)
+                )
+                if using_stub_aggregator:
+                    raise ValueError(err_msg)
+                self.warning(err_msg)
+                continue
+
+            sample_tags = shared_tags
+            if len(sample) > 1 and sample[1]:
+                key = tuple(sample[1])
+                sample_tags = batch_tags.get(key)
+                if sample_tags is None:
+                    sample_tags = batch_tags[key] = shared_tags + tuple(
+                        self._normalize_tags_type(key, metric_name=name)
+                    )
+
+            sample_hostname = hostname
+            if len(sample) > 2 and sample[2] is not None:
+                sample_hostname = sample[2]
+
+            batch.append((value, sample_tags, sample_hostname))
+
+        limiter = self.metric_limiter
+        if limiter:
+            if mtype in ONE_PER_CONTEXT_METRIC_TYPES:
+                # Fast path for gauges, rates, monotonic counters, assume one set of tags per sample
+                if limiter.has_budgets:
+                    batch = [sample for sample in batch if not limiter.is_reached(name=name, tags=sample[1])]
+                else:
+                    del batch[limiter.accept(len(batch), name) :]
+            else:
+                # Other metric types have a legit use case for several calls per set of tags, track unique sets of tags
+                batch = [
+                    sample
+                    for sample in batch
+                    if not limiter.is_reached(self._context_uid(mtype, name, sample[1], sample[2]), name, sample[1])
+                ]
+
+        check_id = self.check_id
+        submit_metric = aggregator.submit_metric
+        for value, sample_tags, sample_hostname in batch:
+            submit_metric(self, check_id, mtype, name, value, sample_tags, sample_hostname)
 
     def gauge(self, name, value, tags=None, hostname=None, device_name=None, raw=False):
         """Sample a gauge metric.
@@ -530,12 +706,37 @@ class __AgentCheck(object):
             for hostname, source_map in external_tags:
                 new_tags.append((to_string(hostname), source_map))
                 for src_name, tags in iteritems(source_map):
-                    source_map[src_name] = self._normalize_tags_type(tags)
+                    source_map[src_name] = list(self._normalize_tags_type(tags))
             datadog_agent.set_external_tags(new_tags)
         except IndexError:
             self.log.exception('Unexpected external tags format: %s', external_tags)
             raise
 
+    def _normalize_tags_type(self, tags, device_name=None, metric_name=None):
+        """
+        Normalize tags contents and type:
+        - append `device_name` as `device:` tag
+        - normalize tags type
+        - doesn't mutate the passed list, returns a new list
+
+        When the tag cache is enabled, sets of tags that were already seen are not normalized again
+        and the same cached tuple is returned for all of them, so callers must not mutate the result.
+        """
+        if self.tag_cache is None or device_name or not tags:
+            return self._normalize_tags(tags, device_name, metric_name)
+
+        try:
+            key = tuple(tags)
+            normalized_tags = self.tag_cache.get(key)
+        except TypeError:
+            # Unhashable tags, skip the cache
+            return self._normalize_tags(tags, device_name, metric_name)
+
+        if normalized_tags is None:
+            normalized_tags = self.tag_cache.set(key, self._normalize_tags(key, None, metric_name))
+
+        return normalized_tags
+
     def convert_to_underscore_separated(self, name):
         """
         Convert from CamelCase to camel_case
@@ -640,6 +841,11 @@ class __AgentCheck(object):
     def check(self, instance):
         raise NotImplementedError
 
+    def _get_profiling_tags(self, instance):
+        tags = ['check_name:{}'.format(self.name), 'check_version:{}'.format(self.check_version)]
+        tags.extend(instance.get('__memory_profiling_tags', []))
+        return tags
+
     def run(self):
         try:
             while self.check_initializations:
@@ -656,6 +862,16 @@ class __AgentCheck(object):
                 from ..utils.agent.debug import enter_pdb
 
                 enter_pdb(self.check, line=self.init_config['set_breakpoint'], args=(instance,))
+            elif 'profile_cpu' in self.init_config:
+                from ..utils.agent.cpu import profile_cpu
+
+                metrics = profile_cpu(
+                    self.check, self.init_config, namespaces=self.check_id.split(':', 1), args=(instance,)
+                )
+
+                tags = self._get_profiling_tags(instance)
+                for m in metrics:
+                    self.gauge(m.name, m.value, tags=tags + m.tags, raw=True)
             elif 'profile_memory' in self.init_config or (
                 datadog_agent.tracemalloc_enabled() and should_profile_memory(datadog_agent, self.name)
             ):
@@ -665,8 +881,7 @@ class __AgentCheck(object):
                     self.check, self.init_config, namespaces=self.check_id.split(':', 1), args=(instance,)
                 )
 
-                tags = ['check_name:{}'.format(self.name), 'check_version:{}'.format(self.check_version)]
-                tags.extend(instance.get('__memory_profiling_tags', []))
+                tags = self._get_profiling_tags(instance)
                 for m in metrics:
                     self.gauge(m.name, m.value, tags=tags, raw=True)
             else:
@@ -677,7 +892,10 @@ class __AgentCheck(object):
             result = json.dumps([{'message': str(e), 'traceback': traceback.format_exc()}])
         finally:
             if self.metric_limiter:
+                self._report_cardinality()
                 self.metric_limiter.reset()
+            if self.tag_cache is not None:
+                self._report_tag_cache()
 
         return result
 
@@ -724,7 +942,7 @@ class __AgentCheckPy3(__AgentCheck):
                     return
 
         if event.get('tags'):
-            event['tags'] = self._normalize_tags_type(event['tags'])
+            event['tags'] = list(self._normalize_tags_type(event['tags']))
         if event.get('timestamp'):
             event['timestamp'] = int(event['timestamp'])
         if event.get('aggregation_key'):
@@ -735,13 +953,7 @@ class __AgentCheckPy3(__AgentCheck):
 
         aggregator.submit_event(self, self.check_id, event)
 
-    def _normalize_tags_type(self, tags, device_name=None, metric_name=None):
-        """
-        Normalize tags contents and type:
-        - append `device_name` as `device:` tag
-        - normalize tags type
-        - doesn't mutate the passed list, returns a new list
-        """
+    def _normalize_tags(self, tags, device_name=None, metric_name=None):
         normalized_tags = []
 
         if device_name:
@@ -786,7 +998,7 @@ class __AgentCheckPy2(__AgentCheck):
                     return
 
         if event.get('tags'):
-            event['tags'] = self._normalize_tags_type(event['tags'])
+            event['tags'] = list(self._normalize_tags_type(event['tags']))
         if event.get('timestamp'):
             event['timestamp'] = int(event['timestamp'])
         if event.get('aggregation_key'):
@@ -797,13 +1009,7 @@ class __AgentCheckPy2(__AgentCheck):
 
         aggregator.submit_event(self, self.check_id, event)
 
-    def _normalize_tags_type(self, tags, device_name=None, metric_name=None):
-        """
-        Normalize tags contents and type:
-        - append `device_name` as `device:` tag
-        - normalize tags type
-        - doesn't mutate the passed list, returns a new list
-        """
+    def _normalize_tags(self, tags, device_name=None, metric_name=None):
         normalized_tags = []
 
         if device_name:
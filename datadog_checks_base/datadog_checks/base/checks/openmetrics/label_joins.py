@@ -0,0 +1,155 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import OrderedDict, defaultdict
+from sys import getsizeof
+
+from six import iteritems
+
+# Approximate size of the `[labels, generation]` list of an entry and of its slot in the table
+ENTRY_OVERHEAD = getsizeof([None, 0]) + 100
+
+
+def move_to_end(table, key):
+    try:
+        table.move_to_end(key)
+    except AttributeError:
+        # Python 2
+        table[key] = table.pop(key)
+
+
+class LabelJoinIndex(object):
+    """
+    Index of the labels that `label_joins` add to samples, built from the samples of the target metrics.
+
+    Every target metric has its own table mapping the values of its `label_to_match` to the labels
+    to get, stored as tuples of (name, value) pairs. Entries are kept in the order of the last scrape
+    (generation) that stored or joined them, so the ones that went unused during a scrape are evicted
+    from the front of the tables rather than by going through the whole index.
+    """
+
+    def __init__(self, label_joins, max_entries=0):
+        """
+        :param label_joins: the `label_joins` configuration
+        :param max_entries: maximum number of entries of each target's table, 0 for no limit
+        """
+        self.max_entries = max_entries
+
+        # Target metric name -> (label to match, labels to get, table)
+        self.targets = {}
+
+        # Label to match -> tables of the targets matching it
+        tables_by_label = defaultdict(list)
+
+        for metric_name, label_join in iteritems(label_joins):
+            label_to_match = label_join['label_to_match']
+            table = OrderedDict()
+            self.targets[metric_name] = (label_to_match, frozenset(label_join['labels_to_get']), table)
+            tables_by_label[label_to_match].append(table)
+
+        self.watched_labels = tuple(iteritems(tables_by_label))
+        self.generation = 0
+
+        # Approximate memory used by the entries, in bytes
+        self.memory = 0
+
+        # Number of entries evicted since the last call to `flush_evicted`
+        self.evicted = 0
+
+    def __len__(self):
+        return sum(len(table) for _, _, table in self.targets.values())
+
+    def store(self, metric_name, labels):
+        """
+        Store the labels to get from the labels of a sample of the target `metric_name`.
+        """
+        label_to_match, labels_to_get, table = self.targets[metric_name]
+
+        matching_value = labels.get(label_to_match)
+        if matching_value is None:
+            return
+
+        joined_labels = tuple((name, value) for name, value in iteritems(labels) if name in labels_to_get)
+
+        entry = table.get(matching_value)
+        if entry is None:
+            table[matching_value] = [joined_labels, self.generation]
+            self.memory += self._entry_size(matching_value, joined_labels)
+
+            if self.max_entries and len(table) > self.max_entries:
+                self._evict_first(table)
+
+            return
+
+        current_labels = entry[0]
+        if current_labels != joined_labels and not all(label in current_labels for label in joined_labels):
+            # Labels from several samples with the same value are merged, the last ones take precedence
+            merged_labels = OrderedDict(current_labels)
+            merged_labels.update(joined_labels)
+            merged_labels = tuple(iteritems(merged_labels))
+
+            self.memory += self._entry_size(matching_value, merged_labels)
+            self.memory -= self._entry_size(matching_value, current_labels)
+            entry[0] = merged_labels
+
+        self._touch(table, matching_value, entry)
+
+    def join(self, labels):
+        """
+        Add the stored labels to the labels of a sample, in place.
+        """
+        for label_name, tables in self.watched_labels:
+            value = labels.get(label_name)
+            if value is None:
+                continue
+
+            for table in tables:
+                entry = table.get(value)
+                if entry is not None:
+                    self._touch(table, value, entry)
+                    labels.update(entry[0])
+
+    def evict(self):
+        """
+        Evict the entries that were neither stored nor joined since the last call, which ends the generation.
+        """
+        generation = self.generation
+        for _, _, table in self.targets.values():
+            while table:
+                key = next(iter(table))
+                if table[key][1] == generation:
+                    break
+
+                self._evict(table, key)
+
+        self.generation += 1
+
+    def flush_evicted(self):
+        """
+        Returns the number of entries evicted since the last call and resets it.
+        """
+        evicted = self.evicted
+        self.evicted = 0
+        return evicted
+
+    def _touch(self, table, key, entry):
+        # Only move entries once per generation
+        if entry[1] != self.generation:
+            entry[1] = self.generation
+            move_to_end(table, key)
+
+    def _evict_first(self, table):
+        self._evict(table, next(iter(table)))
+
+    def _evict(self, table, key):
+        self.memory -= self._entry_size(key, table.pop(key)[0])
+        self.evicted += 1
+
+    @staticmethod
+    def _entry_size(key, labels):
+        return (
+            ENTRY_OVERHEAD
+            + getsizeof(key)
+            + getsizeof(labels)
+            + sum(getsizeof(pair) + getsizeof(pair[1]) for pair in labels)
+        )
@@ -3,20 +3,26 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 from __future__ import division
 
-from fnmatch import fnmatchcase
+import re
+from fnmatch import fnmatchcase, translate
 from math import isinf, isnan
 from os.path import isfile
+from timeit import default_timer
 
 import requests
 from prometheus_client.parser import text_fd_to_metric_families
-from six import PY3, iteritems, itervalues, string_types
+from six import PY3, iteritems, string_types
 from urllib3.exceptions import InsecureRequestWarning
 
 from ...config import is_affirmative
 from ...errors import CheckException
 from ...utils.common import to_string
+from ...utils.http import RequestsWrapper
+from ...utils.tag_cache import TagCache
 from ...utils.warnings_util import disable_warnings_ctx
 from .. import AgentCheck
+from .label_joins import LabelJoinIndex
+from .timings import PHASES, ScrapeTimings
 
 if PY3:
     long = int
@@ -42,9 +48,25 @@ class OpenMetricsScraperMixin(object):
     TELEMETRY_COUNTER_METRICS_INPUT_COUNT = "metrics.input.count"
     TELEMETRY_COUNTER_METRICS_IGNORE_COUNT = "metrics.ignored.count"
     TELEMETRY_COUNTER_METRICS_PROCESS_COUNT = "metrics.processed.count"
+    TELEMETRY_COUNTER_METRICS_FILTERED_COUNT = "metrics.filtered.count"
+    TELEMETRY_COUNTER_CONNECTIONS_NEW_COUNT = "connections.new.count"
+    TELEMETRY_COUNTER_CONNECTIONS_REUSED_COUNT = "connections.reused.count"
+    TELEMETRY_COUNTER_TAG_CACHE_HITS_COUNT = "tag_cache.hits.count"
+    TELEMETRY_COUNTER_TAG_CACHE_MISSES_COUNT = "tag_cache.misses.count"
+    TELEMETRY_GAUGE_LABEL_JOINS_ENTRIES = "label_joins.entries"
+    TELEMETRY_GAUGE_LABEL_JOINS_MEMORY = "label_joins.memory"
+    TELEMETRY_COUNTER_LABEL_JOINS_EVICTED_COUNT = "label_joins.evicted.count"
+    TELEMETRY_HISTOGRAM_SCRAPE_DURATION = "scrape.duration"
+    TELEMETRY_HISTOGRAM_SCRAPE_PHASE_DURATION = "scrape.{}.duration"
+    TELEMETRY_HISTOGRAM_TRANSFORMER_DURATION = "scrape.transformer.duration"
 
     METRIC_TYPES = ['counter', 'gauge', 'summary', 'histogram']
 
+    # Suffixes of the samples belonging to a metric family in the text format
+    SAMPLE_SUFFIXES = ('_bucket', '_sum', '_count', '_total', '_created')
+
+    METRIC_NAME_PATTERN = re.compile(r'[^{\s]+')
+
     KUBERNETES_TOKEN_PATH = '/var/run/secrets/kubernetes.io/serviceaccount/token'
 
     def __init__(self, *args, **kwargs):
@@ -120,28 +142,23 @@ class OpenMetricsScraperMixin(object):
         config['label_joins'] = default_instance.get('label_joins', {})
         config['label_joins'].update(instance.get('label_joins', {}))
 
-        # `_label_mapping` holds the additionals label info to add for a specific
-        # label value, example:
-        # self._label_mapping = {
-        #     'pod': {
-        #         'dd-agent-9s1l1': [("node","yolo"),("host_ip","yey")]
-        #     }
-        # }
-        config['_label_mapping'] = {}
+        # `_label_join_index` holds the additional labels to add for specific label values, see `LabelJoinIndex`.
+        # It is built on first use.
+        config['_label_join_index'] = None
 
-        # `_active_label_mapping` holds a dictionary of label values found during the run
-        # to cleanup the label_mapping of unused values, example:
-        # self._active_label_mapping = {
-        #     'pod': {
-        #         'dd-agent-9s1l1': True
-        #     }
-        # }
-        config['_active_label_mapping'] = {}
+        # Maximum number of label values stored for each label join target, 0 for no limit
+        config['label_joins_max_entries'] = int(
+            instance.get('label_joins_max_entries', default_instance.get('label_joins_max_entries', 0))
+        )
 
-        # `_watched_labels` holds the list of label to watch for enrichment
-        config['_watched_labels'] = set()
+        # Whether or not to submit metrics on the first scrape. By default the first scrape only builds the
+        # label join index, so that metrics exposed before the label join targets in the payload get their
+        # labels too. When streaming, those metrics miss their joined labels on the first scrape only.
+        config['stream_label_joins'] = is_affirmative(
+            instance.get('stream_label_joins', default_instance.get('stream_label_joins', False))
+        )
 
-        config['_dry_run'] = True
+        config['_dry_run'] = not config['stream_label_joins']
 
         # Some metrics are ignored because they are duplicates or introduce a
         # very high cardinality. Metrics included in this list will be silently
@@ -242,6 +259,30 @@ class OpenMetricsScraperMixin(object):
             'prometheus_timeout', default_instance.get('prometheus_timeout', 10)
         )
 
+        # Whether or not to keep the connections to the endpoint alive between scrapes
+        # instead of doing a new TCP (and TLS) handshake every run
+        config['persist_connections'] = is_affirmative(
+            instance.get('persist_connections', default_instance.get('persist_connections', False))
+        )
+
+        # Maximum number of connections kept in the pool of the endpoint
+        config['connection_pool_size'] = instance.get(
+            'connection_pool_size', default_instance.get('connection_pool_size', 10)
+        )
+
+        # Number of seconds after which an unused pool is closed, unlimited by default
+        config['connection_idle_timeout'] = instance.get(
+            'connection_idle_timeout', default_instance.get('connection_idle_timeout', None)
+        )
+
+        # Number of seconds after which the pool is recycled regardless of usage, unlimited by default
+        config['connection_max_age'] = instance.get(
+            'connection_max_age', default_instance.get('connection_max_age', None)
+        )
+
+        # The pooled HTTP handler of the endpoint, created on first use when `persist_connections` is enabled
+        config['_http_handler'] = None
+
         # Authentication used when polling endpoint
         config['username'] = instance.get('username', default_instance.get('username', None))
         config['password'] = instance.get('password', default_instance.get('password', None))
@@ -257,6 +298,22 @@ class OpenMetricsScraperMixin(object):
         # INTERNAL FEATURE, might be removed in future versions
         config['_text_filter_blacklist'] = []
 
+        # Whether or not to skip the parsing of the metric families that would be discarded anyway
+        # because they are ignored, or neither mapped, transformed nor matching any wildcard. The
+        # metric name is read off every line of `text/plain` payloads before the samples are parsed.
+        config['pre_parse_filter'] = is_affirmative(
+            instance.get('pre_parse_filter', default_instance.get('pre_parse_filter', False))
+        )
+
+        # `_metric_filter` holds the matcher built by `process` when `pre_parse_filter` is enabled
+        config['_metric_filter'] = None
+
+        # Maximum number of distinct label sets whose tags are cached between samples and runs, 0 disables the cache
+        config['tag_cache_size'] = int(instance.get('tag_cache_size', default_instance.get('tag_cache_size', 0)))
+
+        # `_tag_cache` maps the labels of samples to their tags when `tag_cache_size` is set
+        config['_tag_cache'] = TagCache(config['tag_cache_size']) if config['tag_cache_size'] > 0 else None
+
         # Whether or not to use the service account bearer token for authentication
         # if 'bearer_token_path' is not set, we use /var/run/secrets/kubernetes.io/serviceaccount/token
         # as a default path to get the token.
@@ -274,6 +331,15 @@ class OpenMetricsScraperMixin(object):
 
         config['telemetry'] = is_affirmative(instance.get('telemetry', default_instance.get('telemetry', False)))
 
+        # Whether or not to time every phase of the scrapes, see `ScrapeTimings`. The timings are logged
+        # at debug level, and submitted as telemetry histograms when `telemetry` is enabled too.
+        config['telemetry_timings'] = is_affirmative(
+            instance.get('telemetry_timings', default_instance.get('telemetry_timings', False))
+        )
+
+        # Timings of the current scrape, if enabled
+        config['_timings'] = None
+
         # The metric name services use to indicate build information
         config['metadata_metric_name'] = instance.get(
             'metadata_metric_name', default_instance.get('metadata_metric_name')
@@ -298,10 +364,22 @@ class OpenMetricsScraperMixin(object):
         :return: core.Metric
         """
         input_gen = response.iter_lines(chunk_size=self.REQUESTS_CHUNK_SIZE, decode_unicode=True)
+
+        timings = scraper_config['_timings']
+        if timings is not None:
+            timings.time_decompression(response)
+            input_gen = timings.time_lines(input_gen)
+
         if scraper_config['_text_filter_blacklist']:
             input_gen = self._text_filter_input(input_gen, scraper_config)
+        if scraper_config['_metric_filter'] is not None:
+            input_gen = self._metric_filter_input(input_gen, scraper_config)
+
+        families = text_fd_to_metric_families(input_gen)
+        if timings is not None:
+            families = timings.time_families(families)
 
-        for metric in text_fd_to_metric_families(input_gen):
+        for metric in families:
             self._send_telemetry_counter(
                 self.TELEMETRY_COUNTER_METRICS_INPUT_COUNT, len(metric.samples), scraper_config
             )
@@ -328,6 +406,100 @@ class OpenMetricsScraperMixin(object):
                 # No blacklist matches, passing the line through
                 yield line
 
+    def _metric_filter_input(self, input_gen, scraper_config):
+        """
+        Filters out the text input line by line, dropping the `# HELP`/`# TYPE` headers and
+        the samples of the metric families `_metric_filter` doesn't keep, before they are parsed.
+        :param input_gen: line generator
+        :output: generator of filtered lines
+        """
+        keep_metric = scraper_config['_metric_filter']
+        type_overrides = scraper_config['type_overrides']
+        current_family = None
+        keep_family = True
+        filtered = 0
+
+        for line in input_gen:
+            if not line:
+                yield line
+                continue
+
+            if line[0] == '#':
+                parts = line.split(None, 3)
+                if len(parts) > 2 and parts[1] in ('HELP', 'TYPE'):
+                    name = parts[2]
+                    if name != current_family:
+                        current_family = name
+                        keep_family = keep_metric(name)
+
+                    if keep_family and parts[1] == 'TYPE' and name not in type_overrides:
+                        keep_family = len(parts) > 3 and parts[3].strip() in self.METRIC_TYPES
+
+                    if not keep_family:
+                        continue
+
+                yield line
+                continue
+
+            match = self.METRIC_NAME_PATTERN.match(line)
+            if match is None:
+                yield line
+                continue
+
+            name = match.group()
+            if current_family is None or not (
+                name == current_family
+                or (name.startswith(current_family) and name[len(current_family) :] in self.SAMPLE_SUFFIXES)
+            ):
+                # Samples without headers are untyped, only kept if their type is overridden
+                current_family = name
+                keep_family = name in type_overrides and keep_metric(name)
+
+            if keep_family:
+                yield line
+            else:
+                filtered += 1
+
+        self._send_telemetry_counter(self.TELEMETRY_COUNTER_METRICS_FILTERED_COUNT, filtered, scraper_config)
+
+    def _build_metric_filter(self, scraper_config, metric_transformers):
+        """
+        Build a function telling whether a metric family, by its name in the payload, would be
+        processed by `process_metric`. Decisions are cached as metric names repeat across scrapes.
+        """
+        label_joins = scraper_config['label_joins']
+        ignore_metrics = set(scraper_config['ignore_metrics'])
+        metrics_mapper = scraper_config['metrics_mapper']
+        transformers = set(metric_transformers or ())
+
+        wildcards = [translate(x) for x in metrics_mapper if '*' in x]
+        wildcard_pattern = re.compile('|'.join(wildcards)) if wildcards else None
+
+        cache = {}
+
+        def keep_metric(name):
+            try:
+                return cache[name]
+            except KeyError:
+                pass
+
+            metric_name = self._remove_metric_prefix(name, scraper_config)
+            if metric_name in label_joins:
+                # Label join targets are always needed to store labels, even if ignored
+                keep = True
+            elif metric_name in ignore_metrics:
+                keep = False
+            elif metric_name in metrics_mapper or metric_name in transformers:
+                keep = True
+            else:
+                keep = wildcard_pattern is not None and wildcard_pattern.match(metric_name) is not None
+
+            cache[name] = keep
+            return keep
+
+        keep_metric.transformers = transformers
+        return keep_metric
+
     def _remove_metric_prefix(self, metric, scraper_config):
         prometheus_metrics_prefix = scraper_config['prometheus_metrics_prefix']
         return metric[len(prometheus_metrics_prefix) :] if metric.startswith(prometheus_metrics_prefix) else metric
@@ -336,7 +508,14 @@ class OpenMetricsScraperMixin(object):
         """
         Poll the data from prometheus and return the metrics as a generator.
         """
-        response = self.poll(scraper_config)
+        timings = scraper_config['_timings']
+        if timings is not None:
+            start = default_timer()
+            response = self.poll(scraper_config)
+            timings.add('ttfb', default_timer() - start)
+        else:
+            response = self.poll(scraper_config)
+
         if scraper_config['telemetry']:
             if 'content-length' in response.headers:
                 content_len = int(response.headers['content-length'])
@@ -347,22 +526,19 @@ class OpenMetricsScraperMixin(object):
             # no dry run if no label joins
             if not scraper_config['label_joins']:
                 scraper_config['_dry_run'] = False
-            elif not scraper_config['_watched_labels']:
-                # build the _watched_labels set
-                for val in itervalues(scraper_config['label_joins']):
-                    scraper_config['_watched_labels'].add(val['label_to_match'])
 
             for metric in self.parse_metric_family(response, scraper_config):
                 yield metric
 
             # Set dry run off
             scraper_config['_dry_run'] = False
-            # Garbage collect unused mapping and reset active labels
-            for metric, mapping in list(iteritems(scraper_config['_label_mapping'])):
-                for key in list(mapping):
-                    if key not in scraper_config['_active_label_mapping'][metric]:
-                        del scraper_config['_label_mapping'][metric][key]
-            scraper_config['_active_label_mapping'] = {}
+
+            # Evict the label values that went unused during this scrape
+            label_join_index = scraper_config['_label_join_index']
+            if label_join_index is not None:
+                label_join_index.evict()
+                if scraper_config['telemetry']:
+                    self._send_label_join_telemetry(label_join_index, scraper_config)
         finally:
             response.close()
 
@@ -378,8 +554,29 @@ class OpenMetricsScraperMixin(object):
         if metric_transformers:
             transformers.update(metric_transformers)
 
-        for metric in self.scrape_metrics(scraper_config):
-            self.process_metric(metric, scraper_config, metric_transformers=transformers)
+        if scraper_config['pre_parse_filter']:
+            metric_filter = scraper_config['_metric_filter']
+            if metric_filter is None or metric_filter.transformers != set(transformers):
+                scraper_config['_metric_filter'] = self._build_metric_filter(scraper_config, transformers)
+
+        if scraper_config['telemetry_timings']:
+            scraper_config['_timings'] = ScrapeTimings()
+
+        try:
+            for metric in self.scrape_metrics(scraper_config):
+                self.process_metric(metric, scraper_config, metric_transformers=transformers)
+        finally:
+            timings = scraper_config['_timings']
+            if timings is not None:
+                scraper_config['_timings'] = None
+                timings.finish()
+                self._report_scrape_timings(timings, scraper_config)
+
+        tag_cache = scraper_config['_tag_cache']
+        if tag_cache is not None and scraper_config['telemetry']:
+            hits, misses = tag_cache.flush_stats()
+            self._send_telemetry_counter(self.TELEMETRY_COUNTER_TAG_CACHE_HITS_COUNT, hits, scraper_config)
+            self._send_telemetry_counter(self.TELEMETRY_COUNTER_TAG_CACHE_MISSES_COUNT, misses, scraper_config)
 
     def transform_metadata(self, metric, scraper_config):
         labels = metric.samples[0][self.SAMPLE_LABELS]
@@ -410,10 +607,52 @@ class OpenMetricsScraperMixin(object):
                 tags.extend(extra_tags)
             self.count(metric_name_with_namespace, val, tags=tags)
 
+    def _send_telemetry_histogram(self, metric_name, val, scraper_config, extra_tags=None):
+        if scraper_config['telemetry']:
+            metric_name_with_namespace = self._telemetry_metric_name_with_namespace(metric_name, scraper_config)
+            # Determine the tags to send
+            custom_tags = scraper_config['custom_tags']
+            tags = list(custom_tags)
+            tags.extend(scraper_config['_metric_tags'])
+            if extra_tags:
+                tags.extend(extra_tags)
+            self.histogram(metric_name_with_namespace, val, tags=tags)
+
+    def _report_scrape_timings(self, timings, scraper_config):
+        self.log.debug('Scrape timings of %s: %s', scraper_config['prometheus_url'], timings.summary())
+
+        self._send_telemetry_histogram(self.TELEMETRY_HISTOGRAM_SCRAPE_DURATION, timings.total, scraper_config)
+        for phase in PHASES:
+            self._send_telemetry_histogram(
+                self.TELEMETRY_HISTOGRAM_SCRAPE_PHASE_DURATION.format(phase), timings.durations[phase], scraper_config
+            )
+        for metric_name, duration in iteritems(timings.transformers):
+            self._send_telemetry_histogram(
+                self.TELEMETRY_HISTOGRAM_TRANSFORMER_DURATION,
+                duration,
+                scraper_config,
+                extra_tags=['transformer:{}'.format(metric_name)],
+            )
+
+    def _get_label_join_index(self, scraper_config):
+        label_join_index = scraper_config['_label_join_index']
+        if label_join_index is None:
+            label_join_index = LabelJoinIndex(scraper_config['label_joins'], scraper_config['label_joins_max_entries'])
+            scraper_config['_label_join_index'] = label_join_index
+
+        return label_join_index
+
+    def _send_label_join_telemetry(self, label_join_index, scraper_config):
+        self._send_telemetry_gauge(self.TELEMETRY_GAUGE_LABEL_JOINS_ENTRIES, len(label_join_index), scraper_config)
+        self._send_telemetry_gauge(self.TELEMETRY_GAUGE_LABEL_JOINS_MEMORY, label_join_index.memory, scraper_config)
+        self._send_telemetry_counter(
+            self.TELEMETRY_COUNTER_LABEL_JOINS_EVICTED_COUNT, label_join_index.flush_evicted(), scraper_config
+        )
+
     def _store_labels(self, metric, scraper_config):
         # If targeted metric, store labels
         if metric.name in scraper_config['label_joins']:
-            matching_label = scraper_config['label_joins'][metric.name]['label_to_match']
+            label_join_index = self._get_label_join_index(scraper_config)
             for sample in metric.samples:
                 # metadata-only metrics that are used for label joins are always equal to 1
                 # this is required for metrics where all combinations of a state are sent
@@ -421,40 +660,14 @@ class OpenMetricsScraperMixin(object):
                 # example: kube_pod_status_phase in kube-state-metrics
                 if sample[self.SAMPLE_VALUE] != 1:
                     continue
-                label_dict = dict()
-                matching_value = None
-                for label_name, label_value in iteritems(sample[self.SAMPLE_LABELS]):
-                    if label_name == matching_label:
-                        matching_value = label_value
-                    elif label_name in scraper_config['label_joins'][metric.name]['labels_to_get']:
-                        label_dict[label_name] = label_value
-                try:
-                    if scraper_config['_label_mapping'][matching_label].get(matching_value):
-                        scraper_config['_label_mapping'][matching_label][matching_value].update(label_dict)
-                    else:
-                        scraper_config['_label_mapping'][matching_label][matching_value] = label_dict
-                except KeyError:
-                    if matching_value is not None:
-                        scraper_config['_label_mapping'][matching_label] = {matching_value: label_dict}
+                label_join_index.store(metric.name, sample[self.SAMPLE_LABELS])
 
     def _join_labels(self, metric, scraper_config):
         # Filter metric to see if we can enrich with joined labels
         if scraper_config['label_joins']:
+            join = self._get_label_join_index(scraper_config).join
             for sample in metric.samples:
-                watched_labels = scraper_config['_watched_labels'].intersection(set(sample[self.SAMPLE_LABELS].keys()))
-                for label_name in watched_labels:
-                    # Set this label value as active
-                    if label_name not in scraper_config['_active_label_mapping']:
-                        scraper_config['_active_label_mapping'][label_name] = {}
-                    scraper_config['_active_label_mapping'][label_name][sample[self.SAMPLE_LABELS][label_name]] = True
-                    # If mapping found add corresponding labels
-                    try:
-                        for name, val in iteritems(
-                            scraper_config['_label_mapping'][label_name][sample[self.SAMPLE_LABELS][label_name]]
-                        ):
-                            sample[self.SAMPLE_LABELS][name] = val
-                    except KeyError:
-                        pass
+                join(sample[self.SAMPLE_LABELS])
 
     def process_metric(self, metric, scraper_config, metric_transformers=None):
         """
@@ -465,9 +678,16 @@ class OpenMetricsScraperMixin(object):
 
         `metric_transformers` is a dict of <metric name>:<function to run when the metric name is encountered>
         """
+        timings = scraper_config['_timings']
+        if timings is not None:
+            start = default_timer()
+
         # If targeted metric, store labels
         self._store_labels(metric, scraper_config)
 
+        if timings is not None:
+            timings.add('label_joins', default_timer() - start)
+
         if metric.name in scraper_config['ignore_metrics']:
             self._send_telemetry_counter(
                 self.TELEMETRY_COUNTER_METRICS_IGNORE_COUNT, len(metric.samples), scraper_config
@@ -479,12 +699,36 @@ class OpenMetricsScraperMixin(object):
         if self._filter_metric(metric, scraper_config):
             return  # Ignore the metric
 
+        if timings is not None:
+            start = default_timer()
+
         # Filter metric to see if we can enrich with joined labels
         self._join_labels(metric, scraper_config)
 
+        if timings is not None:
+            timings.add('label_joins', default_timer() - start)
+
         if scraper_config['_dry_run']:
             return
 
+        if timings is not None:
+            self._dispatch_metric_timed(metric, scraper_config, metric_transformers, timings)
+        else:
+            self._dispatch_metric(metric, scraper_config, metric_transformers)
+
+    def _dispatch_metric_timed(self, metric, scraper_config, metric_transformers, timings):
+        start = default_timer()
+        self._dispatch_metric(metric, scraper_config, metric_transformers)
+        duration = default_timer() - start
+
+        if metric_transformers is not None and metric.name in metric_transformers:
+            if metric.name not in scraper_config['metrics_mapper']:
+                timings.add_transformer(metric.name, duration)
+                return
+
+        timings.add('submission', duration)
+
+    def _dispatch_metric(self, metric, scraper_config, metric_transformers):
         try:
             self.submit_openmetric(scraper_config['metrics_mapper'][metric.name], metric, scraper_config)
         except KeyError:
@@ -594,7 +838,19 @@ class OpenMetricsScraperMixin(object):
         auth = (username, password) if username is not None and password is not None else None
 
         with disable_warnings_ctx(InsecureRequestWarning, disable=disable_insecure_warnings):
-            return requests.get(
+            if not scraper_config['persist_connections']:
+                return requests.get(
+                    endpoint,
+                    headers=headers,
+                    stream=True,
+                    timeout=scraper_config['prometheus_timeout'],
+                    cert=cert,
+                    verify=verify,
+                    auth=auth,
+                )
+
+            http_handler = self.get_http_handler(scraper_config)
+            response = http_handler.get(
                 endpoint,
                 headers=headers,
                 stream=True,
@@ -604,6 +860,38 @@ class OpenMetricsScraperMixin(object):
                 auth=auth,
             )
 
+        if scraper_config['telemetry']:
+            new_connections, reused_connections = http_handler.connection_stats()
+            self._send_telemetry_counter(self.TELEMETRY_COUNTER_CONNECTIONS_NEW_COUNT, new_connections, scraper_config)
+            self._send_telemetry_counter(
+                self.TELEMETRY_COUNTER_CONNECTIONS_REUSED_COUNT, reused_connections, scraper_config
+            )
+
+        return response
+
+    def get_http_handler(self, scraper_config):
+        """
+        Get the pooled HTTP handler of the endpoint, creating it on first use.
+        Request options are still computed by `send_request` on every scrape, the handler
+        only provides a persistent session so that connections are reused across runs.
+        """
+        http_handler = scraper_config['_http_handler']
+        if http_handler is None:
+            http_handler = RequestsWrapper(
+                {
+                    'persist_connections': True,
+                    'connection_pool_size': scraper_config['connection_pool_size'],
+                    'connection_idle_timeout': scraper_config['connection_idle_timeout'],
+                    'connection_max_age': scraper_config['connection_max_age'],
+                },
+                # Keep relying on the environment for proxies, like non persistent requests do
+                {'use_agent_proxy': False},
+                logger=self.log,
+            )
+            scraper_config['_http_handler'] = http_handler
+
+        return http_handler
+
     def get_hostname_for_sample(self, sample, scraper_config):
         """
         Expose the label_to_hostname mapping logic to custom handler methods
@@ -625,6 +913,14 @@ class OpenMetricsScraperMixin(object):
         """
         if metric.type in ["gauge", "counter", "rate"]:
             metric_name_with_namespace = '{}.{}'.format(scraper_config['namespace'], metric_name)
+            if metric.type == "counter" and scraper_config['send_monotonic_counter']:
+                submission_method = 'monotonic_count'
+            elif metric.type == "rate":
+                submission_method = 'rate'
+            else:
+                submission_method = 'gauge'
+
+            samples = []
             for sample in metric.samples:
                 val = sample[self.SAMPLE_VALUE]
                 if not self._is_value_valid(val):
@@ -633,12 +929,9 @@ class OpenMetricsScraperMixin(object):
                 custom_hostname = self._get_hostname(hostname, sample, scraper_config)
                 # Determine the tags to send
                 tags = self._metric_tags(metric_name, val, sample, scraper_config, hostname=custom_hostname)
-                if metric.type == "counter" and scraper_config['send_monotonic_counter']:
-                    self.monotonic_count(metric_name_with_namespace, val, tags=tags, hostname=custom_hostname)
-                elif metric.type == "rate":
-                    self.rate(metric_name_with_namespace, val, tags=tags, hostname=custom_hostname)
-                else:
-                    self.gauge(metric_name_with_namespace, val, tags=tags, hostname=custom_hostname)
+                samples.append((val, tags, custom_hostname))
+
+            self.submit_batch(submission_method, metric_name_with_namespace, samples)
         elif metric.type == "histogram":
             self._submit_gauges_from_histogram(metric_name, metric, scraper_config)
         elif metric.type == "summary":
@@ -849,14 +1142,30 @@ class OpenMetricsScraperMixin(object):
         custom_tags = scraper_config['custom_tags']
         _tags = list(custom_tags)
         _tags.extend(scraper_config['_metric_tags'])
-        for label_name, label_value in iteritems(sample[self.SAMPLE_LABELS]):
-            if label_name not in scraper_config['exclude_labels']:
-                tag_name = scraper_config['labels_mapper'].get(label_name, label_name)
-                _tags.append('{}:{}'.format(to_string(tag_name), to_string(label_value)))
+
+        tag_cache = scraper_config['_tag_cache']
+        if tag_cache is None:
+            _tags.extend(self._label_tags(sample[self.SAMPLE_LABELS], scraper_config))
+        else:
+            key = tuple(iteritems(sample[self.SAMPLE_LABELS]))
+            label_tags = tag_cache.get(key)
+            if label_tags is None:
+                label_tags = tag_cache.set(key, self._label_tags(sample[self.SAMPLE_LABELS], scraper_config))
+            _tags.extend(label_tags)
+
         return self._finalize_tags_to_submit(
             _tags, metric_name, val, sample, custom_tags=custom_tags, hostname=hostname
         )
 
+    def _label_tags(self, labels, scraper_config):
+        exclude_labels = scraper_config['exclude_labels']
+        labels_mapper = scraper_config['labels_mapper']
+        return [
+            '{}:{}'.format(to_string(labels_mapper.get(label_name, label_name)), to_string(label_value))
+            for label_name, label_value in iteritems(labels)
+            if label_name not in exclude_labels
+        ]
+
     def _is_value_valid(self, val):
         return not (isnan(val) or isinf(val))
 
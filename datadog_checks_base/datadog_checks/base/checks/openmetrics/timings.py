@@ -0,0 +1,108 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import defaultdict
+from heapq import nlargest
+from timeit import default_timer
+
+from six import iteritems
+
+# Phases of a scrape, in the order they are reported
+PHASES = ('ttfb', 'download', 'decompression', 'parse', 'label_joins', 'transformers', 'submission')
+
+
+class ScrapeTimings(object):
+    """
+    Accumulates the time spent in every phase of a scrape, in seconds.
+
+    Since the payload is streamed, downloading, decompressing and parsing it are interleaved:
+    the time spent reading lines includes decompression, and the time spent getting metric
+    families includes reading lines. Both are only split apart by `finish`.
+    """
+
+    def __init__(self):
+        self.start = default_timer()
+        self.total = 0.0
+        self.durations = dict.fromkeys(PHASES, 0.0)
+
+        # Metric name -> time spent in its transformer
+        self.transformers = defaultdict(float)
+
+        # Inclusive time spent reading lines and getting metric families
+        self._iterations = {'lines': 0.0, 'families': 0.0}
+
+    def add(self, phase, duration):
+        self.durations[phase] += duration
+
+    def add_transformer(self, metric_name, duration):
+        self.durations['transformers'] += duration
+        self.transformers[metric_name] += duration
+
+    def time_lines(self, lines):
+        """
+        Wrap the line generator of the response to time reading the payload.
+        """
+        return self._time_iter(lines, 'lines')
+
+    def time_families(self, families):
+        """
+        Wrap the metric family generator of the parser to time parsing the payload.
+        """
+        return self._time_iter(families, 'families')
+
+    def time_decompression(self, response):
+        """
+        Wrap the decoding method of the raw urllib3 response, if any, to time decompressing the payload.
+        """
+        raw = getattr(response, 'raw', None)
+        decode = getattr(raw, '_decode', None)
+        if not callable(decode):
+            return
+
+        def _decode(*args, **kwargs):
+            start = default_timer()
+            try:
+                return decode(*args, **kwargs)
+            finally:
+                self.durations['decompression'] += default_timer() - start
+
+        raw._decode = _decode
+
+    def finish(self):
+        """
+        Compute the exclusive time of the interleaved phases and the total time of the scrape.
+        """
+        lines = self._iterations['lines']
+        self.durations['download'] = max(lines - self.durations['decompression'], 0.0)
+        self.durations['parse'] = max(self._iterations['families'] - lines, 0.0)
+        self.total = default_timer() - self.start
+
+    def summary(self, transformers=5):
+        """
+        Returns a one line summary of the timings, listing the slowest `transformers`.
+        """
+        summary = 'total={:.3f}s {}'.format(
+            self.total, ' '.join('{}={:.3f}s'.format(phase, self.durations[phase]) for phase in PHASES)
+        )
+        if self.transformers:
+            summary += ' slowest_transformers=[{}]'.format(
+                ', '.join(
+                    '{}={:.3f}s'.format(name, duration)
+                    for name, duration in nlargest(transformers, iteritems(self.transformers), key=lambda t: t[1])
+                )
+            )
+
+        return summary
+
+    def _time_iter(self, iterable, key):
+        iterations = self._iterations
+        iterator = iter(iterable)
+        while True:
+            start = default_timer()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                iterations[key] += default_timer() - start
+                return
+            iterations[key] += default_timer() - start
+            yield item
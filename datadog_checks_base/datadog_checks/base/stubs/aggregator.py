@@ -28,6 +28,9 @@ class AggregatorStub(object):
     """
     Mainly used for unit testing checks, this stub makes possible to execute
     a check without a running Agent.
+
+    Metrics are normalized once when submitted and indexed by name and type, tag, hostname
+    and sorted tags, so that assertions only look at the relevant candidates.
     """
 
     # Replicate the Enum we have on the Agent
@@ -52,6 +55,32 @@ class AggregatorStub(object):
         self._service_checks = defaultdict(list)
         self._events = []
         self._histogram_buckets = defaultdict(list)
+        self._reset_metric_indexes()
+
+    def _reset_metric_indexes(self):
+        # (name, type) -> metrics
+        self._metrics_by_type = defaultdict(list)
+        # (name, tag) -> metrics
+        self._metrics_by_tag = defaultdict(list)
+        # (name, hostname) -> metrics
+        self._metrics_by_hostname = defaultdict(list)
+        # (name, sorted tags) -> metrics
+        self._metrics_by_tags = defaultdict(list)
+
+    def _add_metric(self, name, mtype, value, tags, hostname, device):
+        tags = normalize_tags(tags)
+        stub = MetricStub(ensure_unicode(name), mtype, value, tags, ensure_unicode(hostname), device)
+        self._metrics[name].append(stub)
+
+        name = stub.name
+        self._metrics_by_type[(name, mtype)].append(stub)
+        self._metrics_by_hostname[(name, stub.hostname)].append(stub)
+        if tags:
+            self._metrics_by_tags[(name, tuple(sorted(tags)))].append(stub)
+            for tag in set(tags):
+                self._metrics_by_tag[(name, tag)].append(stub)
+        else:
+            self._metrics_by_tags[(name, ())].append(stub)
 
     @classmethod
     def is_aggregate(cls, mtype):
@@ -63,12 +92,12 @@ class AggregatorStub(object):
 
     def submit_metric(self, check, check_id, mtype, name, value, tags, hostname):
         if not self.ignore_metric(name):
-            self._metrics[name].append(MetricStub(name, mtype, value, tags, hostname, None))
+            self._add_metric(name, mtype, value, tags, hostname, None)
 
     def submit_metric_e2e(self, check, check_id, mtype, name, value, tags, hostname, device=None):
         # Device is only present in metrics read from the real agent in e2e tests. Normally it is submitted as a tag
         if not self.ignore_metric(name):
-            self._metrics[name].append(MetricStub(name, mtype, value, tags, hostname, device))
+            self._add_metric(name, mtype, value, tags, hostname, device)
 
     def submit_service_check(self, check, check_id, name, status, tags, hostname, message):
         self._service_checks[name].append(ServiceCheckStub(check_id, name, status, tags, hostname, message))
@@ -87,17 +116,7 @@ class AggregatorStub(object):
         """
         Return the metrics received under the given name
         """
-        return [
-            MetricStub(
-                ensure_unicode(stub.name),
-                stub.type,
-                stub.value,
-                normalize_tags(stub.tags),
-                ensure_unicode(stub.hostname),
-                stub.device,
-            )
-            for stub in self._metrics.get(to_string(name), [])
-        ]
+        return list(self._metrics.get(to_string(name), []))
 
     def service_checks(self, name):
         """
@@ -158,10 +177,7 @@ class AggregatorStub(object):
         """
         self._asserted.add(metric_name)
 
-        candidates = []
-        for metric in self.metrics(metric_name):
-            if tag in metric.tags:
-                candidates.append(metric)
+        candidates = self._metrics_by_tag.get((ensure_unicode(metric_name), ensure_unicode(tag)), [])
 
         if count is not None:
             assert len(candidates) == count
@@ -230,13 +246,10 @@ class AggregatorStub(object):
         expected_tags = normalize_tags(tags, sort=True)
 
         candidates = []
-        for metric in self.metrics(name):
+        for metric in self._metric_candidates(name, expected_tags, hostname, metric_type):
             if value is not None and not self.is_aggregate(metric.type) and value != metric.value:
                 continue
 
-            if expected_tags and expected_tags != sorted(metric.tags):
-                continue
-
             if hostname and hostname != metric.hostname:
                 continue
 
@@ -262,6 +275,39 @@ class AggregatorStub(object):
             condition = len(candidates) >= at_least
         self._assert(condition, msg=msg, expected_stub=expected_metric, submitted_elements=self._metrics)
 
+    def _metric_candidates(self, name, expected_tags, hostname, metric_type):
+        """
+        Return the metrics submitted under the given name, narrowed down with the most selective index
+        for the given tags (which must be sorted), hostname and type.
+        """
+        name = ensure_unicode(name)
+        if expected_tags:
+            return self._metrics_by_tags.get((name, tuple(expected_tags)), [])
+        elif hostname:
+            return self._metrics_by_hostname.get((name, ensure_unicode(hostname)), [])
+        elif metric_type is not None:
+            return self._metrics_by_type.get((name, metric_type), [])
+
+        return self._metrics.get(to_string(name), [])
+
+    def assert_metrics(self, expected_metrics):
+        """
+        Assert every metric of a table was processed by this stub, reporting all the failures at once.
+
+        :param expected_metrics: iterable of metric names, or of mappings of `assert_metric` arguments
+        """
+        failures = []
+        for expected in expected_metrics:
+            if not isinstance(expected, dict):
+                expected = {'name': expected}
+
+            try:
+                self.assert_metric(**expected)
+            except AssertionError as e:
+                failures.append(str(e))
+
+        assert not failures, '{} metric assertion(s) failed:\n{}'.format(len(failures), '\n'.join(failures))
+
     def assert_service_check(self, name, status=None, tags=None, count=None, at_least=1, hostname=None, message=None):
         """
         Assert a service check was processed by this stub
@@ -328,13 +374,19 @@ class AggregatorStub(object):
             - hostname
         """
         # metric types that intended to be called multiple times are ignored
-        ignored_types = [self.COUNT, self.MONOTONIC_COUNT, self.COUNTER]
-        metric_stubs = [m for metrics in self._metrics.values() for m in metrics if m.type not in ignored_types]
+        ignored_types = {self.COUNT, self.MONOTONIC_COUNT, self.COUNTER}
 
-        def stub_to_key_fn(stub):
-            return stub.name, stub.type, str(sorted(stub.tags)), stub.hostname
+        # Metrics are already grouped by name and sorted tags, only groups of several metrics can have duplicates
+        all_contexts = defaultdict(list)
+        for (name, tags), metrics in iteritems(self._metrics_by_tags):
+            if len(metrics) < 2:
+                continue
 
-        self._assert_no_duplicate_stub('metric', metric_stubs, stub_to_key_fn)
+            for metric in metrics:
+                if metric.type not in ignored_types:
+                    all_contexts[(name, metric.type, str(list(tags)), metric.hostname)].append(metric)
+
+        self._assert_no_duplicate_contexts('metric', all_contexts)
 
     def assert_no_duplicate_service_checks(self):
         """
@@ -353,13 +405,17 @@ class AggregatorStub(object):
 
         self._assert_no_duplicate_stub('service_check', service_check_stubs, stub_to_key_fn)
 
-    @staticmethod
-    def _assert_no_duplicate_stub(stub_type, all_metrics, stub_to_key_fn):
+    @classmethod
+    def _assert_no_duplicate_stub(cls, stub_type, all_metrics, stub_to_key_fn):
         all_contexts = defaultdict(list)
         for metric in all_metrics:
             context = stub_to_key_fn(metric)
             all_contexts[context].append(metric)
 
+        cls._assert_no_duplicate_contexts(stub_type, all_contexts)
+
+    @staticmethod
+    def _assert_no_duplicate_contexts(stub_type, all_contexts):
         dup_contexts = defaultdict(list)
         for context, metrics in iteritems(all_contexts):
             if len(metrics) > 1:
@@ -382,6 +438,7 @@ class AggregatorStub(object):
         self._asserted = set()
         self._service_checks = defaultdict(list)
         self._events = []
+        self._reset_metric_indexes()
 
     def all_metrics_asserted(self):
         assert self.metrics_asserted_pct >= 100.0
@@ -394,7 +451,7 @@ class AggregatorStub(object):
         candidates = []
         self._asserted.add(metric_name)
 
-        for metric in self.metrics(metric_name):
+        for metric in self._metrics.get(to_string(metric_name), []):
             tags = metric.tags
             gtags = [t for t in tags if t.startswith(tag_prefix)]
             if len(gtags) > 0:
@@ -0,0 +1,209 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import defaultdict
+from heapq import nlargest
+from timeit import default_timer
+
+from .common import METRIC_PROFILE_NAMESPACE
+from .memory import get_timestamp_filename, parse_package_path
+
+DEFAULT_MODE = 'deterministic'
+DEFAULT_INTERVAL = 0.005
+DEFAULT_KEY_LIMIT = 10
+DEFAULT_KEEP = 10
+
+VALID_MODES = ('deterministic', 'sampling')
+
+# Recorded by cProfile when the profiler is disabled at the end of the run
+PROFILER_DISABLE = ('~', 0, "<method 'disable' of '_lsprof.Profiler' objects>")
+
+
+class CpuProfileMetric(object):
+    __slots__ = ('name', 'value', 'tags')
+
+    def __init__(self, name, value, tags=None):
+        self.name = '{}.cpu.{}'.format(METRIC_PROFILE_NAMESPACE, name)
+        self.value = float(value)
+        self.tags = tags or []
+
+
+def format_function(function):
+    filename, lineno, name = function
+    # Built-in functions have no file
+    if filename == '~':
+        return name
+
+    return '{}:{}({})'.format(parse_package_path(filename), lineno, name)
+
+
+class SamplingProfiler(object):
+    """
+    Statistical profiler periodically recording the stack of the thread running the profiled function,
+    from a background thread. The overhead only depends on the sampling interval, not on the number of calls.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+
+        # Stack of functions, from the outermost to the innermost -> number of samples
+        self.stacks = defaultdict(int)
+
+        self._root = None
+        self._thread_id = None
+        self._stop = threading.Event()
+
+    def runcall(self, f, *args, **kwargs):
+        self._thread_id = threading.current_thread().ident
+
+        sampler = threading.Thread(target=self._sample)
+        sampler.daemon = True
+        sampler.start()
+        try:
+            return self._call(f, args, kwargs)
+        finally:
+            self._stop.set()
+            sampler.join()
+
+    def cumulative_times(self):
+        """
+        Returns the time spent in every function including its callees, estimated from the samples.
+        """
+        times = defaultdict(float)
+        for stack, samples in self.stacks.items():
+            # Recursive functions are only counted once per sample
+            for function in set(stack):
+                times[function] += samples * self.interval
+
+        return times
+
+    def _call(self, f, args, kwargs):
+        # Only the frames called from here are recorded
+        self._root = sys._getframe()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self._root = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            root = self._root
+            frame = sys._current_frames().get(self._thread_id)
+
+            stack = []
+            while frame is not None and frame is not root:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+
+            # Discard the samples taken outside of the profiled function
+            if stack and root is not None and frame is root:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+
+
+def gather_deterministic(metrics, path, profiler, limit):
+    stats = pstats.Stats(profiler)
+    if path:
+        stats.dump_stats('{}.pstats'.format(path))
+
+    # function -> (primitive calls, calls, self time, cumulative time, callers)
+    times = {function: stat[3] for function, stat in stats.stats.items() if function != PROFILER_DISABLE}
+    gather_top(metrics, times, limit)
+
+
+def gather_sampling(metrics, path, profiler, limit):
+    if path:
+        # Collapsed stacks, the input format of flame graph tools
+        with open('{}.collapsed'.format(path), 'w') as f:
+            for stack, samples in sorted(profiler.stacks.items()):
+                f.write('{} {}\n'.format(';'.join(format_function(function) for function in stack), samples))
+
+    gather_top(metrics, profiler.cumulative_times(), limit)
+
+
+def gather_top(metrics, times, limit):
+    for function, cumulative_time in nlargest(limit, times.items(), key=lambda item: item[1]):
+        metrics.append(
+            CpuProfileMetric(
+                'function.cumulative_time', cumulative_time, tags=['function:{}'.format(format_function(function))]
+            )
+        )
+
+
+def rotate_profiles(location, keep):
+    profiles = sorted(name for name in os.listdir(location) if name.startswith('profile_'))
+    for name in profiles[: max(len(profiles) - keep, 0)]:
+        os.remove(os.path.join(location, name))
+
+
+def profile_cpu(f, config, namespaces=None, args=(), kwargs=None):
+    """
+    This will profile the CPU usage of function ``f``. The ``config`` dictionary must have an entry
+    ``profile_cpu`` that points to a directory with which to output the profiles for later consumption,
+    if it is empty only metrics are returned.
+
+    The available options (without prefix) are:
+
+      - mode: the profiler to use between:
+                * deterministic: trace every function call with cProfile, profiles are written
+                                 in the pstats format
+                * sampling: periodically sample the stack of the running thread, which has a lower
+                            overhead, profiles are written in the collapsed stack format of flame graphs
+      - interval: the number of seconds between samples in sampling mode
+      - limit: the number of functions with the highest cumulative time to return as metrics
+      - keep: the number of profiles to keep in the output directory, older ones are deleted
+
+    :param f: the function to profile
+    :param config: a dictionary of options prefixed by ``profile_cpu_``
+    :param namespaces: if specified, additional sub-directories under ``profile_cpu`` root directory
+    :param args: arguments to pass to function ``f``
+    :param kwargs: keyword arguments to pass to function ``f``
+    :return: the list of metrics to send
+    """
+    if kwargs is None:
+        kwargs = {}
+
+    mode = config.get('profile_cpu_mode', DEFAULT_MODE)
+    if mode not in VALID_MODES:
+        raise ValueError('Invalid CPU profiling mode `{}`, must be one of: {}'.format(mode, ', '.join(VALID_MODES)))
+
+    if mode == 'sampling':
+        profiler = SamplingProfiler(float(config.get('profile_cpu_interval', DEFAULT_INTERVAL)))
+    else:
+        profiler = cProfile.Profile()
+
+    start_time = default_timer()
+    profiler.runcall(f, *args, **kwargs)
+    duration = default_timer() - start_time
+
+    # Metrics to send
+    metrics = [CpuProfileMetric('check_run_time', duration)]
+
+    path = None
+    location = config['profile_cpu']
+    if location:
+        if namespaces:
+            # Colons can't be part of Windows file paths
+            location = os.path.join(location, *(n.replace(':', '_') for n in namespaces))
+
+        if not os.path.isdir(location):
+            os.makedirs(location)
+
+        path = os.path.join(location, get_timestamp_filename('profile'))
+
+    limit = int(config.get('profile_cpu_limit', DEFAULT_KEY_LIMIT))
+    if mode == 'sampling':
+        gather_sampling(metrics, path, profiler, limit)
+    else:
+        gather_deterministic(metrics, path, profiler, limit)
+
+    if path:
+        rotate_profiles(location, int(config.get('profile_cpu_keep', DEFAULT_KEEP)))
+
+    return metrics
@@ -2,21 +2,93 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 from itertools import chain
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from threading import Event, Thread
+from time import time
 
 from ...config import is_affirmative
 from ..containers import iter_unique
 from .query import Query
 from .transform import COLUMN_TRANSFORMERS, EXTRA_TRANSFORMERS
-from .utils import SUBMISSION_METHODS, create_submission_transformer
+from .utils import (
+    BATCH_SUBMISSION_METHODS,
+    SUBMISSION_METHODS,
+    create_batch_submission_transformer,
+    create_submission_transformer,
+)
+
+
+class QueryThread(object):
+    """
+    Runs a function in a daemon thread, exposing the same interface as the results of `ThreadPool.apply_async`.
+    """
+
+    def __init__(self, func, args):
+        self._value = None
+        self._done = Event()
+
+        thread = Thread(target=self._run, args=(func, args))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, func, args):
+        try:
+            self._value = func(*args)
+        finally:
+            self._done.set()
+
+    def ready(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise TimeoutError
+
+        return self._value
 
 
 class QueryManager(object):
-    def __init__(self, check, executor, queries=None, tags=None, error_handler=None):
+    """
+    Runs the queries of a check and submits the data they return.
+
+    Queries can set a `collection_interval`, in seconds, to only run once that much time
+    has elapsed since their last successful execution, and a `timeout`, in seconds, after
+    which their results are discarded. With a `concurrency` above 1, up to that many queries
+    are executed at the same time in a thread pool. Otherwise, queries with a timeout run in a
+    thread of their own. Since queries with a timeout or executed concurrently are run from
+    worker threads, the `executor` must then be thread-safe, e.g. use a connection per thread
+    or a connection pool. Rows are always processed in the thread calling `execute`, in the
+    order of the queries. Checks must call `close` when they are cancelled.
+
+    When `telemetry` is enabled, the duration and number of rows of every query are
+    submitted as the `queries.duration` and `queries.rows` gauges.
+    """
+
+    def __init__(
+        self, check, executor, queries=None, tags=None, error_handler=None, concurrency=1, timeout=None, telemetry=False
+    ):
         self.check = check
         self.executor = executor
         self.queries = queries or []
         self.tags = tags or []
         self.error_handler = error_handler
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.telemetry = telemetry
+
+        # Time of the last execution of the queries with a collection interval
+        self.last_executions = {}
+
+        # Queries still running in a worker thread, after their results were given up on
+        self.pending_queries = {}
+
+        # Created on first use
+        self._pool = None
+
+        # Values of the submission transformers, sent to the check in batches after each query
+        self.submission_batches = []
 
         custom_queries = list(self.check.instance.get('custom_queries', []))
         use_global_custom_queries = self.check.instance.get('use_global_custom_queries', True)
@@ -43,33 +115,143 @@ class QueryManager(object):
         for submission_method, transformer_name in SUBMISSION_METHODS.items():
             method = getattr(self.check, submission_method)
             # Save each method in the initializer -> callable format
-            column_transformers[transformer_name] = create_submission_transformer(method)
+            if submission_method in BATCH_SUBMISSION_METHODS:
+                column_transformers[transformer_name] = create_batch_submission_transformer(
+                    submission_method, method, self.submission_batches
+                )
+            else:
+                column_transformers[transformer_name] = create_submission_transformer(method)
 
         for query in self.queries:
             query.compile(column_transformers, EXTRA_TRANSFORMERS.copy())
 
     def execute(self):
-        logger = self.check.log
-        global_tags = self.tags
-
+        now = time()
+        queries = []
         for query in self.queries:
-            query_name = query.name
-            query_columns = query.columns
-            query_extras = query.extras
-            query_tags = query.tags
-            num_columns = len(query_columns)
-
-            try:
-                rows = self.execute_query(query.query)
-            except Exception as e:
-                if self.error_handler:
-                    logger.error('Error querying %s: %s', query_name, self.error_handler(str(e)))
-                else:
-                    logger.error('Error querying %s: %s', query_name, e)
+            if query.collection_interval:
+                last_execution = self.last_executions.get(query)
+                if last_execution is not None and now - last_execution < query.collection_interval:
+                    continue
+
+            pending_query = self.pending_queries.get(query)
+            if pending_query is not None:
+                if not pending_query.ready():
+                    self.check.log.warning('Query %s is still running, skipping it', query.name)
+                    continue
+
+                del self.pending_queries[query]
 
+            queries.append(query)
+
+        if self.concurrency > 1:
+            results = self.execute_concurrently(queries)
+        else:
+            results = self.execute_serially(queries)
+
+        for query, rows, fetch_duration in results:
+            if rows is None:
                 continue
 
+            # Failed queries are retried on the next run rather than after their collection interval
+            if query.collection_interval:
+                self.last_executions[query] = now
+
+            start_time = time()
+            num_rows = self.process_rows(query, rows)
+
+            duration = fetch_duration + time() - start_time
+            self.check.log.debug('Query %s returned %d rows in %.3f seconds', query.name, num_rows, duration)
+            if self.telemetry:
+                tags = self.tags + ['query:{}'.format(query.name)]
+                self.check.gauge('queries.duration', duration, tags=tags)
+                self.check.gauge('queries.rows', num_rows, tags=tags)
+
+    def execute_serially(self, queries):
+        for query in queries:
+            if self.get_timeout(query) is None:
+                # Stream the rows, they are fetched while being processed
+                start_time = time()
+                rows = self.fetch(query, self.execute_query)
+                yield query, rows, time() - start_time
+            else:
+                # Run each query in its own thread so that a query still running after
+                # its timeout does not hold up the next ones
+                result = QueryThread(self.timed_fetch, (query, self.fetch_all))
+                yield (query,) + self.wait(query, result)
+
+    def execute_concurrently(self, queries):
+        pool = self.get_pool()
+        start_time = time()
+        results = [(query, pool.apply_async(self.timed_fetch, (query, self.fetch_all))) for query in queries]
+
+        for query, result in results:
+            yield (query,) + self.wait(query, result, start_time)
+
+    def wait(self, query, result, start_time=None):
+        timeout = self.get_timeout(query)
+        if timeout is not None and start_time is not None:
+            # Time spent waiting for other queries counts towards the timeout
+            timeout = max(timeout - (time() - start_time), 0)
+
+        try:
+            return result.get(timeout)
+        except TimeoutError:
+            self.pending_queries[query] = result
+            self.check.log.error('Error querying %s: timed out after %s seconds', query.name, self.get_timeout(query))
+            return None, 0
+
+    def timed_fetch(self, query, execute_query):
+        # The start time is taken in the worker so that time spent queued is not counted
+        start_time = time()
+        rows = self.fetch(query, execute_query)
+        return rows, time() - start_time
+
+    def fetch(self, query, execute_query):
+        try:
+            return execute_query(query.query)
+        except Exception as e:
+            if self.error_handler:
+                self.check.log.error('Error querying %s: %s', query.name, self.error_handler(str(e)))
+            else:
+                self.check.log.error('Error querying %s: %s', query.name, e)
+
+    def fetch_all(self, query):
+        return list(self.execute_query(query))
+
+    def get_timeout(self, query):
+        return query.timeout if query.timeout is not None else self.timeout
+
+    def get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(max(self.concurrency, 1))
+
+        return self._pool
+
+    def close(self):
+        """
+        Stops the worker threads, call it when the check is cancelled.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def process_rows(self, query, rows):
+        logger = self.check.log
+
+        query_name = query.name
+        query_extras = query.extras
+        process_row = query.process_row
+        num_columns = len(query.columns)
+        num_rows = 0
+
+        # Rows without tag columns all share the same tags
+        query_tags = list(self.tags)
+        query_tags.extend(query.tags)
+
+        try:
             for row in rows:
+                num_rows += 1
                 if not row:
                     logger.debug('Query %s returned an empty result', query_name)
                     continue
@@ -84,32 +266,7 @@ class QueryManager(object):
                     )
                     continue
 
-                sources = {}
-                submission_queue = []
-
-                tags = list(global_tags)
-                tags.extend(query_tags)
-
-                for (column_name, transformer), value in zip(query_columns, row):
-                    # Columns can be ignored via configuration
-                    if not column_name:
-                        continue
-
-                    sources[column_name] = value
-
-                    column_type, transformer = transformer
-
-                    # The transformer can be None for `source` types. Those such columns do not submit
-                    # anything but are collected into the row values for other columns to reference.
-                    if transformer is None:
-                        continue
-                    elif column_type == 'tag':
-                        tags.append(transformer(None, value))
-                    else:
-                        submission_queue.append((transformer, value))
-
-                for transformer, value in submission_queue:
-                    transformer(sources, value, tags=tags)
+                sources, tags = process_row(row, query_tags)
 
                 for name, transformer in query_extras:
                     try:
@@ -120,6 +277,17 @@ class QueryManager(object):
                     else:
                         if result is not None:
                             sources[name] = result
+        finally:
+            # Submit what was collected even if iterating over the rows failed
+            self.submit_batches()
+
+        return num_rows
+
+    def submit_batches(self):
+        for method, name, modifiers, samples in self.submission_batches:
+            if samples:
+                self.check.submit_batch(method, name, samples, **modifiers)
+                del samples[:]
 
     def execute_query(self, query):
         rows = self.executor(query)
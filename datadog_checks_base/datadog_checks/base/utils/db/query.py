@@ -16,6 +16,14 @@ class Query(object):
         self.columns = None
         self.extras = None
         self.tags = None
+        self.collection_interval = None
+        self.timeout = None
+
+        # Row plan, the columns to read from each row by what they are used for
+        self.source_columns = None
+        self.tag_columns = None
+        self.submission_columns = None
+        self.process_row = None
 
     def compile(self, column_transformers, extra_transformers):
         # Check for previous compilation
@@ -44,6 +52,14 @@ class Query(object):
         if tags is not None and not isinstance(tags, list):
             raise ValueError('field `tags` for {} must be a list'.format(query_name))
 
+        collection_interval = self.query_data.get('collection_interval', 0)
+        if not isinstance(collection_interval, (int, float)) or collection_interval < 0:
+            raise ValueError('field `collection_interval` for {} must be a positive number'.format(query_name))
+
+        timeout = self.query_data.get('timeout')
+        if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+            raise ValueError('field `timeout` for {} must be a positive number'.format(query_name))
+
         # Keep track of all defined names
         sources = {}
 
@@ -169,4 +185,80 @@ class Query(object):
         self.columns = tuple(column_data)
         self.extras = tuple(extra_data)
         self.tags = tags
+        self.collection_interval = collection_interval
+        self.timeout = timeout
+        self.compile_row_plan()
         del self.query_data
+
+    def compile_row_plan(self):
+        # Ignored columns are left out entirely and the remaining ones are split by type once,
+        # so that rows only need to be indexed rather than every column inspected.
+        source_columns = []
+        tag_columns = []
+        submission_columns = []
+        for index, (column_name, transformer) in enumerate(self.columns):
+            if not column_name:
+                continue
+
+            source_columns.append((index, column_name))
+
+            column_type, transformer = transformer
+            if transformer is None:
+                continue
+            elif column_type == 'tag':
+                tag_columns.append((index, transformer))
+            else:
+                submission_columns.append((index, transformer))
+
+        self.source_columns = tuple(source_columns)
+        self.tag_columns = tuple(tag_columns)
+        self.submission_columns = tuple(submission_columns)
+        self.process_row = self.generate_row_processor()
+
+    def generate_row_processor(self):
+        """
+        Generate a function that takes a row and the tags shared by all rows, runs the column
+        transformers and returns the row's sources and tags. The loop over the columns is
+        unrolled, and transformers that only format a tag or queue a sample are inlined.
+        """
+        namespace = {}
+        lines = ['def process_row(row, tags):']
+
+        # Sources are only needed by extras and transformers that are not inlined
+        if self.extras or any(
+            getattr(transformer, 'samples', None) is None for _, transformer in self.submission_columns
+        ):
+            lines.append(
+                '    sources = {{{}}}'.format(
+                    ', '.join('{!r}: row[{}]'.format(column_name, index) for index, column_name in self.source_columns)
+                )
+            )
+        else:
+            lines.append('    sources = None')
+
+        if self.tag_columns:
+            tags = []
+            for index, transformer in self.tag_columns:
+                template = getattr(transformer, 'template', None)
+                if template is not None:
+                    namespace['format_{}'.format(index)] = template.format
+                    tags.append('format_{0}(row[{0}])'.format(index))
+                else:
+                    namespace['tag_{}'.format(index)] = transformer
+                    tags.append('tag_{0}(None, row[{0}])'.format(index))
+
+            lines.append('    tags = tags + [{}]'.format(', '.join(tags)))
+
+        for index, transformer in self.submission_columns:
+            samples = getattr(transformer, 'samples', None)
+            if samples is not None:
+                namespace['append_{}'.format(index)] = samples.append
+                lines.append('    append_{0}((row[{0}], tags))'.format(index))
+            else:
+                namespace['submit_{}'.format(index)] = transformer
+                lines.append('    submit_{0}(sources, row[{0}], tags=tags)'.format(index))
+
+        lines.append('    return sources, tags')
+
+        exec(compile('\n'.join(lines), '<row processor of {}>'.format(self.name), 'exec'), namespace)
+        return namespace['process_row']
@@ -34,6 +34,10 @@ def get_tag(transformers, column_name, **modifiers):
 
         return template.format(value)
 
+    # Lets row processors format the tag directly
+    if not boolean:
+        tag.template = template
+
     return tag
 
 
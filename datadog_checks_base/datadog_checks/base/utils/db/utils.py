@@ -37,6 +37,36 @@ def create_submission_transformer(submit_method):
     return get_transformer
 
 
+# AgentCheck methods that can be submitted with `AgentCheck.submit_batch`
+BATCH_SUBMISSION_METHODS = {'gauge', 'count', 'monotonic_count', 'rate', 'histogram', 'historate'}
+
+# Modifiers supported by `AgentCheck.submit_batch`
+BATCH_MODIFIERS = {'hostname', 'raw'}
+
+
+def create_batch_submission_transformer(method_name, submit_method, submission_batches):
+
+    # Rather than being submitted right away, values are queued along with their tags in a batch per
+    # transformer that the caller sends with `AgentCheck.submit_batch` once all rows are processed.
+    def get_transformer(_transformers, *creation_args, **modifiers):
+        # Only the metric name is expected, defer to regular submission for anything more exotic
+        if len(creation_args) != 1 or not BATCH_MODIFIERS.issuperset(modifiers):
+            return create_submission_transformer(submit_method)(_transformers, *creation_args, **modifiers)
+
+        samples = []
+        submission_batches.append((method_name, creation_args[0], modifiers, samples))
+
+        def transformer(_sources, value, tags=None, **kwargs):
+            samples.append((value, tags))
+
+        # Lets row processors queue samples directly
+        transformer.samples = samples
+
+        return transformer
+
+    return get_transformer
+
+
 def create_extra_transformer(column_transformer, source=None):
     # Every column transformer expects a value to be given but in the post-processing
     # phase the values are determined by references, so to avoid redefining every
@@ -3,12 +3,14 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
 import os
+import time
 from contextlib import contextmanager
 from ipaddress import ip_address, ip_network
 
 import requests
 from requests import auth as requests_auth
-from six import iteritems, string_types
+from requests.adapters import HTTPAdapter
+from six import iteritems, itervalues, string_types
 from six.moves.urllib.parse import urlparse
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -46,6 +48,9 @@ STANDARD_FIELDS = {
     'aws_region': None,
     'aws_service': None,
     'connect_timeout': None,
+    'connection_idle_timeout': None,
+    'connection_max_age': None,
+    'connection_pool_size': None,
     'extra_headers': None,
     'headers': None,
     'kerberos_auth': None,
@@ -90,7 +95,13 @@ KERBEROS_STRATEGIES = {}
 
 class RequestsWrapper(object):
     __slots__ = (
+        '_connection_counts',
         '_session',
+        '_session_created',
+        '_session_last_used',
+        'connection_idle_timeout',
+        'connection_max_age',
+        'connection_pool_size',
         'ignore_tls_warning',
         'log_requests',
         'logger',
@@ -256,6 +267,27 @@ class RequestsWrapper(object):
         # http://docs.python-requests.org/en/master/user/advanced/#keep-alive
         self.persist_connections = is_affirmative(config['persist_connections'])
         self._session = None
+        self._session_created = None
+        self._session_last_used = None
+
+        # Pooling settings of the persistent session. The session is recycled once it has been
+        # idle for longer than `connection_idle_timeout` seconds or is older than `connection_max_age`
+        # seconds, so that servers closing idle keep-alive connections or rotating certificates
+        # do not cause request failures.
+        self.connection_pool_size = None
+        if config['connection_pool_size'] is not None:
+            self.connection_pool_size = int(config['connection_pool_size'])
+
+        self.connection_idle_timeout = None
+        if config['connection_idle_timeout'] is not None:
+            self.connection_idle_timeout = float(config['connection_idle_timeout'])
+
+        self.connection_max_age = None
+        if config['connection_max_age'] is not None:
+            self.connection_max_age = float(config['connection_max_age'])
+
+        # Connections opened and requests sent by the session as of the last call to `connection_stats`
+        self._connection_counts = (0, 0)
 
         # Whether or not to log request information like method and url
         self.log_requests = is_affirmative(config['log_requests'])
@@ -326,15 +358,67 @@ class RequestsWrapper(object):
 
     @property
     def session(self):
+        now = time.time()
+        if self._session is not None and self._session_expired(now):
+            self.close_session()
+
         if self._session is None:
             self._session = requests.Session()
 
+            if self.connection_pool_size is not None:
+                adapter = HTTPAdapter(
+                    pool_connections=self.connection_pool_size, pool_maxsize=self.connection_pool_size
+                )
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+
             # Attributes can't be passed to the constructor
             for option, value in iteritems(self.options):
                 setattr(self._session, option, value)
 
+            self._session_created = now
+
+        self._session_last_used = now
         return self._session
 
+    def _session_expired(self, now):
+        if self.connection_idle_timeout is not None and now - self._session_last_used > self.connection_idle_timeout:
+            return True
+
+        if self.connection_max_age is not None and now - self._session_created > self.connection_max_age:
+            return True
+
+        return False
+
+    def close_session(self):
+        """
+        Close the persistent session, if any, along with all of its pooled connections.
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+            self._connection_counts = (0, 0)
+
+    def connection_stats(self):
+        """
+        Return a tuple of the number of new and reused connections of the persistent
+        session since the last call.
+        """
+        connections = requests_sent = 0
+        if self._session is not None:
+            for pool in iter_connection_pools(self._session):
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+
+        last_connections, last_requests_sent = self._connection_counts
+        self._connection_counts = (connections, requests_sent)
+
+        # Pools may be evicted from their manager, so never report negative values
+        new_connections = max(connections - last_connections, 0)
+        reused_connections = max((requests_sent - last_requests_sent) - new_connections, 0)
+
+        return new_connections, reused_connections
+
     def __del__(self):  # no cov
         try:
             self._session.close()
@@ -379,6 +463,23 @@ def handle_kerberos_cache(cache_file_path):
         os.environ['KRB5CCNAME'] = old_cache_path
 
 
+def iter_connection_pools(session):
+    # Yields every urllib3 connection pool of every adapter mounted on the session
+    for adapter in itervalues(session.adapters):
+        pool_managers = [getattr(adapter, 'poolmanager', None)]
+        pool_managers.extend(itervalues(getattr(adapter, 'proxy_manager', {})))
+
+        for pool_manager in pool_managers:
+            if pool_manager is None:
+                continue
+
+            pools = pool_manager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    yield pool
+
+
 def should_bypass_proxy(url, no_proxy_uris):
     # Accepts a URL and a list of no_proxy URIs
     # Returns True if URL should bypass the proxy.
@@ -1,6 +1,8 @@
 # (C) Datadog, Inc. 2018-present
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
+from collections import defaultdict
+from heapq import nlargest
 
 
 class Limiter(object):
@@ -8,24 +10,46 @@ class Limiter(object):
     Limiter implements a simple cut-off capping logic for object count.
     It is used by the AgentCheck class to limit the number of sets of tags
     that can be set by an instance.
+
+    When objects are submitted with a name, the Limiter also accounts for the number
+    of objects per name, which lets it enforce budgets per name and per tag key, and
+    report the names with the highest cardinality.
     """
 
-    def __init__(self, check_name, object_name, object_limit, warning_func=None):
+    def __init__(self, check_name, object_name, object_limit, warning_func=None, name_budgets=None, tag_budgets=None):
         """
         :param check_name: name of the check using this limiter
         :param object_name: (plural) name of counted objects for warning wording
-        :param object_limit: maximum number of objects to accept before limiting
+        :param object_limit: maximum number of objects to accept before limiting, 0 to only enforce the budgets
         :param warning_func: callback function, called with a string when limit is exceeded
+        :param name_budgets: (optional) mapping of names to the maximum number of objects to accept for them
+        :param tag_budgets: (optional) mapping of tag keys to the maximum number of distinct values to accept
         """
         self.warning = warning_func
         self.name = object_name
         self.limit = object_limit
         self.check_name = check_name
+        self.name_budgets = name_budgets or {}
+        self.tag_budgets = tag_budgets or {}
 
         self.reached_limit = False
         self.count = 0
         self.seen = set()
 
+        # Number of accepted and rejected objects per name
+        self.counts = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+        # Distinct values seen for tag keys that have a budget
+        self.tag_values = defaultdict(set)
+
+        # Names and tag keys whose budget was exceeded, to only warn once
+        self.exceeded_budgets = set()
+
+    @property
+    def has_budgets(self):
+        return bool(self.name_budgets or self.tag_budgets)
+
     def reset(self):
         """
         Resets state and uid set. To be called asap to free memory
@@ -33,40 +57,150 @@ class Limiter(object):
         self.reached_limit = False
         self.count = 0
         self.seen.clear()
+        self.counts.clear()
+        self.rejected.clear()
+        self.tag_values.clear()
+        self.exceeded_budgets.clear()
 
-    def is_reached(self, uid=None):
+    def is_reached(self, uid=None, name=None, tags=None):
         """
         is_reached is to be called for every object that counts towards the limit.
         - When called with no uid, the Limiter assumes this is a new object and
         unconditionally increments the counter (less CPU and memory usage).
         - When a given object can be passed multiple times, a uid must be provided to
         deduplicate calls. Only the first occurrence of a uid will increment the counter.
+        - When a name is provided, the object is accounted for and checked against the budgets
+        of that name and of the keys of its `key:value` tags.
 
         :param uid: (optional) unique identifier of the object, to deduplicate calls
+        :param name: (optional) name of the object, e.g. the metric name
+        :param tags: (optional) tags of the object, checked against the tag key budgets
         :returns: boolean, true if limit exceeded
         """
         if self.reached_limit:
+            if name is not None:
+                self.rejected[name] += 1
             return True
 
-        if uid:
-            if uid in self.seen:
-                return False
-            self.count += 1
+        if uid is not None and uid in self.seen:
+            return False
+
+        if name is not None:
+            if self.has_budgets and self._exceeds_budgets(name, tags):
+                self.rejected[name] += 1
+                return True
+            self.counts[name] += 1
+
+        if uid is not None:
             self.seen.add(uid)
-        else:
-            self.count += 1
-
-        if self.count > self.limit:
-            if self.warning:
-                self.warning(
-                    "Check %s exceeded limit of %s %s, ignoring next ones", self.check_name, self.limit, self.name
-                )
-            self.reached_limit = True
+        self.count += 1
+
+        if self.limit and self.count > self.limit:
+            self._reach_limit()
+            if name is not None:
+                self.counts[name] -= 1
+                self.rejected[name] += 1
             return True
         return False
 
+    def accept(self, count, name=None):
+        """
+        accept is to be called for a batch of new objects that count towards the limit,
+        it unconditionally increments the counter by the size of the batch.
+        Budgets are not enforced, use `is_reached` for every object of the batch to do so.
+
+        :param count: number of objects in the batch
+        :param name: (optional) name of the objects of the batch, e.g. the metric name
+        :returns: int, the number of objects of the batch that fit within the limit
+        """
+        if self.reached_limit:
+            accepted = 0
+        else:
+            accepted = count
+            self.count += count
+
+            if self.limit and self.count > self.limit:
+                accepted = max(count - (self.count - self.limit), 0)
+                self._reach_limit()
+
+        if name is not None:
+            self.counts[name] += accepted
+            if accepted < count:
+                self.rejected[name] += count - accepted
+
+        return accepted
+
+    def top(self, n):
+        """
+        Returns the `n` names with the most objects, along with the number of objects
+        accepted and rejected for them, in decreasing order of objects.
+
+        :param n: number of names to return
+        :returns: list of (name, accepted, rejected) tuples
+        """
+        # Ties are broken by the order in which names were first seen
+        names = list(self.counts)
+        names.extend(name for name in self.rejected if name not in self.counts)
+        return [
+            (name, self.counts.get(name, 0), self.rejected.get(name, 0))
+            for name in nlargest(n, names, key=lambda name: self.counts.get(name, 0) + self.rejected.get(name, 0))
+        ]
+
     def get_status(self):
         """
         Returns the internal state of the limiter for unit tests
         """
         return (self.count, self.limit, self.reached_limit)
+
+    def _reach_limit(self):
+        if self.warning:
+            self.warning("Check %s exceeded limit of %s %s, ignoring next ones", self.check_name, self.limit, self.name)
+        self.reached_limit = True
+
+    def _exceeds_budgets(self, name, tags):
+        budget = self.name_budgets.get(name)
+        if budget is not None and self.counts[name] >= budget:
+            self._exceed_budget(
+                ('name', name),
+                "Check %s exceeded budget of %s %s for `%s`, ignoring next ones",
+                budget,
+                self.name,
+                name,
+            )
+            return True
+
+        if tags and self.tag_budgets:
+            new_values = []
+            for tag in tags:
+                key, _, value = tag.partition(':')
+                budget = self.tag_budgets.get(key)
+                if budget is None:
+                    continue
+
+                values = self.tag_values[key]
+                if value in values:
+                    continue
+                if len(values) >= budget:
+                    self._exceed_budget(
+                        ('tag', key),
+                        "Check %s exceeded budget of %s values for tag `%s` with `%s`, ignoring next ones",
+                        budget,
+                        key,
+                        name,
+                    )
+                    return True
+                new_values.append((values, value))
+
+            # Only record the new values once the object is accepted
+            for values, value in new_values:
+                values.add(value)
+
+        return False
+
+    def _exceed_budget(self, budget, message, *args):
+        if budget in self.exceeded_budgets:
+            return
+
+        self.exceeded_budgets.add(budget)
+        if self.warning:
+            self.warning(message, self.check_name, *args)
@@ -0,0 +1,69 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import OrderedDict
+
+from six.moves import intern
+
+
+class TagCache(object):
+    """
+    TagCache is a bounded LRU cache mapping hashable inputs (sets of tags, labels, ...) to
+    immutable tuples of tags. It lets checks that submit the same tag combinations many times
+    per run share a single tag object instead of building a new one for every submission.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: maximum number of entries to keep, the least recently used ones are evicted first
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, key):
+        """
+        Returns the cached tags for `key`, or None if there are none.
+        """
+        try:
+            tags = self._cache.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+
+        # Re-insert to mark the entry as the most recently used
+        self._cache[key] = tags
+        self.hits += 1
+        return tags
+
+    def set(self, key, tags):
+        """
+        Caches `tags` for `key`, evicting the least recently used entry if the cache is full.
+
+        :returns: tuple, the interned tags
+        """
+        tags = tuple(intern(tag) if isinstance(tag, str) else tag for tag in tags)
+        self._cache[key] = tags
+        if len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+        return tags
+
+    def clear(self):
+        self._cache.clear()
+
+    def flush_stats(self):
+        """
+        Returns the number of hits and misses since the last call and resets them.
+
+        :returns: tuple, (hits, misses)
+        """
+        stats = self.hits, self.misses
+        self.hits = 0
+        self.misses = 0
+        return stats
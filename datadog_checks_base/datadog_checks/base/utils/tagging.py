@@ -1,8 +1,74 @@
 # (C) Datadog, Inc. 2018-present
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
+from time import time
+
+from six import iteritems
 
 try:
     import tagger
 except ImportError:
     from ..stubs import tagger  # noqa: F401
+
+
+class TaggerCache(object):
+    """
+    TaggerCache caches the tags returned by the Agent tagger, keyed by entity id and cardinality, so that
+    checks looking up the tags of the same containers and pods for many metrics query the tagger once per run.
+
+    Entries are dropped by `reset`, to be called at the start of every run, unless `ttl` is set: the tags
+    found are then kept across runs until they expire. Entities without tags are only cached until the next
+    reset so that new containers are tagged as soon as the tagger knows them.
+    """
+
+    def __init__(self, ttl=0):
+        """
+        :param ttl: number of seconds to keep the tags found across runs, 0 to only cache them for a run
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # (entity, cardinality) -> (tags, expiration timestamp or None if only valid for the current run)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def tag(self, entity, cardinality):
+        """
+        Same as `tagger.tag`, the tags are returned as a new list that callers can modify.
+        """
+        key = (entity, cardinality)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            return list(entry[0])
+
+        self.misses += 1
+        tags = tagger.tag(entity, cardinality) or []
+        expiration = time() + self.ttl if tags and self.ttl > 0 else None
+        self._cache[key] = (tuple(tags), expiration)
+        return list(tags)
+
+    def reset(self):
+        """
+        Drops the entries of the previous run, except the unexpired ones when `ttl` is set.
+        """
+        if self.ttl <= 0:
+            self._cache.clear()
+            return
+
+        now = time()
+        self._cache = {key: entry for key, entry in iteritems(self._cache) if entry[1] is not None and entry[1] > now}
+
+    def flush_stats(self):
+        """
+        Returns the number of hits and misses since the last call and resets them.
+
+        :returns: tuple, (hits, misses)
+        """
+        stats = self.hits, self.misses
+        self.hits = 0
+        self.misses = 0
+        return stats
@@ -3,7 +3,11 @@
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import binascii
 import os
+from itertools import chain
 from stat import ST_INO, ST_SIZE
+from time import time
+
+from six import PY3
 
 from .common import ensure_bytes
 
@@ -105,3 +109,222 @@ class TailFile(object):
             # log but survive
             self._log.exception(e)
             raise StopIteration(e)
+
+
+class ChunkedTailFile(object):
+    """
+    Tail engine reading the file in large chunks and splitting lines in memory.
+
+    Unlike `TailFile`, the file is kept open between lines and reads: rotation, removal and
+    truncation are only checked when the end of the file is reached, at most once every
+    `rotation_check_interval` seconds, with a `stat` of the path and a read of the first bytes
+    of the open file. Incomplete lines at the end of the file are buffered until they are complete, or
+    until the file is rotated. The `offset` and `inode` can be persisted to resume after a restart.
+    """
+
+    CRC_SIZE = TailFile.CRC_SIZE
+    DEFAULT_CHUNK_SIZE = 64 * 1024
+
+    ROTATED = 'rotated'
+    TRUNCATED = 'truncated'
+
+    def __init__(
+        self, logger, path, callback, chunk_size=DEFAULT_CHUNK_SIZE, rotation_check_interval=0, offset=None, inode=None,
+    ):
+        """
+        :param logger: Logger object
+        :param path: string, path to the file to tail
+        :param callback: function called with every line, without its line ending
+        :param chunk_size: number of bytes to read at once
+        :param rotation_check_interval: minimum number of seconds between rotation checks, 0 to check at every EOF
+        :param offset: (optional) offset to resume from, e.g. persisted from `offset` by a previous run
+        :param inode: (optional) inode of the file `offset` belongs to, persisted from `inode`. When the file
+            was replaced since, it is read from the beginning.
+        """
+        self._path = path
+        self._log = logger
+        self._callback = callback
+        self._chunk_size = chunk_size
+        self._rotation_check_interval = rotation_check_interval
+
+        self._f = None
+        self._inode = None
+        self._crc = None
+        self._buffer = b''
+        self._last_rotation_check = 0
+
+        # Offset of the first byte of the next line to process
+        self.offset = offset
+        self._resume_inode = inode
+
+        # Number of lines and bytes read since the last call to `flush_stats`
+        self.lines_read = 0
+        self.bytes_read = 0
+        self._stats_start = time()
+
+    def tail(self, line_by_line=True, move_end=True):
+        """Read line-by-line and run callback on each line.
+        line_by_line: yield each time a callback has returned True
+        move_end: start from the last line of the log, ignored when resuming from an offset"""
+        try:
+            if self._f is None:
+                self._open_file(move_end=move_end and self.offset is None)
+
+            while True:
+                for line in self._read_lines():
+                    if self._callback(line) and line_by_line:
+                        yield True
+
+                yield True
+                rotation = self._check_rotation()
+                if rotation is None:
+                    continue
+
+                if rotation == self.ROTATED:
+                    # Process what was written to the rotated file since the last read
+                    lines = chain(self._read_lines(), self._flush_buffer())
+                else:
+                    lines = self._flush_buffer()
+
+                # The last line of the previous file is complete even without a line ending
+                for line in lines:
+                    if self._callback(line) and line_by_line:
+                        yield True
+
+                self.offset = 0
+                self._open_file()
+        except Exception as e:
+            # log but survive
+            self._log.exception(e)
+        finally:
+            self._close_file()
+
+    def open(self, move_end=True):
+        """
+        Open the file ahead of `tail`, at the offset to resume from, or at its end with `move_end`,
+        so that the lines written from now on are read by the first iteration of `tail`.
+        """
+        self._open_file(move_end=move_end and self.offset is None)
+
+    def flush_stats(self):
+        """
+        Returns the number of lines and bytes read and the number of seconds elapsed since the last call,
+        and resets them.
+
+        :returns: tuple, (lines, bytes, seconds)
+        """
+        now = time()
+        stats = self.lines_read, self.bytes_read, now - self._stats_start
+        self.lines_read = 0
+        self.bytes_read = 0
+        self._stats_start = now
+        return stats
+
+    @property
+    def inode(self):
+        """
+        Inode of the file being tailed, to persist along with `offset`.
+        """
+        return self._inode
+
+    def _open_file(self, move_end=False):
+        self._close_file()
+
+        self._f = open(self._path, 'rb')
+        stat = os.fstat(self._f.fileno())
+        if self._resume_inode is not None:
+            if stat[ST_INO] != self._resume_inode:
+                self._log.debug(
+                    "File %s replaced since the offset was saved, reading it from the beginning", self._path
+                )
+                self.offset = 0
+            self._resume_inode = None
+        self._inode = stat[ST_INO]
+        self._crc = self._compute_crc(stat[ST_SIZE])
+        self._buffer = b''
+
+        if move_end:
+            self._log.debug("Opening file %s", self._path)
+            self.offset = stat[ST_SIZE]
+        elif self.offset is None or self.offset > stat[ST_SIZE]:
+            self.offset = 0
+        else:
+            self._log.debug("Opening file %s at %s", self._path, self.offset)
+
+        self._f.seek(self.offset)
+
+    def _close_file(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def _read_lines(self):
+        while True:
+            chunk = self._f.read(self._chunk_size)
+            if not chunk:
+                return
+
+            self.bytes_read += len(chunk)
+            lines = (self._buffer + chunk).split(b'\n')
+
+            # The last element is an incomplete line, if any
+            self._buffer = lines.pop()
+
+            for line in lines:
+                yield self._decode_line(line)
+
+    def _flush_buffer(self):
+        if self._buffer:
+            line, self._buffer = self._buffer, b''
+            yield self._decode_line(line)
+
+    def _decode_line(self, line):
+        self.offset += len(line) + 1
+        self.lines_read += 1
+        # a truncate may have create holes in the file
+        line = line.strip(b'\0').rstrip(b'\r')
+        return line.decode('utf-8', 'replace') if PY3 else line
+
+    def _check_rotation(self):
+        """
+        :returns: `ROTATED` if the file was replaced, `TRUNCATED` if it was truncated, None otherwise
+        """
+        now = time()
+        if now - self._last_rotation_check < self._rotation_check_interval:
+            return
+        self._last_rotation_check = now
+
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            # Keep the removed file open until a new one is created
+            return
+
+        if stat[ST_INO] != self._inode:
+            self._log.debug("File removed, reopening")
+            return self.ROTATED
+
+        size = stat[ST_SIZE]
+        if size < self.offset:
+            self._log.debug("File truncated, reopening")
+        elif self._crc is None:
+            self._crc = self._compute_crc(size)
+            return
+        elif self._compute_crc(size) != self._crc:
+            # Truncated and too much data has already been written (copytruncate and opened files...)
+            self._log.debug("Beginning of file modified, reopening")
+        else:
+            return
+
+        return self.TRUNCATED
+
+    def _compute_crc(self, size):
+        # Compute CRC of the beginning of the file
+        if size < self.CRC_SIZE:
+            return None
+
+        position = self._f.tell()
+        self._f.seek(0)
+        data = self._f.read(self.CRC_SIZE)
+        self._f.seek(position)
+        return binascii.crc32(data)
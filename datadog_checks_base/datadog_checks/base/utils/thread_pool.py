@@ -0,0 +1,344 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from collections import deque
+from threading import Event, Lock, Thread
+from time import time
+
+from six.moves import queue
+
+# Item pushed on the work queue to tell a worker thread to exit
+_SENTINEL = object()
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when the result of a task is not available within its timeout.
+    """
+
+
+class PoolCancelledError(Exception):
+    """
+    Raised when getting the result of a task cancelled before it started.
+    """
+
+
+class AsyncResult(object):
+    """
+    Result of a task submitted to a `BoundedThreadPool`, compatible with the `ApplyResult` of the legacy pool.
+    """
+
+    def __init__(self, callback=None, deadline=None):
+        self._event = Event()
+        self._value = None
+        self._exception = None
+        self._callback = callback
+        self._deadline = deadline
+
+    def get(self, timeout=None):
+        """
+        Returns the value of the task, or raises its exception.
+
+        :param timeout: (optional) maximum number of seconds to wait, defaults to the time left before
+                        the deadline of the task, if any
+        :raises PoolTimeoutError: if the result is not available in time
+        """
+        if timeout is None and self._deadline is not None:
+            timeout = max(self._deadline - time(), 0)
+
+        if not self.wait(timeout):
+            raise PoolTimeoutError('Result not available within {} seconds'.format(timeout))
+
+        if self._exception is not None:
+            raise self._exception
+
+        return self._value
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def ready(self):
+        return self._event.is_set()
+
+    def successful(self):
+        if not self.ready():
+            raise AssertionError('Result is not ready')
+
+        return self._exception is None
+
+    def _set(self, value=None, exception=None):
+        self._value = value
+        self._exception = exception
+        self._event.set()
+
+        if exception is None and self._callback is not None:
+            self._callback(value)
+
+
+class _Timings(object):
+    """
+    Number, average and maximum of durations, so that the instrumentation does not grow with the number of tasks.
+    """
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def summary(self):
+        return {'count': self.count, 'avg': self.total / self.count if self.count else 0, 'max': self.max}
+
+
+class _Task(object):
+    __slots__ = ('func', 'args', 'kwargs', 'result', 'submitted', 'deadline')
+
+    def __init__(self, func, args, kwargs, result, submitted, deadline):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = result
+        self.submitted = submitted
+        self.deadline = deadline
+
+
+class BoundedThreadPool(object):
+    """
+    Pool of worker threads consuming tasks from a bounded work queue, meant to replace the legacy
+    `checks.libs.thread_pool.Pool` with which its `apply_async`, `imap`, `close`, `terminate` and
+    `join` methods are compatible.
+
+    - Submitting tasks blocks while the queue is full, which applies backpressure to the producer.
+    - Tasks can have a timeout: tasks still queued past their deadline are not run, and results
+      wait at most until the deadline by default.
+    - `cancel` drops the queued tasks, e.g. when the check is cancelled, and `close` lets the workers
+      finish them before exiting.
+    - The queue depth, task wait and run times, and worker utilization are tracked and can be
+      submitted as check telemetry with `report`.
+    """
+
+    def __init__(self, nworkers, name='Pool', queue_size=0, task_timeout=None):
+        """
+        :param nworkers: number of worker threads
+        :param name: prefix of the worker threads' name
+        :param queue_size: maximum number of queued tasks, 0 for no limit
+        :param task_timeout: (optional) default timeout of the tasks, in seconds
+        """
+        self.nworkers = nworkers
+        self.task_timeout = task_timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._lock = Lock()
+
+        # Instrumentation since the last call to `flush_stats`
+        self._stats_start = time()
+        self._busy = 0
+        self._busy_time = 0.0
+        self._wait_times = _Timings()
+        self._run_times = _Timings()
+        self._timeouts = 0
+        self._dropped = 0
+        self._cancelled = 0
+
+        self._workers = []
+        for idx in range(nworkers):
+            worker = Thread(target=self._work, name='Worker-{}-{}'.format(name, idx))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def get_nworkers(self):
+        return len([worker for worker in self._workers if worker.is_alive()])
+
+    def apply_async(self, func, args=(), kwds=None, callback=None, timeout=None):
+        """
+        Submit `func(*args, **kwds)` to the pool, blocking while the work queue is full.
+
+        :param callback: (optional) function called with the value of the task once it succeeded
+        :param timeout: (optional) timeout of the task, in seconds, defaults to the `task_timeout` of the pool
+        :returns: AsyncResult
+        """
+        if self._closed:
+            raise ValueError('Pool is closed')
+
+        if timeout is None:
+            timeout = self.task_timeout
+
+        submitted = time()
+        deadline = submitted + timeout if timeout is not None else None
+        result = AsyncResult(callback, deadline)
+        self._queue.put(_Task(func, args, kwds or {}, result, submitted, deadline))
+        return result
+
+    def apply(self, func, args=(), kwds=None):
+        return self.apply_async(func, args, kwds).get()
+
+    def imap(self, func, iterable, chunksize=1):
+        """
+        Lazily submit `func` for every item of `iterable` and yield the values in order. At most twice the
+        number of workers are submitted ahead of the values yielded. `chunksize` is ignored and only
+        accepted for compatibility.
+        """
+        pending = deque()
+        for item in iterable:
+            pending.append(self.apply_async(func, (item,)))
+            if len(pending) >= 2 * self.nworkers:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+
+    def map(self, func, iterable, chunksize=None):
+        return list(self.imap(func, iterable))
+
+    def close(self):
+        """
+        Stop accepting tasks, the workers exit once the queued ones are done.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        for _ in self._workers:
+            self._queue.put(_SENTINEL)
+
+    def cancel(self):
+        """
+        Stop accepting tasks and cancel the queued ones, the workers exit once their current task is done.
+        """
+        self._closed = True
+
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if task is not _SENTINEL:
+                with self._lock:
+                    self._cancelled += 1
+                task.result._set(exception=PoolCancelledError('Task cancelled'))
+
+        for _ in self._workers:
+            self._queue.put(_SENTINEL)
+
+    terminate = cancel
+
+    def join(self, timeout=None):
+        """
+        Wait for the workers to exit, `close` or `cancel` must have been called before.
+
+        :param timeout: (optional) maximum number of seconds to wait for all the workers
+        :returns: bool, whether or not all the workers exited
+        """
+        deadline = time() + timeout if timeout is not None else None
+        for worker in self._workers:
+            worker.join(max(deadline - time(), 0) if deadline is not None else None)
+
+        return not self.get_nworkers()
+
+    def flush_stats(self):
+        """
+        Returns the instrumentation of the pool since the last call and resets it:
+
+          - queue_depth: number of queued tasks
+          - busy: number of workers running a task
+          - utilization: fraction of the time the workers spent running tasks
+          - wait_time: number, average and maximum time spent in the queue by the started tasks, in seconds
+          - run_time: number, average and maximum time spent running the tasks, in seconds
+          - timeouts: number of tasks that were not done before their deadline
+          - dropped: number of tasks not run because their deadline passed before they started
+          - cancelled: number of tasks cancelled before they started
+
+        :returns: dict
+        """
+        now = time()
+        with self._lock:
+            elapsed = now - self._stats_start
+            stats = {
+                'queue_depth': self._queue.qsize(),
+                'busy': self._busy,
+                'utilization': self._busy_time / (elapsed * self.nworkers) if elapsed and self.nworkers else 0,
+                'wait_time': self._wait_times.summary(),
+                'run_time': self._run_times.summary(),
+                'timeouts': self._timeouts,
+                'dropped': self._dropped,
+                'cancelled': self._cancelled,
+            }
+            self._stats_start = now
+            self._busy_time = 0.0
+            self._wait_times = _Timings()
+            self._run_times = _Timings()
+            self._timeouts = 0
+            self._dropped = 0
+            self._cancelled = 0
+
+        return stats
+
+    def report(self, check, prefix, tags=None):
+        """
+        Submit the instrumentation of the pool since the last call with the metric submission methods of `check`.
+
+        :returns: the stats submitted, see `flush_stats`
+        """
+        stats = self.flush_stats()
+
+        check.gauge('{}.queue_depth'.format(prefix), stats['queue_depth'], tags=tags, raw=True)
+        check.gauge('{}.utilization'.format(prefix), stats['utilization'], tags=tags, raw=True)
+        check.count('{}.tasks.timeouts'.format(prefix), stats['timeouts'], tags=tags, raw=True)
+        check.count('{}.tasks.dropped'.format(prefix), stats['dropped'], tags=tags, raw=True)
+        check.count('{}.tasks.cancelled'.format(prefix), stats['cancelled'], tags=tags, raw=True)
+        check.count('{}.tasks.completed'.format(prefix), stats['run_time']['count'], tags=tags, raw=True)
+        for name in ('wait_time', 'run_time'):
+            for aggregate in ('avg', 'max'):
+                check.gauge(
+                    '{}.task.{}.{}'.format(prefix, name, aggregate), stats[name][aggregate], tags=tags, raw=True
+                )
+
+        return stats
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is _SENTINEL:
+                return
+
+            start = time()
+            if task.deadline is not None and start > task.deadline:
+                with self._lock:
+                    self._timeouts += 1
+                    self._dropped += 1
+                task.result._set(exception=PoolTimeoutError('Task timed out before it started'))
+                continue
+
+            with self._lock:
+                self._busy += 1
+                self._wait_times.add(start - task.submitted)
+
+            value = exception = None
+            try:
+                value = task.func(*task.args, **task.kwargs)
+            except Exception as e:
+                exception = e
+
+            end = time()
+            with self._lock:
+                self._busy -= 1
+                self._busy_time += end - start
+                self._run_times.add(end - start)
+                if task.deadline is not None and end > task.deadline:
+                    self._timeouts += 1
+
+            try:
+                task.result._set(value, exception)
+            except Exception:
+                # Errors of the callback must not kill the worker
+                pass
@@ -2,9 +2,19 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import functools
-from threading import Thread
+from collections import defaultdict, deque
+from threading import Condition, Event, Lock, Thread
+from time import time
 
-_thread_by_func = {}
+from six import itervalues
+
+try:
+    import datadog_agent
+except ImportError:
+    from ..stubs import datadog_agent
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_ABANDONED = 4
 
 
 class TimeoutException(Exception):
@@ -38,36 +48,304 @@ class ThreadMethod(Thread):
             self.exception = None
 
 
-def timeout(timeout):
+class _Call(object):
+    __slots__ = (
+        'func',
+        'args',
+        'kwargs',
+        'owner',
+        'key',
+        'done',
+        'result',
+        'exception',
+        'started',
+        'cancelled',
+        'abandoned',
+    )
+
+    def __init__(self, func, args, kwargs, owner, key):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.owner = owner
+        self.key = key
+        self.done = Event()
+        self.result = None
+        self.exception = None
+        self.started = False
+        self.cancelled = False
+        self.abandoned = False
+
+
+class DeadlineExecutor(object):
     """
-    A decorator to timeout a function. Decorated method calls are executed in a separate new thread
-    with a specified timeout.
-    Also check if a thread for the same function already exists before creating a new one.
-    Note: Compatible with Windows (thread based).
+    Bounded pool of daemon worker threads running calls with a deadline.
+
+    When a call exceeds its deadline the caller gets a `TimeoutException` right away. If the call
+    had not started yet it is cancelled, otherwise it is abandoned: it keeps its worker until it returns.
+    A new call with the same key as an abandoned one waits for it instead of being run again. Calls of
+    an owner (usually a check) with `max_abandoned` abandoned calls are rejected until those return,
+    so that a check with hung dependencies can't take the workers of the others.
     """
 
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            key = "{0}:{1}:{2}:{3}".format(id(func), func.__name__, args, kwargs)
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_abandoned=DEFAULT_MAX_ABANDONED):
+        """
+        :param max_workers: maximum number of worker threads
+        :param max_abandoned: maximum number of abandoned calls per owner, further calls are rejected
+        """
+        self.max_workers = max_workers
+        self.max_abandoned = max_abandoned
 
-            if key in _thread_by_func:
-                # A thread for the same function already exists.
-                worker = _thread_by_func[key]
-            else:
-                worker = ThreadMethod(func, args, kwargs)
-                _thread_by_func[key] = worker
+        self._lock = Lock()
+        self._pending = deque()
+        self._available = Condition(self._lock)
+        self._workers = 0
+        self._busy = 0
+
+        # Owner -> number of abandoned calls still running
+        self._abandoned = defaultdict(int)
+
+        # Key -> abandoned call still running
+        self._abandoned_calls = {}
+
+        # Owner -> counters since the last call to `flush_stats`
+        self._timeouts = defaultdict(int)
+        self._rejected = defaultdict(int)
+        self._saturated = defaultdict(int)
+
+    def call(self, func, args=(), kwargs=None, timeout=None, owner=None, key=None):
+        """
+        Run `func` in a worker thread and wait for its result for at most `timeout` seconds.
+
+        :param owner: (optional) hashable the call is accounted to, e.g. a check id, defaults to `func`
+        :param key: (optional) hashable identifying the call, an abandoned call with the same key is waited for
+                    instead of running `func` again
+        :raises TimeoutException: if the deadline is exceeded, or the owner has too many abandoned calls
+        """
+        if owner is None:
+            owner = func
+
+        with self._lock:
+            call = self._abandoned_calls.get(key) if key is not None else None
+            if call is None:
+                abandoned = self._abandoned.get(owner, 0)
+                if abandoned >= self.max_abandoned:
+                    self._rejected[owner] += 1
+                    raise TimeoutException(
+                        '{} previous call(s) of {} timed out and are still running'.format(abandoned, owner)
+                    )
 
-            worker.join(timeout)
-            if worker.is_alive():
-                raise TimeoutException()
+                call = _Call(func, args, kwargs or {}, owner, key)
+                if self._busy + len(self._pending) >= self._workers:
+                    if self._workers < self.max_workers:
+                        self._start_worker()
+                    else:
+                        self._saturated[owner] += 1
 
-            del _thread_by_func[key]
+                self._pending.append(call)
+                self._available.notify()
 
-            if worker.exception:
-                raise worker.exception
+        if not call.done.wait(timeout):
+            with self._lock:
+                if not call.done.is_set():
+                    self._timeouts[owner] += 1
+                    if call.abandoned:
+                        # Waited for a previous call with the same key
+                        raise TimeoutException()
+
+                    if call.started:
+                        call.abandoned = True
+                        self._abandoned[call.owner] += 1
+                        if call.key is not None:
+                            self._abandoned_calls[call.key] = call
+                    else:
+                        call.cancelled = True
+
+                    raise TimeoutException()
+
+        if call.exception is not None:
+            raise call.exception
+
+        return call.result
+
+    def flush_stats(self, owner=None):
+        """
+        Returns the state of the pool along with the number of abandoned calls and of timed out, rejected
+        and saturated calls (calls that had to wait for a worker to be available) since the last call,
+        and resets them.
+
+        :param owner: (optional) only return the calls of this owner, defaults to the calls of every owner
+        :returns: dict
+        """
+        with self._lock:
+            stats = {'workers': self._workers, 'busy': self._busy}
+            if owner is None:
+                stats['abandoned'] = sum(itervalues(self._abandoned))
+                for name, counter in (
+                    ('timeouts', self._timeouts),
+                    ('rejected', self._rejected),
+                    ('saturated', self._saturated),
+                ):
+                    stats[name] = sum(itervalues(counter))
+                    counter.clear()
             else:
-                return worker.result
+                stats['abandoned'] = self._abandoned.get(owner, 0)
+                stats['timeouts'] = self._timeouts.pop(owner, 0)
+                stats['rejected'] = self._rejected.pop(owner, 0)
+                stats['saturated'] = self._saturated.pop(owner, 0)
+
+        return stats
+
+    def report(self, check, prefix, tags=None):
+        """
+        Submit the state of the pool and the calls of `check`, accounted to its `check_id`, since the last call
+        with the metric submission methods of `check`.
+        """
+        stats = self.flush_stats(owner=check.check_id)
+
+        check.gauge('{}.workers'.format(prefix), stats['workers'], tags=tags, raw=True)
+        check.gauge('{}.busy'.format(prefix), stats['busy'], tags=tags, raw=True)
+        check.gauge('{}.abandoned'.format(prefix), stats['abandoned'], tags=tags, raw=True)
+        check.count('{}.timeouts'.format(prefix), stats['timeouts'], tags=tags, raw=True)
+        check.count('{}.rejected'.format(prefix), stats['rejected'], tags=tags, raw=True)
+        check.count('{}.saturated'.format(prefix), stats['saturated'], tags=tags, raw=True)
+
+    def _start_worker(self):
+        self._workers += 1
+        worker = Thread(target=self._work, name='DeadlineExecutor-{}'.format(self._workers))
+        worker.daemon = True
+        worker.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._available.wait()
+
+                call = self._pending.popleft()
+                if call.cancelled:
+                    continue
+
+                call.started = True
+                self._busy += 1
+
+            try:
+                call.result = call.func(*call.args, **call.kwargs)
+            except Exception as e:
+                call.exception = e
+
+            with self._lock:
+                self._busy -= 1
+                if call.abandoned:
+                    self._abandoned[call.owner] -= 1
+                    if not self._abandoned[call.owner]:
+                        del self._abandoned[call.owner]
+                    if self._abandoned_calls.get(call.key) is call:
+                        del self._abandoned_calls[call.key]
+
+                call.done.set()
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_executor():
+    """
+    Returns the executor shared by all checks, creating it on first use. Its size and the cap of abandoned
+    calls per owner are set with the `integration_timeout_workers` and `integration_timeout_max_abandoned`
+    options of the Agent configuration.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DeadlineExecutor(
+                    max_workers=int(datadog_agent.get_config('integration_timeout_workers') or DEFAULT_MAX_WORKERS),
+                    max_abandoned=int(
+                        datadog_agent.get_config('integration_timeout_max_abandoned') or DEFAULT_MAX_ABANDONED
+                    ),
+                )
+
+    return _executor
+
+
+class Deadline(object):
+    """
+    Time budget shared by several calls, e.g. for a whole check run::
+
+        with Deadline(10, owner=self.check_id) as deadline:
+            for host in hosts:
+                deadline.call(resolve, args=(host,), timeout=2)
+
+    Every call is run by the shared executor, with the remaining time of the budget as its deadline.
+    """
+
+    def __init__(self, seconds, owner=None, executor=None):
+        """
+        :param seconds: time budget, in seconds
+        :param owner: (optional) hashable the calls are accounted to for the abandoned calls cap
+        :param executor: (optional) executor running the calls, defaults to the shared one
+        """
+        self.end = time() + seconds
+        self.owner = owner
+        self.executor = executor or get_executor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def remaining(self):
+        return max(self.end - time(), 0)
+
+    @property
+    def expired(self):
+        return time() >= self.end
+
+    def check(self):
+        """
+        :raises TimeoutException: if the budget is exhausted
+        """
+        if self.expired:
+            raise TimeoutException()
+
+    def call(self, func, args=(), kwargs=None, timeout=None):
+        """
+        Run `func` with the remaining time of the budget, or `timeout` if it is lower, as its deadline.
+
+        :raises TimeoutException: if the deadline is exceeded
+        """
+        self.check()
+
+        remaining = self.remaining
+        if timeout is not None:
+            remaining = min(timeout, remaining)
+
+        return self.executor.call(func, args, kwargs, timeout=remaining, owner=self.owner)
+
+
+def timeout(timeout, owner=None):
+    """
+    A decorator to timeout a function. Decorated method calls are executed by the shared pool
+    of worker threads with a specified timeout, and accounted to `owner` (e.g. the `check_id` of the
+    calling check), or to the function if not set.
+    A call with the same arguments as a previous one that timed out and is still running waits for it.
+    Note: Compatible with Windows (thread based).
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+
+            return get_executor().call(func, args, kwargs, timeout=timeout, owner=owner, key=key)
 
         return wrapper
 
@@ -0,0 +1,81 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import pytest
+
+from datadog_checks.base import AgentCheck
+
+
+@pytest.fixture
+def check():
+    return AgentCheck('test', {}, [{}])
+
+
+def test_assert_metric_indexes(aggregator, check):
+    check.gauge('metric', 1, tags=['b:2', 'a:1'])
+    check.gauge('metric', 2, tags=['a:1'], hostname='host')
+    check.rate('metric', 3, tags=['c:3'])
+    check.count('other', 4, tags=['a:1'])
+    check.count('other', 5, tags=['a:1'])
+
+    aggregator.assert_metric('metric', count=3)
+    aggregator.assert_metric('metric', value=1, tags=['a:1', 'b:2'], count=1)
+    aggregator.assert_metric('metric', tags=['a:1'], count=1)
+    aggregator.assert_metric('metric', hostname='host', count=1)
+    aggregator.assert_metric('metric', hostname='host', tags=['b:2', 'a:1'], count=0)
+    aggregator.assert_metric('metric', metric_type=aggregator.RATE, count=1)
+    aggregator.assert_metric('metric', metric_type=aggregator.GAUGE, tags=['c:3'], count=0)
+    aggregator.assert_metric('other', value=9, tags=['a:1'])
+
+    aggregator.assert_metric_has_tag('metric', 'a:1', count=2)
+    aggregator.assert_metric_has_tag('metric', 'd:4', count=0)
+    aggregator.assert_metric_has_tag_prefix('metric', 'c', count=1)
+    aggregator.assert_all_metrics_covered()
+
+    with pytest.raises(AssertionError, match="Needed exactly 1 candidates for 'metric', got 0"):
+        aggregator.assert_metric('metric', value=2, tags=['b:2'], count=1)
+
+
+def test_metrics_normalized(aggregator, check):
+    check.gauge('metric', 1, tags=[b'foo:bar', u'baz'], hostname=b'host')
+
+    metric = aggregator.metrics('metric')[0]
+    assert metric.name == u'metric'
+    assert metric.tags == [u'foo:bar', u'baz']
+    assert metric.hostname == u'host'
+
+
+def test_assert_metrics(aggregator, check):
+    check.gauge('metric', 1, tags=['a:1'])
+    check.gauge('other', 2)
+
+    aggregator.assert_metrics(['metric', {'name': 'other', 'value': 2, 'count': 1}])
+
+    with pytest.raises(AssertionError, match='2 metric assertion\\(s\\) failed') as e:
+        aggregator.assert_metrics(
+            [{'name': 'metric', 'tags': ['a:2']}, {'name': 'other', 'value': 3}, {'name': 'metric', 'value': 1}]
+        )
+    assert "Needed at least 1 candidates for 'metric', got 0" in str(e.value)
+    assert "Needed at least 1 candidates for 'other', got 0" in str(e.value)
+
+
+def test_assert_no_duplicate_metrics(aggregator, check):
+    check.gauge('metric', 1, tags=['a:1', 'b:2'])
+    check.gauge('metric', 2, tags=['b:2', 'a:1'], hostname='host')
+    check.rate('metric', 3, tags=['b:2', 'a:1'])
+    check.monotonic_count('metric', 4, tags=['a:1', 'b:2'])
+    check.monotonic_count('metric', 5, tags=['a:1', 'b:2'])
+    aggregator.assert_no_duplicate_metrics()
+
+    check.gauge('metric', 6, tags=['b:2', 'a:1'])
+    with pytest.raises(AssertionError, match='Duplicate metrics found'):
+        aggregator.assert_no_duplicate_metrics()
+
+
+def test_reset(aggregator, check):
+    check.gauge('metric', 1, tags=['a:1'])
+    aggregator.reset()
+
+    aggregator.assert_metric('metric', count=0)
+    aggregator.assert_metric('metric', tags=['a:1'], count=0)
+    aggregator.assert_metric_has_tag('metric', 'a:1', count=0)
@@ -4,6 +4,7 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import json
+import os
 from collections import OrderedDict
 
 import mock
@@ -512,6 +513,63 @@ class TestTags:
         assert normalized_tags == ['tag:foo']
         assert 'Error encoding tag' not in caplog.text
 
+    def test_tag_cache(self):
+        check = AgentCheck('test', {}, [{'tag_cache_size': 1}])
+        tags = [None, b'tag:foo', u'tag:bar']
+
+        normalized_tags = check._normalize_tags_type(tags)
+        assert normalized_tags == tuple(check._normalize_tags(tags))
+        # The same immutable tags are shared by all the submissions
+        assert normalized_tags is check._normalize_tags_type(tags)
+        assert check.tag_cache.flush_stats() == (1, 1)
+
+        # Tags with a device name are not cached
+        check._normalize_tags_type(tags, 'dev')
+        assert check.tag_cache.flush_stats() == (0, 0)
+
+    def test_tag_cache_submission(self, aggregator):
+        check = AgentCheck('test', {}, [{'tag_cache_size': 1}])
+        tags = [b'tag:foo', u'tag:bar']
+
+        check.gauge('metric', 1, tags=tags)
+        check.service_check('service_check', AgentCheck.OK, tags=tags)
+        check.event({'msg_text': 'text', 'tags': tags})
+        check.submit_batch('count', 'batch', [(1, ['baz:qux'])], tags=tags)
+
+        aggregator.assert_metric('metric', value=1, tags=['tag:foo', 'tag:bar'], count=1)
+        aggregator.assert_metric('batch', value=1, tags=['tag:foo', 'tag:bar', 'baz:qux'], count=1)
+        aggregator.assert_service_check('service_check', status=AgentCheck.OK, tags=['tag:foo', 'tag:bar'])
+        aggregator.assert_event('text', tags=['tag:foo', 'tag:bar'])
+        assert check.tag_cache.flush_stats() == (3, 2)
+
+    def test_tag_cache_telemetry(self, aggregator):
+        check = AgentCheck('test', {}, [{'tag_cache_size': 1, 'telemetry': True}])
+        check.check = lambda _: [check.gauge('metric', 1, tags=['tag:foo']) for _ in range(3)]
+
+        check.run()
+        aggregator.assert_metric('datadog.integration.tag_cache.hits', value=2, count=1)
+        aggregator.assert_metric('datadog.integration.tag_cache.misses', value=1, count=1)
+        # The stats are reset every run
+        assert check.tag_cache.flush_stats() == (0, 0)
+
+        aggregator.reset()
+        check.run()
+        aggregator.assert_metric('datadog.integration.tag_cache.hits', value=3, count=1)
+        aggregator.assert_metric('datadog.integration.tag_cache.misses', value=0, count=1)
+
+    def test_tag_cache_telemetry_disabled(self, aggregator):
+        check = AgentCheck('test', {}, [{'tag_cache_size': 1}])
+        check.check = lambda _: check.gauge('metric', 1, tags=['tag:foo'])
+
+        check.run()
+        aggregator.assert_metric('metric', count=1)
+        aggregator.assert_all_metrics_covered()
+        assert check.tag_cache.flush_stats() == (0, 0)
+
+    def test_tag_cache_disabled(self):
+        check = AgentCheck('test', {}, [{}])
+        assert check.tag_cache is None
+
     def test_external_host_tag_normalization(self):
         """
         Tests that the external_host_tag modifies in place the list of tags in the provided object
@@ -533,6 +591,61 @@ class TestTags:
                 set_external_tags.assert_called_with([('hostnam\xc3\xa9', {'src_name': ['key1:val1']})])
 
 
+class TestSubmitBatch:
+    def test_samples(self, aggregator):
+        check = AgentCheck()
+        check.__NAMESPACE__ = 'test'
+
+        check.submit_batch(
+            'gauge', 'metric', [(1, ['foo:bar']), (2, None), (None, ['baz:qux']), (3, ['baz:qux'], 'host')], tags=['t']
+        )
+
+        aggregator.assert_metric('test.metric', 1, tags=['t', 'foo:bar'], hostname='')
+        aggregator.assert_metric('test.metric', 2, tags=['t'], hostname='')
+        aggregator.assert_metric('test.metric', 3, tags=['t', 'baz:qux'], hostname='host')
+        aggregator.assert_metric('test.metric', count=3)
+
+    def test_sample_tags_normalized_once(self, aggregator):
+        check = AgentCheck()
+        samples = [(i, ['foo:bar', 'baz:{}'.format(i % 2)]) for i in range(10)]
+
+        with mock.patch.object(check, '_normalize_tags_type', wraps=check._normalize_tags_type) as normalize:
+            check.submit_batch('gauge', 'metric', samples, tags=['t'])
+
+        # Once for the shared tags and once per distinct set of sample tags
+        assert normalize.call_count == 3
+        aggregator.assert_metric('metric', tags=['t', 'foo:bar', 'baz:0'], count=5)
+        aggregator.assert_metric('metric', tags=['t', 'foo:bar', 'baz:1'], count=5)
+
+    def test_methods(self, aggregator):
+        check = AgentCheck()
+
+        for method in ('gauge', 'count', 'monotonic_count', 'rate', 'histogram', 'historate'):
+            check.submit_batch(method, method, [(0, [])])
+            aggregator.assert_metric(method, metric_type=getattr(aggregator, method.upper()), count=1)
+
+    def test_raw(self, aggregator):
+        check = AgentCheck()
+        check.__NAMESPACE__ = 'test'
+
+        check.submit_batch('count', 'metric', [(0, [])], raw=True)
+
+        aggregator.assert_metric('metric', count=1)
+
+    def test_unknown_method(self):
+        check = AgentCheck()
+
+        with pytest.raises(ValueError):
+            check.submit_batch('set', 'metric', [(0, [])])
+
+    def test_non_float_metric(self, aggregator):
+        check = AgentCheck()
+
+        with pytest.raises(ValueError):
+            check.submit_batch('gauge', 'metric', [(1, []), ('85k', [])])
+        aggregator.assert_metric('metric', count=0)
+
+
 class LimitedCheck(AgentCheck):
     DEFAULT_METRIC_LIMIT = 10
 
@@ -583,6 +696,68 @@ class TestLimits:
         assert len(check.get_warnings()) == 1
         assert len(aggregator.metrics("metric")) == 29
 
+    def test_metric_limit_batch_gauges(self, aggregator):
+        check = LimitedCheck()
+
+        check.submit_batch('gauge', 'metric', [(0, ['i:{}'.format(i)]) for i in range(6)])
+        assert len(check.get_warnings()) == 0
+        assert len(aggregator.metrics("metric")) == 6
+
+        check.submit_batch('gauge', 'metric', [(0, ['j:{}'.format(i)]) for i in range(6)])
+        assert len(check.get_warnings()) == 1
+        assert len(aggregator.metrics("metric")) == 10
+
+    def test_metric_limit_batch_count(self, aggregator):
+        check = LimitedCheck()
+
+        check.submit_batch('count', 'metric', [(0, [], 'host-single')] * 20)
+        assert len(check.get_warnings()) == 0
+        assert len(aggregator.metrics("metric")) == 20
+
+        check.submit_batch('count', 'metric', [(0, [], 'host-{}'.format(i)) for i in range(20)])
+        assert len(check.get_warnings()) == 1
+        assert len(aggregator.metrics("metric")) == 29
+
+    def test_metric_context_budgets(self, aggregator):
+        instances = [{"metric_context_budgets": {"test.foo": 3}, "tag_value_budgets": {"pod": 4}}]
+        check = AgentCheck("test", {}, instances)
+        check.__NAMESPACE__ = 'test'
+
+        for i in range(0, 10):
+            check.gauge("foo", 0, tags=["i:{}".format(i)])
+            check.count("bar", 0, tags=["pod:{}".format(i)])
+            check.count("bar", 0, tags=["pod:{}".format(i)])
+        assert len(check.get_warnings()) == 2
+        assert len(aggregator.metrics("test.foo")) == 3
+        assert len(aggregator.metrics("test.bar")) == 8
+
+        check.submit_batch('gauge', 'foo', [(0, ['j:{}'.format(i)]) for i in range(5)])
+        assert len(aggregator.metrics("test.foo")) == 3
+
+    def test_cardinality_reporting(self, aggregator):
+        check = AgentCheck("test", {}, [{"max_returned_metrics": 5, "cardinality_top_n": 1}])
+        check.check = lambda _: [check.gauge("metric{}".format(i % 2), 0) for i in range(0, 9)]
+
+        check.run()
+        aggregator.assert_metric('datadog.integration.metric_contexts', 3, tags=['metric_name:metric0'], count=1)
+        aggregator.assert_metric(
+            'datadog.integration.metric_contexts.dropped', 2, tags=['metric_name:metric0'], count=1
+        )
+        aggregator.assert_metric('datadog.integration.metric_contexts', count=1)
+        assert check.get_warnings()[-1] == (
+            'Metrics with the most contexts this run: metric0 (3 sent, 2 dropped), metric1 (2 sent, 2 dropped)'
+        )
+        assert check.metric_limiter.get_status() == (0, 5, False)
+
+        # Not warned again while the same metrics are dropped
+        check.get_warnings()
+        check.run()
+        assert check.get_warnings() == ['Check test exceeded limit of 5 metrics, ignoring next ones']
+
+    def test_cardinality_top_n_invalid(self):
+        check = AgentCheck("test", {}, [{"cardinality_top_n": "foo"}])
+        assert check.cardinality_top_n == 0
+
     def test_metric_limit_instance_config(self, aggregator):
         instances = [{"max_returned_metrics": 42}]
         check = AgentCheck("test", {}, instances)
@@ -700,3 +875,26 @@ class TestCheckInitializations:
         check.run()
 
         assert check.initialize.call_count == 2
+
+
+class TestProfiling:
+    def test_profile_cpu(self, aggregator, tmpdir):
+        class TestCheck(AgentCheck):
+            def check(self, _):
+                self.gauge('metric', 1)
+
+        location = str(tmpdir)
+        check = TestCheck('test', {'profile_cpu': location, 'profile_cpu_limit': 2}, [{}])
+        check.check_id = 'test:123'
+
+        assert check.run() == ''
+
+        aggregator.assert_metric('metric', 1)
+        aggregator.assert_metric_has_tag('datadog.agent.profile.cpu.check_run_time', 'check_name:test')
+        function_metrics = aggregator.metrics('datadog.agent.profile.cpu.function.cumulative_time')
+        assert len(function_metrics) == 2
+        for metric in function_metrics:
+            assert 'check_name:test' in metric.tags
+            assert any(tag.startswith('function:') for tag in metric.tags)
+
+        assert len(os.listdir(os.path.join(location, 'test', '123'))) == 1
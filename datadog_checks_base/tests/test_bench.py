@@ -0,0 +1,60 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+from datadog_checks.base import AgentCheck
+from datadog_checks.base.utils.db import Query, QueryManager
+
+ROWS = [['schema{}'.format(i % 50), 'table{}'.format(i), i, i * 2, 'unused'] for i in range(20000)]
+
+
+def test_query_manager_rows(benchmark):
+    check = AgentCheck('test', {}, [{}])
+    query_manager = QueryManager(
+        check,
+        lambda _: ROWS,
+        [
+            Query(
+                {
+                    'name': 'table stats',
+                    'query': 'foo',
+                    'columns': [
+                        {'name': 'schema', 'type': 'tag'},
+                        {'name': 'table', 'type': 'tag'},
+                        {'name': 'table.rows', 'type': 'gauge'},
+                        {'name': 'table.size', 'type': 'gauge'},
+                        {},
+                    ],
+                }
+            )
+        ],
+        tags=['test:foo'],
+    )
+    query_manager.compile_queries()
+
+    # Only measure the processing of the rows
+    def discard_batches():
+        for _, _, _, samples in query_manager.submission_batches:
+            del samples[:]
+
+    query_manager.submit_batches = discard_batches
+
+    benchmark(query_manager.execute)
+
+
+def test_aggregator_assertions(benchmark, aggregator):
+    check = AgentCheck('test', {}, [{}])
+
+    # A million metrics spread over 1000 names of 1000 contexts
+    for i in range(1000):
+        name = 'metric{}'.format(i)
+        for j in range(1000):
+            check.gauge(name, j, tags=['context:{}'.format(j), 'pod:{}'.format(j % 100), 'test:foo'])
+
+    def assert_metrics():
+        for i in range(0, 1000, 10):
+            name = 'metric{}'.format(i)
+            aggregator.assert_metric(name, count=1000)
+            aggregator.assert_metric(name, value=i, tags=['test:foo', 'pod:{}'.format(i % 100), 'context:{}'.format(i)])
+            aggregator.assert_metric_has_tag(name, 'pod:1', count=10)
+
+    benchmark(assert_metrics)
@@ -2,7 +2,10 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 import logging
+import threading
+import time
 
+import mock
 import pytest
 
 from datadog_checks.base import AgentCheck
@@ -118,6 +121,20 @@ class TestQueryCompilation:
         with pytest.raises(ValueError, match='^field `tags` for test query must be a list$'):
             query_manager.compile_queries()
 
+    def test_collection_interval_not_number(self):
+        query_manager = create_query_manager(
+            {'name': 'test query', 'query': 'foo', 'columns': [{}], 'collection_interval': '5m'}
+        )
+
+        with pytest.raises(ValueError, match='^field `collection_interval` for test query must be a positive number$'):
+            query_manager.compile_queries()
+
+    def test_timeout_not_positive(self):
+        query_manager = create_query_manager({'name': 'test query', 'query': 'foo', 'columns': [{}], 'timeout': 0})
+
+        with pytest.raises(ValueError, match='^field `timeout` for test query must be a positive number$'):
+            query_manager.compile_queries()
+
     def test_column_not_dict(self):
         query_manager = create_query_manager(
             {'name': 'test query', 'query': 'foo', 'columns': [['column']], 'tags': ['test:bar']}
@@ -1164,6 +1181,213 @@ class TestSubmission:
         aggregator.assert_all_metrics_covered()
 
 
+class TestExecution:
+    def test_collection_interval(self, aggregator):
+        query_manager = create_query_manager(
+            {'name': 'cheap query', 'query': 'foo', 'columns': [{'name': 'test.foo', 'type': 'gauge'}]},
+            {
+                'name': 'heavy query',
+                'query': 'bar',
+                'columns': [{'name': 'test.bar', 'type': 'gauge'}],
+                'collection_interval': 300,
+            },
+            executor=mock_executor([[1]]),
+        )
+        query_manager.compile_queries()
+
+        for now in (1000, 1100, 1300):
+            with mock.patch('datadog_checks.base.utils.db.core.time', return_value=now):
+                query_manager.execute()
+
+        aggregator.assert_metric('test.foo', 1, count=3)
+        aggregator.assert_metric('test.bar', 1, count=2)
+        aggregator.assert_all_metrics_covered()
+
+    def test_concurrency(self, aggregator):
+        executed = []
+
+        def executor(query):
+            executed.append(threading.current_thread())
+            return [[int(query)]]
+
+        query_manager = create_query_manager(
+            *[
+                {'name': 'query {}'.format(i), 'query': str(i), 'columns': [{'name': 'test.foo', 'type': 'gauge'}]}
+                for i in range(10)
+            ],
+            executor=executor,
+            concurrency=4
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+        query_manager.close()
+
+        assert len(executed) == 10
+        assert threading.current_thread() not in executed
+        assert [metric.value for metric in aggregator.metrics('test.foo')] == list(range(10))
+
+    def test_timeout(self, caplog, aggregator):
+        event = threading.Event()
+
+        def executor(query):
+            if query == 'slow':
+                event.wait(5)
+            return [[1]]
+
+        query_manager = create_query_manager(
+            {
+                'name': 'slow query',
+                'query': 'slow',
+                'columns': [{'name': 'test.slow', 'type': 'gauge'}],
+                'timeout': 0.1,
+            },
+            {'name': 'fast query', 'query': 'fast', 'columns': [{'name': 'test.fast', 'type': 'gauge'}]},
+            {
+                'name': 'timed query',
+                'query': 'timed',
+                'columns': [{'name': 'test.timed', 'type': 'gauge'}],
+                'timeout': 1,
+            },
+            executor=executor,
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+
+        # The slow query is skipped while it is still running, without holding up the other timed queries
+        query_manager.execute()
+        event.set()
+        query_manager.close()
+
+        assert 'Error querying slow query: timed out after 0.1 seconds' in caplog.text
+        assert 'Query slow query is still running, skipping it' in caplog.text
+        aggregator.assert_metric('test.fast', 1, count=2)
+        aggregator.assert_metric('test.timed', 1, count=2)
+        aggregator.assert_all_metrics_covered()
+
+    def test_collection_interval_failure(self, aggregator):
+        results = [Exception('error'), [[1]], [[2]]]
+
+        def executor(query):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        query_manager = create_query_manager(
+            {
+                'name': 'heavy query',
+                'query': 'foo',
+                'columns': [{'name': 'test.foo', 'type': 'gauge'}],
+                'collection_interval': 300,
+            },
+            executor=executor,
+        )
+        query_manager.compile_queries()
+
+        # The failed query is retried on the next run
+        for now in (1000, 1100, 1200):
+            with mock.patch('datadog_checks.base.utils.db.core.time', return_value=now):
+                query_manager.execute()
+
+        aggregator.assert_metric('test.foo', 1, count=1)
+        aggregator.assert_all_metrics_covered()
+
+    def test_telemetry(self, aggregator):
+        query_manager = create_query_manager(
+            {'name': 'test query', 'query': 'foo', 'columns': [{'name': 'test.foo', 'type': 'gauge'}]},
+            executor=mock_executor([[1], [2]]),
+            tags=['test:foo'],
+            telemetry=True,
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+
+        aggregator.assert_metric('test.foo', count=2)
+        aggregator.assert_metric('queries.rows', 2, tags=['test:foo', 'query:test query'])
+        aggregator.assert_metric('queries.duration', tags=['test:foo', 'query:test query'])
+
+    def test_telemetry_concurrency(self, aggregator):
+        def executor(query):
+            if query == 'slow':
+                time.sleep(0.5)
+            return [[1]]
+
+        query_manager = create_query_manager(
+            {'name': 'slow query', 'query': 'slow', 'columns': [{'name': 'test.slow', 'type': 'gauge'}]},
+            {'name': 'fast query', 'query': 'fast', 'columns': [{'name': 'test.fast', 'type': 'gauge'}]},
+            executor=executor,
+            concurrency=2,
+            telemetry=True,
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+        query_manager.close()
+
+        # The fast query is not charged for the time spent waiting for the slow one
+        durations = {metric.tags[0]: metric.value for metric in aggregator.metrics('queries.duration')}
+        assert durations['query:slow query'] >= 0.5
+        assert durations['query:fast query'] < 0.25
+
+
+class TestRowPlan:
+    def test_columns(self):
+        query_manager = create_query_manager(
+            {
+                'name': 'test query',
+                'query': 'foo',
+                'columns': [
+                    {'name': 'test.foo', 'type': 'gauge'},
+                    {},
+                    {'name': 'test', 'type': 'tag'},
+                    {'name': 'test.source', 'type': 'source'},
+                ],
+            }
+        )
+        query_manager.compile_queries()
+        query = query_manager.queries[0]
+
+        assert query.source_columns == ((0, 'test.foo'), (2, 'test'), (3, 'test.source'))
+        assert [index for index, _ in query.tag_columns] == [2]
+        assert [index for index, _ in query.submission_columns] == [0]
+
+        # Only the batched gauge consumes the values, no sources are needed
+        assert query.process_row([1, 2, 'bar', 3], ['test:foo']) == (None, ['test:foo', 'test:bar'])
+
+    def test_sources(self):
+        query_manager = create_query_manager(
+            {
+                'name': 'test query',
+                'query': 'foo',
+                'columns': [{'name': 'test.foo', 'type': 'gauge'}, {}, {'name': 'test.source', 'type': 'source'}],
+                'extras': [{'name': 'test.bar', 'expression': 'test.foo + test.source', 'submit_type': 'gauge'}],
+            }
+        )
+        query_manager.compile_queries()
+        query = query_manager.queries[0]
+
+        tags = ['test:foo']
+        sources, row_tags = query.process_row([1, 2, 3], tags)
+        assert sources == {'test.foo': 1, 'test.source': 3}
+        assert row_tags is tags
+
+    def test_boolean_tag(self, aggregator):
+        query_manager = create_query_manager(
+            {
+                'name': 'test query',
+                'query': 'foo',
+                'columns': [{'name': 'test', 'type': 'tag', 'boolean': True}, {'name': 'test.foo', 'type': 'gauge'}],
+            },
+            executor=mock_executor([['yes', 1], ['no', 2]]),
+            tags=['test:foo'],
+        )
+        query_manager.compile_queries()
+        query_manager.execute()
+
+        aggregator.assert_metric('test.foo', 1, tags=['test:foo', 'test:true'])
+        aggregator.assert_metric('test.foo', 2, tags=['test:foo', 'test:false'])
+        aggregator.assert_all_metrics_covered()
+
+
 class TestColumnTransformers:
     def test_tag_boolean(self, aggregator):
         query_manager = create_query_manager(
@@ -840,6 +840,69 @@ class TestSession:
             assert getattr(http.session, key) == value
 
 
+class TestSessionPooling:
+    def test_config_default(self):
+        http = RequestsWrapper({}, {})
+
+        assert http.connection_pool_size is None
+        assert http.connection_idle_timeout is None
+        assert http.connection_max_age is None
+
+    def test_pool_size(self):
+        http = RequestsWrapper({'connection_pool_size': 3}, {})
+
+        adapter = http.session.get_adapter('https://www.google.com')
+        assert adapter._pool_connections == 3
+        assert adapter._pool_maxsize == 3
+
+    def test_session_reused(self):
+        http = RequestsWrapper({'connection_idle_timeout': 30, 'connection_max_age': 60}, {})
+
+        with mock.patch('time.time', return_value=0):
+            session = http.session
+        with mock.patch('time.time', return_value=20):
+            assert http.session is session
+        with mock.patch('time.time', return_value=45):
+            assert http.session is session
+
+    def test_idle_timeout(self):
+        http = RequestsWrapper({'connection_idle_timeout': 30}, {})
+
+        with mock.patch('time.time', return_value=0):
+            session = http.session
+        with mock.patch('time.time', return_value=31), mock.patch.object(session, 'close') as close:
+            assert http.session is not session
+
+        close.assert_called_once()
+
+    def test_max_age(self):
+        http = RequestsWrapper({'connection_max_age': 60}, {})
+
+        with mock.patch('time.time', return_value=0):
+            session = http.session
+        with mock.patch('time.time', return_value=40):
+            assert http.session is session
+        with mock.patch('time.time', return_value=61):
+            assert http.session is not session
+
+    def test_connection_stats(self):
+        http = RequestsWrapper({}, {})
+        pool = mock.MagicMock(num_connections=1, num_requests=1)
+
+        assert http.connection_stats() == (0, 0)
+
+        with mock.patch('datadog_checks.base.utils.http.iter_connection_pools', return_value=[pool]):
+            http.session
+            assert http.connection_stats() == (1, 0)
+
+            pool.num_requests = 4
+            assert http.connection_stats() == (0, 3)
+
+            pool.num_connections = 2
+            pool.num_requests = 6
+            assert http.connection_stats() == (1, 1)
+
+
 class TestRemapper:
     def test_legacy_no_proxy(self):
         instance = {'no_proxy': True}
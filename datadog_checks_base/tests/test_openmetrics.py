@@ -4,6 +4,8 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 import copy
+import gzip
+import io
 import logging
 import math
 import os
@@ -14,7 +16,10 @@ import requests
 from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily, SummaryMetricFamily
 from six import iteritems
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.response import HTTPResponse
 
+from datadog_checks.base.checks.openmetrics.label_joins import LabelJoinIndex
+from datadog_checks.base.checks.openmetrics.timings import PHASES, ScrapeTimings
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
 from datadog_checks.dev import get_here
 
@@ -1789,16 +1794,17 @@ def test_label_joins_gc(aggregator, mocked_prometheus_check, mocked_prometheus_s
         count=1,
     )
 
-    assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
+    pods = mocked_prometheus_scraper_config['_label_join_index'].targets['kube_pod_info'][2]
+    assert 15 == len(pods)
     text_data = mock_get.replace('dd-agent-62bgh', 'dd-agent-1337')
     mock_response = mock.MagicMock(
         status_code=200, iter_lines=lambda **kwargs: text_data.split("\n"), headers={'Content-Type': text_content_type}
     )
     with mock.patch('requests.get', return_value=mock_response, __name__="get"):
         check.process(mocked_prometheus_scraper_config)
-        assert 'dd-agent-1337' in mocked_prometheus_scraper_config['_label_mapping']['pod']
-        assert 'dd-agent-62bgh' not in mocked_prometheus_scraper_config['_label_mapping']['pod']
-        assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
+        assert 'dd-agent-1337' in pods
+        assert 'dd-agent-62bgh' not in pods
+        assert 15 == len(pods)
 
 
 def test_label_joins_missconfigured(aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config, mock_get):
@@ -1942,9 +1948,10 @@ def test_label_join_state_change(aggregator, mocked_prometheus_check, mocked_pro
     check.process(mocked_prometheus_scraper_config)
 
     # check that 15 pods are in phase:Running
-    assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
-    for _, tags in iteritems(mocked_prometheus_scraper_config['_label_mapping']['pod']):
-        assert tags.get('phase') == 'Running'
+    phases = mocked_prometheus_scraper_config['_label_join_index'].targets['kube_pod_status_phase'][2]
+    assert 15 == len(phases)
+    for _, (labels, _) in iteritems(phases):
+        assert dict(labels).get('phase') == 'Running'
 
     text_data = mock_get.replace(
         'kube_pod_status_phase{namespace="default",phase="Running",pod="dd-agent-62bgh"} 1',
@@ -1956,8 +1963,118 @@ def test_label_join_state_change(aggregator, mocked_prometheus_check, mocked_pro
     )
     with mock.patch('requests.get', return_value=mock_response, __name__="get"):
         check.process(mocked_prometheus_scraper_config)
-        assert 15 == len(mocked_prometheus_scraper_config['_label_mapping']['pod'])
-        assert mocked_prometheus_scraper_config['_label_mapping']['pod']['dd-agent-62bgh']['phase'] == 'Test'
+        assert 15 == len(phases)
+        assert dict(phases['dd-agent-62bgh'][0])['phase'] == 'Test'
+
+
+def test_label_join_index():
+    index = LabelJoinIndex(
+        {
+            'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']},
+            'kube_pod_status_phase': {'label_to_match': 'pod', 'labels_to_get': ['phase']},
+        }
+    )
+
+    index.store('kube_pod_info', {'pod': 'foo', 'node': 'n1', 'namespace': 'default'})
+    index.store('kube_pod_info', {'pod': 'bar', 'node': 'n2'})
+    index.store('kube_pod_status_phase', {'pod': 'foo', 'phase': 'Running'})
+    # Missing label to match
+    index.store('kube_pod_info', {'node': 'n3'})
+    assert len(index) == 3
+    assert index.memory > 0
+
+    labels = {'pod': 'foo', 'condition': 'true'}
+    index.join(labels)
+    assert labels == {'pod': 'foo', 'condition': 'true', 'node': 'n1', 'phase': 'Running'}
+
+    labels = {'pod': 'baz'}
+    index.join(labels)
+    assert labels == {'pod': 'baz'}
+
+    # Labels of samples with the same value are merged, the last ones take precedence
+    index.store('kube_pod_info', {'pod': 'bar', 'node': 'n4'})
+    assert index.targets['kube_pod_info'][2]['bar'][0] == (('node', 'n4'),)
+
+    # Entries that are neither stored nor joined during a generation are evicted at its end
+    index.evict()
+    assert index.flush_evicted() == 0
+    index.join({'pod': 'foo'})
+    memory = index.memory
+    index.evict()
+    assert index.flush_evicted() == 1
+    assert index.flush_evicted() == 0
+    assert index.memory < memory
+    assert list(index.targets['kube_pod_info'][2]) == ['foo']
+    assert list(index.targets['kube_pod_status_phase'][2]) == ['foo']
+
+    index.evict()
+    assert len(index) == 0
+    assert index.memory == 0
+
+
+def test_label_join_index_max_entries():
+    index = LabelJoinIndex({'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']}}, max_entries=2)
+
+    index.store('kube_pod_info', {'pod': 'foo', 'node': 'n1'})
+    index.store('kube_pod_info', {'pod': 'bar', 'node': 'n1'})
+    index.evict()
+    # Touched entries are moved to the end, the least recently used ones are evicted first
+    index.join({'pod': 'foo'})
+    index.store('kube_pod_info', {'pod': 'baz', 'node': 'n2'})
+
+    assert list(index.targets['kube_pod_info'][2]) == ['foo', 'baz']
+    assert index.flush_evicted() == 1
+
+
+def test_stream_label_joins(aggregator, mocked_prometheus_check, mock_get):
+    check = mocked_prometheus_check
+    scraper_config = check.create_scraper_configuration(
+        {
+            'prometheus_url': 'http://fake.endpoint:10055/metrics',
+            'namespace': 'ksm',
+            'metrics': [{'kube_pod_status_ready': 'pod.ready'}],
+            'label_joins': {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']}},
+            'stream_label_joins': True,
+        }
+    )
+
+    # Metrics are submitted on the first scrape
+    check.process(scraper_config)
+    assert aggregator.metrics('ksm.pod.ready')
+
+    aggregator.reset()
+    check.process(scraper_config)
+    aggregator.assert_metric_has_tag(
+        'ksm.pod.ready', 'node:gke-foobar-test-kube-default-pool-9b4ff111-0kch', at_least=1
+    )
+
+
+def test_label_join_telemetry(aggregator, mocked_prometheus_check, mock_get):
+    check = mocked_prometheus_check
+    scraper_config = check.create_scraper_configuration(
+        {
+            'prometheus_url': 'http://fake.endpoint:10055/metrics',
+            'namespace': 'ksm',
+            'metrics': [{'kube_pod_status_ready': 'pod.ready'}],
+            'label_joins': {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']}},
+            'telemetry': True,
+        }
+    )
+
+    check.process(scraper_config)
+    aggregator.assert_metric('ksm.telemetry.label_joins.entries', 15)
+    aggregator.assert_metric('ksm.telemetry.label_joins.evicted.count', 0)
+    assert aggregator.metrics('ksm.telemetry.label_joins.memory')[0].value > 0
+
+    aggregator.reset()
+    text_data = mock_get.replace('dd-agent-62bgh', 'dd-agent-1337')
+    mock_response = mock.MagicMock(
+        status_code=200, iter_lines=lambda **kwargs: text_data.split("\n"), headers={'Content-Type': text_content_type}
+    )
+    with mock.patch('requests.get', return_value=mock_response, __name__="get"):
+        check.process(scraper_config)
+    aggregator.assert_metric('ksm.telemetry.label_joins.entries', 15)
+    aggregator.assert_metric('ksm.telemetry.label_joins.evicted.count', 1)
 
 
 def test_health_service_check_ok(mock_get, aggregator, mocked_prometheus_check, mocked_prometheus_scraper_config):
@@ -2115,3 +2232,296 @@ def test_ssl_verify_not_raise_warning(mocked_openmetrics_check_factory, text_dat
 
     assert "httpbin.org" in resp.content.decode('utf-8')
     assert all(not issubclass(warning.category, InsecureRequestWarning) for warning in record)
+
+
+def test_persist_connections_disabled(mocked_openmetrics_check_factory, text_data):
+    instance = dict(OPENMETRICS_CHECK_INSTANCE)
+    check = mocked_openmetrics_check_factory(instance)
+    scraper_config = check.get_scraper_config(instance)
+
+    assert scraper_config['persist_connections'] is False
+
+    with mock.patch('requests.get', return_value=MockResponse(text_data, text_content_type)) as get:
+        check.send_request(instance['prometheus_url'], scraper_config)
+
+    get.assert_called_once()
+    assert scraper_config['_http_handler'] is None
+
+
+def test_persist_connections_session_reused(mocked_openmetrics_check_factory, text_data):
+    instance = dict(OPENMETRICS_CHECK_INSTANCE)
+    instance['persist_connections'] = True
+    instance['connection_pool_size'] = 4
+    check = mocked_openmetrics_check_factory(instance)
+    scraper_config = check.get_scraper_config(instance)
+
+    with mock.patch('requests.get') as get, mock.patch(
+        'requests.Session.get', return_value=MockResponse(text_data, text_content_type)
+    ) as session_get:
+        check.send_request(instance['prometheus_url'], scraper_config)
+        http_handler = scraper_config['_http_handler']
+        session = http_handler.session
+        check.send_request(instance['prometheus_url'], scraper_config)
+
+    get.assert_not_called()
+    assert session_get.call_count == 2
+    assert scraper_config['_http_handler'] is http_handler
+    assert http_handler.session is session
+    assert http_handler.connection_pool_size == 4
+    assert session.get_adapter(instance['prometheus_url'])._pool_maxsize == 4
+
+    _, kwargs = session_get.call_args
+    assert kwargs['stream'] is True
+    assert kwargs['headers']['accept-encoding'] == 'gzip'
+    assert kwargs['timeout'] == scraper_config['prometheus_timeout']
+
+
+def test_persist_connections_telemetry(aggregator, mocked_openmetrics_check_factory, text_data):
+    instance = dict(OPENMETRICS_CHECK_INSTANCE)
+    instance['persist_connections'] = True
+    instance['telemetry'] = True
+    check = mocked_openmetrics_check_factory(instance)
+    scraper_config = check.get_scraper_config(instance)
+
+    with mock.patch('requests.Session.get', return_value=MockResponse(text_data, text_content_type)), mock.patch(
+        'datadog_checks.base.utils.http.RequestsWrapper.connection_stats', return_value=(1, 2)
+    ):
+        check.send_request(instance['prometheus_url'], scraper_config)
+
+    aggregator.assert_metric('openmetrics.telemetry.connections.new.count', 1, count=1)
+    aggregator.assert_metric('openmetrics.telemetry.connections.reused.count', 2, count=1)
+
+
+def test_metric_filter_input(mocked_prometheus_check, mocked_prometheus_scraper_config):
+    check = mocked_prometheus_check
+    mocked_prometheus_scraper_config['metrics_mapper'] = {'kept_histogram': 'histogram', 'kept_*': 'wildcard'}
+    mocked_prometheus_scraper_config['ignore_metrics'] = ['kept_ignored']
+    mocked_prometheus_scraper_config['type_overrides'] = {'kept_untyped_override': 'gauge'}
+    mocked_prometheus_scraper_config['_metric_filter'] = check._build_metric_filter(
+        mocked_prometheus_scraper_config, {'transformed': None}
+    )
+
+    text_data = (
+        '# HELP kept_histogram A histogram\n'
+        '# TYPE kept_histogram histogram\n'
+        'kept_histogram_bucket{le="1"} 1\n'
+        'kept_histogram_bucket{le="+Inf"} 1\n'
+        'kept_histogram_sum 1\n'
+        'kept_histogram_count 1\n'
+        '# HELP dropped_gauge A gauge\n'
+        '# TYPE dropped_gauge gauge\n'
+        'dropped_gauge{foo="bar"} 1\n'
+        '# TYPE kept_ignored gauge\n'
+        'kept_ignored 1\n'
+        '# TYPE kept_gauge gauge\n'
+        'kept_gauge 1\n'
+        '# TYPE kept_untyped untyped\n'
+        'kept_untyped 1\n'
+        'kept_untyped_override 1\n'
+        '# TYPE transformed counter\n'
+        'transformed 1\n'
+    )
+
+    expected = [
+        '# HELP kept_histogram A histogram',
+        '# TYPE kept_histogram histogram',
+        'kept_histogram_bucket{le="1"} 1',
+        'kept_histogram_bucket{le="+Inf"} 1',
+        'kept_histogram_sum 1',
+        'kept_histogram_count 1',
+        '# TYPE kept_gauge gauge',
+        'kept_gauge 1',
+        'kept_untyped_override 1',
+        '# TYPE transformed counter',
+        'transformed 1',
+        '',
+    ]
+
+    filtered = list(check._metric_filter_input(text_data.split('\n'), mocked_prometheus_scraper_config))
+    assert filtered == expected
+
+
+def test_pre_parse_filter_same_submissions(aggregator, mocked_prometheus_check, mock_get):
+    def run(pre_parse_filter):
+        check = mocked_prometheus_check
+        scraper_config = check.create_scraper_configuration(
+            {
+                'prometheus_url': 'http://fake.endpoint:10055/metrics',
+                'namespace': 'ksm',
+                'metrics': [
+                    {'kube_pod_status_ready': 'pod.ready', 'kube_deployment_status_replicas': 'deploy.replicas'},
+                    'kube_node_status_*',
+                ],
+                'ignore_metrics': ['kube_node_status_condition'],
+                'label_joins': {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node', 'pod_ip']}},
+                'pre_parse_filter': pre_parse_filter,
+            }
+        )
+
+        transformers = {
+            'kube_pod_container_status_restarts': lambda metric, config: check.submit_openmetric(
+                'restarts', metric, config
+            )
+        }
+        for _ in range(2):
+            check.process(scraper_config, metric_transformers=transformers)
+
+        assert (scraper_config['_metric_filter'] is not None) is pre_parse_filter
+
+        submitted = sorted(
+            (stub.name, stub.value, tuple(sorted(stub.tags)))
+            for name in aggregator.metric_names
+            for stub in aggregator.metrics(name)
+        )
+        aggregator.reset()
+        return submitted
+
+    submitted = run(False)
+
+    assert submitted
+    assert any(name == 'ksm.restarts' for name, _, _ in submitted)
+    assert not any(name == 'ksm.kube_node_status_condition' for name, _, _ in submitted)
+    assert run(True) == submitted
+
+
+def test_tag_cache_same_submissions(aggregator, mocked_prometheus_check, mock_get):
+    def run(tag_cache_size):
+        check = mocked_prometheus_check
+        scraper_config = check.create_scraper_configuration(
+            {
+                'prometheus_url': 'http://fake.endpoint:10055/metrics',
+                'namespace': 'ksm',
+                'metrics': [{'kube_pod_status_ready': 'pod.ready'}, 'kube_node_status_*'],
+                'label_joins': {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node', 'pod_ip']}},
+                'labels_mapper': {'namespace': 'kube_namespace'},
+                'exclude_labels': ['uid'],
+                'tag_cache_size': tag_cache_size,
+            }
+        )
+
+        for _ in range(2):
+            check.process(scraper_config)
+
+        submitted = sorted(
+            (stub.name, stub.value, tuple(sorted(stub.tags)))
+            for name in aggregator.metric_names
+            for stub in aggregator.metrics(name)
+        )
+        aggregator.reset()
+        return submitted
+
+    submitted = run(0)
+
+    assert submitted
+    assert run(10000) == submitted
+    # A cache too small for the payload keeps evicting entries but submits the same tags
+    assert run(2) == submitted
+
+
+def test_tag_cache_telemetry(aggregator, mocked_prometheus_check, mock_get):
+    check = mocked_prometheus_check
+    scraper_config = check.create_scraper_configuration(
+        {
+            'prometheus_url': 'http://fake.endpoint:10055/metrics',
+            'namespace': 'ksm',
+            'metrics': [{'kube_pod_status_ready': 'pod.ready'}],
+            'tag_cache_size': 10000,
+            'telemetry': True,
+        }
+    )
+
+    check.process(scraper_config)
+    samples = len(aggregator.metrics('ksm.pod.ready'))
+    assert samples
+    aggregator.assert_metric('ksm.telemetry.tag_cache.hits.count', 0)
+    aggregator.assert_metric('ksm.telemetry.tag_cache.misses.count', samples)
+
+    aggregator.reset()
+    check.process(scraper_config)
+    aggregator.assert_metric('ksm.telemetry.tag_cache.hits.count', samples)
+    aggregator.assert_metric('ksm.telemetry.tag_cache.misses.count', 0)
+
+
+def test_scrape_timings(aggregator, mocked_prometheus_check, mock_get):
+    check = mocked_prometheus_check
+    scraper_config = check.create_scraper_configuration(
+        {
+            'prometheus_url': 'http://fake.endpoint:10055/metrics',
+            'namespace': 'ksm',
+            'metrics': [{'kube_pod_status_ready': 'pod.ready'}],
+            'label_joins': {'kube_pod_info': {'label_to_match': 'pod', 'labels_to_get': ['node']}},
+            'telemetry': True,
+            'telemetry_timings': True,
+        }
+    )
+    transformer = mock.MagicMock()
+
+    check.process(scraper_config, metric_transformers={'kube_pod_container_status_ready': transformer})
+    # Dry run
+    assert not transformer.called
+
+    aggregator.reset()
+    check.process(scraper_config, metric_transformers={'kube_pod_container_status_ready': transformer})
+    assert transformer.called
+    assert scraper_config['_timings'] is None
+
+    aggregator.assert_metric('ksm.telemetry.scrape.duration', count=1)
+    for phase in PHASES:
+        aggregator.assert_metric('ksm.telemetry.scrape.{}.duration'.format(phase), count=1)
+    aggregator.assert_metric(
+        'ksm.telemetry.scrape.transformer.duration', tags=['transformer:kube_pod_container_status_ready'], count=1
+    )
+    assert aggregator.metrics('ksm.telemetry.scrape.parse.duration')[0].value > 0
+
+
+def test_scrape_timings_disabled(aggregator, mocked_prometheus_check, mock_get):
+    check = mocked_prometheus_check
+    scraper_config = check.create_scraper_configuration(
+        {
+            'prometheus_url': 'http://fake.endpoint:10055/metrics',
+            'namespace': 'ksm',
+            'metrics': [{'kube_pod_status_ready': 'pod.ready'}],
+            'telemetry': True,
+        }
+    )
+
+    with mock.patch('datadog_checks.base.checks.openmetrics.mixins.ScrapeTimings') as timings:
+        check.process(scraper_config)
+
+    assert not timings.called
+    assert not aggregator.metrics('ksm.telemetry.scrape.duration')
+
+
+def test_scrape_timings_decompression():
+    payload = b'\n'.join(b'metric{label="%d"} 1' % i for i in range(1000))
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+        f.write(payload)
+
+    response = requests.Response()
+    response.raw = HTTPResponse(
+        body=io.BytesIO(compressed.getvalue()), headers={'Content-Encoding': 'gzip'}, preload_content=False
+    )
+
+    timings = ScrapeTimings()
+    timings.time_decompression(response)
+    lines = list(timings.time_lines(response.iter_lines(chunk_size=1024)))
+    timings.finish()
+
+    assert len(lines) == 1000
+    assert timings.durations['decompression'] > 0
+    assert timings.total > 0
+
+
+def test_scrape_timings_summary():
+    timings = ScrapeTimings()
+    timings.add('ttfb', 0.5)
+    timings.add_transformer('foo', 0.25)
+    timings.add_transformer('bar', 1)
+    timings.add_transformer('foo', 0.25)
+    timings.finish()
+
+    summary = timings.summary(transformers=1)
+    assert 'ttfb=0.500s' in summary
+    assert 'transformers=1.500s' in summary
+    assert summary.endswith('slowest_transformers=[bar=1.000s]')
@@ -4,15 +4,24 @@
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
 
+import os
+import threading
+import time
 from decimal import ROUND_HALF_DOWN
 
 import mock
 import pytest
 from six import PY3
 
+from datadog_checks.base import AgentCheck
 from datadog_checks.base.utils.common import ensure_bytes, ensure_unicode, pattern_filter, round_value
 from datadog_checks.base.utils.containers import iter_unique
 from datadog_checks.base.utils.limiter import Limiter
+from datadog_checks.base.utils.tag_cache import TagCache
+from datadog_checks.base.utils.tagging import TaggerCache
+from datadog_checks.base.utils.tailfile import ChunkedTailFile
+from datadog_checks.base.utils.thread_pool import BoundedThreadPool, PoolCancelledError, PoolTimeoutError
+from datadog_checks.base.utils.timeout import Deadline, DeadlineExecutor, TimeoutException, timeout
 
 
 class Item:
@@ -65,6 +74,96 @@ class TestPatternFilter:
         ]
 
 
+class TestTagCache:
+    def test_get_set(self):
+        cache = TagCache(10)
+        assert cache.get(('a', 'b')) is None
+
+        tags = cache.set(('a', 'b'), ['a:b'])
+        assert tags == ('a:b',)
+        assert cache.get(('a', 'b')) is tags
+        assert cache.flush_stats() == (1, 1)
+        assert cache.flush_stats() == (0, 0)
+
+    def test_interned(self):
+        cache = TagCache(10)
+        tag = ''.join(['foo:', 'bar'])
+        assert cache.set(1, [tag])[0] is cache.set(2, ['foo:bar'])[0]
+
+    def test_lru_eviction(self):
+        cache = TagCache(2)
+        cache.set(1, ['one'])
+        cache.set(2, ['two'])
+
+        # Use the first entry so that the second one is the least recently used
+        assert cache.get(1) == ('one',)
+        cache.set(3, ['three'])
+
+        assert len(cache) == 2
+        assert cache.get(2) is None
+        assert cache.get(1) == ('one',)
+        assert cache.get(3) == ('three',)
+
+        cache.clear()
+        assert len(cache) == 0
+
+
+class TestTaggerCache:
+    @pytest.fixture
+    def tagger(self):
+        from datadog_checks.base.stubs import tagger
+
+        tagger.reset()
+        tagger.set_tags({'container_id://foo': ['image_name:foo']})
+        yield tagger
+        tagger.reset()
+
+    def test_cached_per_run(self, tagger):
+        cache = TaggerCache()
+
+        tags = cache.tag('container_id://foo', tagger.HIGH)
+        assert tags == ['image_name:foo']
+        # Callers can modify the tags they get
+        tags.append('custom:tag')
+        assert cache.tag('container_id://foo', tagger.HIGH) == ['image_name:foo']
+        assert cache.tag('container_id://foo', tagger.LOW) == ['image_name:foo']
+        assert cache.tag('container_id://bar', tagger.HIGH) == []
+        assert cache.tag('container_id://bar', tagger.HIGH) == []
+
+        assert tagger._calls == [
+            ('container_id://foo', tagger.HIGH),
+            ('container_id://foo', tagger.LOW),
+            ('container_id://bar', tagger.HIGH),
+        ]
+        assert cache.flush_stats() == (2, 3)
+        assert cache.flush_stats() == (0, 0)
+
+        cache.reset()
+        assert len(cache) == 0
+        cache.tag('container_id://foo', tagger.HIGH)
+        assert cache.flush_stats() == (0, 1)
+
+    def test_ttl(self, tagger):
+        cache = TaggerCache(ttl=60)
+        cache.tag('container_id://foo', tagger.HIGH)
+        cache.tag('container_id://bar', tagger.HIGH)
+
+        # Entities without tags are looked up again at the next run
+        cache.reset()
+        assert len(cache) == 1
+        assert cache.tag('container_id://foo', tagger.HIGH) == ['image_name:foo']
+        assert cache.flush_stats() == (1, 2)
+
+        with mock.patch('datadog_checks.base.utils.tagging.time', return_value=time.time() + 61):
+            cache.reset()
+        assert len(cache) == 0
+
+    def test_invalid_entity(self, tagger):
+        cache = TaggerCache()
+        with pytest.raises(ValueError):
+            cache.tag(None, tagger.HIGH)
+
+
 class TestLimiter:
     def test_no_uid(self):
         warning = mock.MagicMock()
@@ -93,6 +192,56 @@ class TestLimiter:
         assert limiter.get_status() == (2, 10, False)
         warning.assert_not_called()
 
+    def test_accept(self):
+        warning = mock.MagicMock()
+        limiter = Limiter("my_check", "names", 10, warning_func=warning)
+
+        assert limiter.accept(6) == 6
+        assert limiter.get_status() == (6, 10, False)
+        warning.assert_not_called()
+
+        assert limiter.accept(6) == 4
+        assert limiter.get_status() == (12, 10, True)
+        warning.assert_called_once_with("Check %s exceeded limit of %s %s, ignoring next ones", "my_check", 10, "names")
+
+        assert limiter.accept(6) == 0
+        assert limiter.get_status() == (12, 10, True)
+        assert warning.call_count == 1
+
+    def test_name_budgets(self):
+        warning = mock.MagicMock()
+        limiter = Limiter("my_check", "names", 0, warning_func=warning, name_budgets={"foo": 2})
+
+        for _ in range(0, 5):
+            limiter.is_reached(name="foo")
+            limiter.is_reached(name="bar")
+        assert limiter.get_status() == (7, 0, False)
+        assert limiter.top(2) == [("foo", 2, 3), ("bar", 5, 0)]
+        warning.assert_called_once_with(
+            "Check %s exceeded budget of %s %s for `%s`, ignoring next ones", "my_check", 2, "names", "foo"
+        )
+
+    def test_tag_budgets(self):
+        limiter = Limiter("my_check", "names", 0, tag_budgets={"pod": 2})
+
+        assert limiter.is_reached(name="foo", tags=["pod:a", "node:a"]) is False
+        assert limiter.is_reached(name="foo", tags=["pod:b", "node:b"]) is False
+        assert limiter.is_reached(name="foo", tags=["pod:c", "node:c"]) is True
+        assert limiter.is_reached(name="bar", tags=["pod:a", "node:d"]) is False
+        assert limiter.is_reached(name="bar", tags=["node:e"]) is False
+        assert limiter.top(5) == [("foo", 2, 1), ("bar", 2, 0)]
+
+        limiter.reset()
+        assert limiter.is_reached(name="foo", tags=["pod:c"]) is False
+        assert limiter.top(5) == [("foo", 1, 0)]
+
+    def test_accept_name(self):
+        limiter = Limiter("my_check", "names", 10)
+
+        assert limiter.accept(6, "foo") == 6
+        assert limiter.accept(6, "bar") == 4
+        assert limiter.top(5) == [("foo", 6, 0), ("bar", 4, 2)]
+
     def test_mixed(self):
         limiter = Limiter("my_check", "names", 10)
 
@@ -117,6 +266,433 @@ class TestLimiter:
         assert limiter.get_status() == (1, 10, False)
 
 
+class TestChunkedTailFile:
+    def get_tail(self, path, **kwargs):
+        lines = []
+        tail = ChunkedTailFile(mock.MagicMock(), path, lines.append, **kwargs)
+        return tail, lines
+
+    def write(self, path, data, mode='ab'):
+        with open(path, mode) as f:
+            f.write(data)
+
+    def test_tail(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        self.write(path, b'old\n')
+
+        tail, lines = self.get_tail(path, chunk_size=4)
+        gen = tail.tail(line_by_line=False, move_end=True)
+        next(gen)
+        assert lines == []
+
+        self.write(path, b'foo\nbar\r\nba')
+        next(gen)
+        # Incomplete lines are buffered until they are complete
+        assert lines == ['foo', 'bar']
+
+        self.write(path, b'z\n\0\0qux\n')
+        next(gen)
+        assert lines == ['foo', 'bar', 'baz', 'qux']
+        assert tail.offset == os.path.getsize(path)
+
+        assert tail.flush_stats()[:2] == (4, 19)
+        assert tail.flush_stats()[:2] == (0, 0)
+
+    def test_line_by_line(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        self.write(path, b'foo\nbar\n')
+
+        tail, lines = self.get_tail(path)
+        tail._callback = lambda line: lines.append(line) or True
+        gen = tail.tail(line_by_line=True, move_end=False)
+
+        next(gen)
+        assert lines == ['foo']
+        next(gen)
+        assert lines == ['foo', 'bar']
+
+    def test_truncation(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        tail, lines = self.get_tail(path)
+        self.write(path, b'0123456789abcdef\n')
+        gen = tail.tail(line_by_line=False, move_end=False)
+        next(gen)
+
+        self.write(path, b'foo\n', mode='wb')
+        next(gen)
+        next(gen)
+        assert lines == ['0123456789abcdef', 'foo']
+
+    def test_copytruncate(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        tail, lines = self.get_tail(path)
+        self.write(path, b'0123456789abcdef\n')
+        gen = tail.tail(line_by_line=False, move_end=False)
+        next(gen)
+
+        # Truncated and more data written than what was read
+        self.write(path, b'fedcba9876543210\nfoo\n', mode='wb')
+        next(gen)
+        next(gen)
+        assert lines == ['0123456789abcdef', 'fedcba9876543210', 'foo']
+
+    def test_rotation(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        tail, lines = self.get_tail(path)
+        self.write(path, b'foo\n')
+        gen = tail.tail(line_by_line=False, move_end=False)
+        next(gen)
+
+        os.rename(path, str(tmpdir.join('log.1')))
+        next(gen)
+        self.write(path, b'bar\n')
+        next(gen)
+        next(gen)
+        assert lines == ['foo', 'bar']
+
+    def test_rotation_incomplete_line(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        tail, lines = self.get_tail(path)
+        self.write(path, b'foo\nba')
+        gen = tail.tail(line_by_line=False, move_end=False)
+        next(gen)
+        assert lines == ['foo']
+
+        # Data written to the file before it was rotated is not lost, nor its last line
+        self.write(path, b'r\nbaz')
+        os.rename(path, str(tmpdir.join('log.1')))
+        self.write(path, b'qux\n')
+        next(gen)
+        next(gen)
+        assert lines == ['foo', 'bar', 'baz', 'qux']
+
+    def test_truncation_incomplete_line(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        tail, lines = self.get_tail(path)
+        self.write(path, b'foo\nbar')
+        gen = tail.tail(line_by_line=False, move_end=False)
+        next(gen)
+
+        self.write(path, b'', mode='wb')
+        next(gen)
+        self.write(path, b'baz\n')
+        next(gen)
+        assert lines == ['foo', 'bar', 'baz']
+
+    def test_rotation_check_interval(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        tail, lines = self.get_tail(path, rotation_check_interval=60)
+        self.write(path, b'foo\n')
+        gen = tail.tail(line_by_line=False, move_end=False)
+
+        with mock.patch('os.stat', wraps=os.stat) as stat:
+            for _ in range(5):
+                next(gen)
+
+        assert stat.call_count == 1
+
+    def test_offset(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        self.write(path, b'foo\nbar\n')
+
+        tail, lines = self.get_tail(path, offset=4)
+        next(tail.tail(line_by_line=False))
+        assert lines == ['bar']
+
+        # Offsets past the end of the file restart from the beginning
+        tail, lines = self.get_tail(path, offset=100)
+        next(tail.tail(line_by_line=False))
+        assert lines == ['foo', 'bar']
+
+    def test_offset_inode(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        self.write(path, b'foo\nbar\n')
+
+        tail, lines = self.get_tail(path)
+        next(tail.tail(line_by_line=False, move_end=False))
+        offset, inode = tail.offset, tail.inode
+
+        tail, lines = self.get_tail(path, offset=offset, inode=inode)
+        gen = tail.tail(line_by_line=False)
+        self.write(path, b'baz\n')
+        next(gen)
+        assert lines == ['baz']
+
+        # The file was replaced since the offset was saved
+        os.rename(path, str(tmpdir.join('log.1')))
+        self.write(path, b'qux\nquux\n')
+        tail, lines = self.get_tail(path, offset=4, inode=inode)
+        next(tail.tail(line_by_line=False))
+        assert lines == ['qux', 'quux']
+
+    def test_open(self, tmpdir):
+        path = str(tmpdir.join('log'))
+        self.write(path, b'old\n')
+
+        tail, lines = self.get_tail(path)
+        tail.open(move_end=True)
+        assert tail.offset == 4
+
+        # Lines written between opening and tailing the file are read
+        self.write(path, b'foo\n')
+        next(tail.tail(line_by_line=False, move_end=True))
+        assert lines == ['foo']
+
+
+class TestDeadlineExecutor:
+    def test_call(self):
+        executor = DeadlineExecutor()
+
+        assert executor.call(lambda x, y=0: x + y, args=(1,), kwargs={'y': 2}, timeout=1) == 3
+        with pytest.raises(ValueError):
+            executor.call(int, args=('foo',), timeout=1)
+
+        # Workers are reused
+        for _ in range(10):
+            executor.call(int, timeout=1)
+        assert executor.flush_stats()['workers'] == 1
+
+    def test_timeout_abandoned(self):
+        executor = DeadlineExecutor(max_abandoned=1)
+        release = threading.Event()
+
+        with pytest.raises(TimeoutException):
+            executor.call(release.wait, timeout=0.1, owner='foo')
+
+        # The owner has too many abandoned calls
+        with pytest.raises(TimeoutException, match='still running'):
+            executor.call(int, timeout=1, owner='foo')
+        assert executor.call(int, timeout=1, owner='bar') == 0
+
+        stats = executor.flush_stats()
+        assert stats['abandoned'] == 1
+        assert stats['timeouts'] == 1
+        assert stats['rejected'] == 1
+
+        release.set()
+        for _ in range(100):
+            if not executor.flush_stats()['abandoned']:
+                break
+            time.sleep(0.01)
+        assert executor.call(int, timeout=1, owner='foo') == 0
+
+    def test_saturation(self):
+        executor = DeadlineExecutor(max_workers=1)
+        release = threading.Event()
+
+        with pytest.raises(TimeoutException):
+            executor.call(release.wait, timeout=0.1, owner='foo')
+
+        # The only worker is busy, the call is cancelled before it starts
+        called = []
+        with pytest.raises(TimeoutException):
+            executor.call(called.append, args=(1,), timeout=0.01, owner='bar')
+
+        stats = executor.flush_stats()
+        assert stats['workers'] == 1
+        assert stats['saturated'] == 1
+        assert stats['timeouts'] == 2
+        assert stats['abandoned'] == 1
+
+        release.set()
+        assert executor.call(int, timeout=1, owner='bar') == 0
+        assert called == []
+
+    def test_deadline(self):
+        executor = DeadlineExecutor()
+
+        with Deadline(0.1, owner='foo', executor=executor) as deadline:
+            assert deadline.call(int, args=('1',)) == 1
+            assert 0 < deadline.remaining <= 0.1
+
+            with pytest.raises(TimeoutException):
+                deadline.call(time.sleep, args=(1,), timeout=0.01)
+
+        deadline = Deadline(0, executor=executor)
+        assert deadline.expired
+        with pytest.raises(TimeoutException):
+            deadline.call(int)
+
+    def test_join_abandoned(self):
+        executor = DeadlineExecutor(max_abandoned=1)
+        release = threading.Event()
+        calls = []
+
+        def wait(value):
+            calls.append(value)
+            release.wait()
+            return value
+
+        with pytest.raises(TimeoutException):
+            executor.call(wait, args=(1,), timeout=0.1, owner='foo', key='wait')
+
+        # A call with the same key waits for the abandoned one instead of being rejected
+        with pytest.raises(TimeoutException):
+            executor.call(wait, args=(1,), timeout=0.1, owner='foo', key='wait')
+        release.set()
+        assert executor.call(wait, args=(1,), timeout=1, owner='foo', key='wait') == 1
+        assert calls == [1]
+
+        stats = executor.flush_stats(owner='foo')
+        assert stats['timeouts'] == 2
+        assert stats['rejected'] == 0
+
+    def test_owner_stats(self):
+        executor = DeadlineExecutor()
+        release = threading.Event()
+
+        with pytest.raises(TimeoutException):
+            executor.call(release.wait, timeout=0.1, owner='foo')
+        executor.call(int, timeout=1, owner='bar')
+
+        stats = executor.flush_stats(owner='foo')
+        assert stats['abandoned'] == 1
+        assert stats['timeouts'] == 1
+        assert executor.flush_stats(owner='foo')['timeouts'] == 0
+
+        stats = executor.flush_stats(owner='bar')
+        assert stats['abandoned'] == 0
+        assert stats['timeouts'] == 0
+        assert stats['workers'] == 2
+
+        release.set()
+
+    def test_decorator(self):
+        release = threading.Event()
+        calls = []
+
+        def wait(seconds):
+            calls.append(seconds)
+            return release.wait(seconds)
+
+        wait = timeout(0.1, owner='decorator')(wait)
+
+        with pytest.raises(TimeoutException):
+            wait(1)
+        # Calls with the same arguments wait for the previous one while it is running
+        with pytest.raises(TimeoutException):
+            wait(1)
+        assert calls == [1]
+
+        release.set()
+        assert wait(1) is True
+        assert timeout(1)(int)('2') == 2
+
+
+class TestBoundedThreadPool:
+    def test_apply_async(self):
+        pool = BoundedThreadPool(2)
+        values = []
+
+        result = pool.apply_async(lambda x, y=0: x + y, args=(1,), kwds={'y': 2}, callback=values.append)
+        assert result.get(1) == 3
+        assert result.successful()
+        assert values == [3]
+
+        result = pool.apply_async(int, args=('foo',))
+        with pytest.raises(ValueError):
+            result.get(1)
+        assert not result.successful()
+
+        assert pool.apply(int, args=('4',)) == 4
+        assert list(pool.imap(int, map(str, range(10)))) == list(range(10))
+        assert pool.map(int, ['1', '2']) == [1, 2]
+
+        pool.close()
+        assert pool.join(1)
+        with pytest.raises(ValueError, match='Pool is closed'):
+            pool.apply_async(int)
+
+    def test_backpressure(self):
+        pool = BoundedThreadPool(1, queue_size=1)
+        release = threading.Event()
+        submitted = threading.Event()
+
+        pool.apply_async(release.wait)
+        pool.apply_async(int)
+
+        def submit():
+            pool.apply_async(int)
+            submitted.set()
+
+        threading.Thread(target=submit).start()
+        # The worker is busy and the queue is full
+        assert not submitted.wait(0.1)
+
+        release.set()
+        assert submitted.wait(1)
+        pool.close()
+        assert pool.join(1)
+
+    def test_task_timeout(self):
+        pool = BoundedThreadPool(1, task_timeout=0.05)
+        release = threading.Event()
+
+        running = pool.apply_async(release.wait)
+        queued = pool.apply_async(int)
+        with pytest.raises(PoolTimeoutError):
+            running.get()
+
+        release.set()
+        # Queued past its deadline, not run
+        with pytest.raises(PoolTimeoutError, match='before it started'):
+            queued.get(1)
+
+        pool.close()
+        pool.join(1)
+        stats = pool.flush_stats()
+        assert stats['timeouts'] == 2
+        assert stats['dropped'] == 1
+
+    def test_cancel(self):
+        pool = BoundedThreadPool(1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            return release.wait()
+
+        running = pool.apply_async(block)
+        queued = pool.apply_async(int)
+        assert started.wait(1)
+        pool.cancel()
+        release.set()
+
+        assert running.get(1) is True
+        with pytest.raises(PoolCancelledError):
+            queued.get(1)
+        assert pool.join(1)
+        assert pool.flush_stats()['cancelled'] == 1
+
+    def test_report(self, aggregator):
+        pool = BoundedThreadPool(2)
+        for _ in range(3):
+            pool.apply_async(time.sleep, args=(0.01,))
+        pool.close()
+        pool.join(1)
+
+        check = AgentCheck('test', {}, [{}])
+        stats = pool.report(check, 'pool', tags=['foo:bar'])
+        assert stats['run_time']['count'] == 3
+
+        aggregator.assert_metric('pool.queue_depth', 0, tags=['foo:bar'])
+        aggregator.assert_metric('pool.tasks.timeouts', 0, tags=['foo:bar'])
+        aggregator.assert_metric('pool.tasks.dropped', 0, tags=['foo:bar'])
+        aggregator.assert_metric('pool.tasks.cancelled', 0, tags=['foo:bar'])
+        aggregator.assert_metric('pool.tasks.completed', 3, tags=['foo:bar'])
+        # The timings are aggregated, whatever the number of tasks
+        for name in ('wait_time', 'run_time'):
+            for aggregate in ('avg', 'max'):
+                aggregator.assert_metric('pool.task.{}.{}'.format(name, aggregate), count=1, tags=['foo:bar'])
+        assert aggregator.metrics('pool.task.run_time.max')[0].value >= 0.01
+        assert (
+            aggregator.metrics('pool.task.run_time.avg')[0].value
+            <= aggregator.metrics('pool.task.run_time.max')[0].value
+        )
+        assert 0 < aggregator.metrics('pool.utilization')[0].value <= 1
+
+
 class TestRounding:
     def test_round_half_up(self):
         assert round_value(3.5) == 4.0
@@ -0,0 +1,87 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import os
+import pstats
+import time
+
+import pytest
+
+from datadog_checks.base.utils.agent.cpu import profile_cpu
+
+
+def busy(duration):
+    end = time.time() + duration
+    while time.time() < end:
+        spin()
+
+
+def spin():
+    return sum(range(100))
+
+
+def get_function_tags(metrics):
+    return [m.tags[0] for m in metrics if m.name == 'datadog.agent.profile.cpu.function.cumulative_time']
+
+
+class TestProfileCpu:
+    def test_deterministic(self, tmpdir):
+        location = str(tmpdir)
+        metrics = profile_cpu(busy, {'profile_cpu': location, 'profile_cpu_limit': 3}, args=(0.05,))
+
+        assert metrics[0].name == 'datadog.agent.profile.cpu.check_run_time'
+        assert metrics[0].value >= 0.05
+
+        function_tags = get_function_tags(metrics)
+        assert len(function_tags) == 3
+        assert function_tags[0].startswith('function:') and function_tags[0].endswith('(busy)')
+
+        profiles = os.listdir(location)
+        assert len(profiles) == 1
+        assert profiles[0].endswith('.pstats')
+        pstats.Stats(os.path.join(location, profiles[0]))
+
+    def test_sampling(self, tmpdir):
+        location = str(tmpdir)
+        metrics = profile_cpu(
+            busy, {'profile_cpu': location, 'profile_cpu_mode': 'sampling', 'profile_cpu_interval': 0.001}, args=(0.1,)
+        )
+
+        # Every sample is taken in `busy`
+        function_tags = get_function_tags(metrics)
+        assert any(tag.endswith('(busy)') for tag in function_tags[:2])
+
+        profiles = os.listdir(location)
+        assert len(profiles) == 1
+        assert profiles[0].endswith('.collapsed')
+        with open(os.path.join(location, profiles[0])) as f:
+            lines = f.read().splitlines()
+
+        assert lines
+        for line in lines:
+            stack, samples = line.rsplit(' ', 1)
+            assert stack.split(';')[0].endswith('(busy)')
+            assert int(samples) > 0
+
+    def test_namespaces(self, tmpdir):
+        location = str(tmpdir)
+        profile_cpu(busy, {'profile_cpu': location}, namespaces=['test', 'instance:1'], args=(0,))
+
+        assert len(os.listdir(os.path.join(location, 'test', 'instance_1'))) == 1
+
+    def test_no_location(self, tmpdir):
+        metrics = profile_cpu(busy, {'profile_cpu': ''}, args=(0,))
+
+        assert metrics[0].name == 'datadog.agent.profile.cpu.check_run_time'
+        assert get_function_tags(metrics)
+
+    def test_rotation(self, tmpdir):
+        location = str(tmpdir)
+        for _ in range(5):
+            profile_cpu(busy, {'profile_cpu': location, 'profile_cpu_keep': 2}, args=(0,))
+
+        assert len(os.listdir(location)) == 2
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError, match='Invalid CPU profiling mode `foo`'):
+            profile_cpu(busy, {'profile_cpu': '', 'profile_cpu_mode': 'foo'}, args=(0,))
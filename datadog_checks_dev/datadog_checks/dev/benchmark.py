@@ -0,0 +1,301 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+"""
+Benchmarking of checks replaying recorded payloads, with the network mocked.
+
+A recording is a YAML (or JSON) file listing the HTTP responses to serve and the
+functions to patch, e.g. database cursors or command runners::
+
+    http:
+      - url: http://localhost:8080/metrics
+        headers:
+          Content-Type: text/plain
+        body_file: metrics.txt
+      - pattern: /api/v1/nodes/.+
+        status: 404
+    patches:
+      datadog_checks.foo.foo.get_subprocess_output:
+        return_value: ['output', '', 0]
+      pymysql.cursors.Cursor.fetchall:
+        side_effect: [[[1, 'foo']], [[2, 'bar']]]
+
+Every run is measured for its wall and CPU time, and a single traced run for its memory usage.
+Results are compared to the baselines saved for the check to detect regressions.
+"""
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import cycle
+from timeit import default_timer
+
+import mock
+import yaml
+from six import PY3, iteritems, text_type
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+if PY3:
+    process_time = time.process_time
+else:
+
+    def process_time():
+        user, system = os.times()[:2]
+        return user + system
+
+
+DEFAULT_ROUNDS = 10
+DEFAULT_THRESHOLD = 0.2
+BASELINES_FILE = 'benchmarks.json'
+
+# Smallest differences considered as regressions, to ignore noise on tiny values
+MIN_DIFFERENCES = OrderedDict(
+    (('wall_time', 0.001), ('cpu_time', 0.001), ('peak_memory', 64 * 1024), ('retained_memory', 64 * 1024))
+)
+
+
+class BenchmarkRegressionWarning(UserWarning):
+    pass
+
+
+class RecordedResponse(object):
+    def __init__(self, url=None, pattern=None, method=None, status=200, headers=None, body='', body_file=None):
+        if not (url or pattern):
+            raise ValueError('Recorded responses must have a `url` or a `pattern`')
+
+        self.url = url
+        self.pattern = re.compile(pattern) if pattern else None
+        self.method = method.upper() if method else None
+        self.status = status
+        self.headers = headers or {}
+
+        if body_file is not None:
+            with open(body_file, 'rb') as f:
+                body = f.read()
+        elif isinstance(body, text_type):
+            body = body.encode('utf-8')
+        self.body = body
+
+    def matches(self, request):
+        if self.method and self.method != request.method:
+            return False
+        elif self.url:
+            return self.url == request.url
+
+        return self.pattern.search(request.url) is not None
+
+
+class Recording(object):
+    """
+    Recorded payloads to replay through a check, see the module documentation for the format.
+    """
+
+    def __init__(self, http=None, patches=None, root=''):
+        """
+        :param http: list of recorded responses
+        :param patches: mapping of targets to patch to the `return_value` or `side_effect` of their mock
+        :param root: directory the `body_file` of the responses are relative to
+        """
+        self.responses = []
+        for response in http or ():
+            response = dict(response)
+            if 'body_file' in response:
+                response['body_file'] = os.path.join(root, response['body_file'])
+            self.responses.append(RecordedResponse(**response))
+
+        self.patches = patches or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = yaml.safe_load(f) or {}
+
+        return cls(data.get('http'), data.get('patches'), root=os.path.dirname(os.path.abspath(path)))
+
+    @contextmanager
+    def replay(self):
+        """
+        Serve the recorded responses to every HTTP request sent with `requests`, failing the unknown
+        ones, and apply the patches.
+        """
+        from requests.adapters import HTTPAdapter
+        from requests.exceptions import ConnectionError
+        from urllib3 import HTTPResponse
+
+        responses = self.responses
+
+        def send(adapter, request, **kwargs):
+            for recorded in responses:
+                if recorded.matches(request):
+                    response = HTTPResponse(
+                        body=BytesIO(recorded.body),
+                        headers=recorded.headers,
+                        status=recorded.status,
+                        preload_content=False,
+                        decode_content=True,
+                    )
+                    return adapter.build_response(request, response)
+
+            raise ConnectionError('No recorded response for {} {}'.format(request.method, request.url))
+
+        patchers = [mock.patch.object(HTTPAdapter, 'send', send)]
+        for target, spec in iteritems(self.patches):
+            spec = dict(spec or {})
+            if 'side_effect' in spec:
+                # Replay the side effects on every run
+                spec['side_effect'] = cycle(spec['side_effect'])
+            patchers.append(mock.patch(target, **spec))
+
+        for patcher in patchers:
+            patcher.start()
+        try:
+            yield self
+        finally:
+            for patcher in reversed(patchers):
+                patcher.stop()
+
+
+def median(values):
+    values = sorted(values)
+    if not values:
+        return None
+
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class Measurements(object):
+    """
+    Wall and CPU time of every run, and memory usage of a traced run:
+
+      - peak_memory: highest number of bytes allocated during the run
+      - retained_memory: number of bytes still allocated after the run
+    """
+
+    def __init__(self):
+        self.wall_times = []
+        self.cpu_times = []
+        self.peak_memory = None
+        self.retained_memory = None
+
+    def timed(self, func):
+        """
+        Wrap `func` to measure every call.
+        """
+
+        def timed_func(*args, **kwargs):
+            wall_start = default_timer()
+            cpu_start = process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.cpu_times.append(process_time() - cpu_start)
+                self.wall_times.append(default_timer() - wall_start)
+
+        return timed_func
+
+    def trace_memory(self, func, *args, **kwargs):
+        """
+        Call `func` once while tracing memory allocations, a no-op on Python 2.
+        """
+        if tracemalloc is None:
+            return
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            # Python 3.9+, otherwise the peak is only accurate when not already tracing
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+
+            start = tracemalloc.get_traced_memory()[0]
+            func(*args, **kwargs)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+        self.peak_memory = max(peak - start, 0)
+        self.retained_memory = max(current - start, 0)
+
+    def summary(self):
+        return OrderedDict(
+            (
+                ('rounds', len(self.wall_times)),
+                ('wall_time', median(self.wall_times)),
+                ('cpu_time', median(self.cpu_times)),
+                ('peak_memory', self.peak_memory),
+                ('retained_memory', self.retained_memory),
+            )
+        )
+
+
+class Baselines(object):
+    """
+    Results of the benchmarks of a check, saved as JSON.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                self.results = json.load(f)
+
+    def get(self, name):
+        return self.results.get(name)
+
+    def set(self, name, summary):
+        self.results[name] = dict(summary)
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.results, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+
+
+def find_regressions(summary, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the `summary` of measurements to a `baseline`.
+
+    :returns: list of (measurement, baseline value, current value) that are higher than
+              the baseline by more than `threshold`, a ratio
+    """
+    regressions = []
+    if not baseline:
+        return regressions
+
+    for key, min_difference in iteritems(MIN_DIFFERENCES):
+        current = summary.get(key)
+        previous = baseline.get(key)
+        if current is None or previous is None:
+            continue
+
+        if current - previous > max(previous * threshold, min_difference):
+            regressions.append((key, previous, current))
+
+    return regressions
+
+
+def format_regressions(name, regressions):
+    lines = ['Benchmark `{}` regressed:'.format(name)]
+    for key, previous, current in regressions:
+        lines.append(
+            '  - {}: {:.6g} -> {:.6g} ({:+.1%})'.format(key, previous, current, (current - previous) / previous)
+            if previous
+            else '  - {}: {:.6g} -> {:.6g}'.format(key, previous, current)
+        )
+
+    return '\n'.join(lines)
@@ -5,6 +5,7 @@ from __future__ import absolute_import
 
 import json
 import os
+import warnings
 from base64 import urlsafe_b64encode
 
 import pytest
@@ -215,6 +216,69 @@ def dd_run_check():
     return run_check
 
 
+@pytest.fixture
+def dd_benchmark_check(request, benchmark, aggregator):
+    """
+    Benchmark a check replaying a recording, see `datadog_checks.dev.benchmark`. The results are
+    compared to the baselines saved next to the test module, and saved as the new baselines
+    with `--dd-bench-save`.
+    """
+    # Lazily import to reduce plugin load times for everyone
+    from datadog_checks.dev.benchmark import (
+        BASELINES_FILE,
+        DEFAULT_ROUNDS,
+        Baselines,
+        BenchmarkRegressionWarning,
+        Measurements,
+        Recording,
+        find_regressions,
+        format_regressions,
+    )
+
+    here = os.path.dirname(request.module.__file__)
+
+    def run_benchmark(check, recording=None, rounds=DEFAULT_ROUNDS, name=None):
+        if recording is None:
+            recording = Recording()
+        elif not isinstance(recording, Recording):
+            recording = Recording.load(os.path.join(here, recording))
+
+        def run_check():
+            error = check.run()
+            if error:
+                raise Exception(json.loads(error)[0]['traceback'])
+
+        measurements = Measurements()
+        with recording.replay():
+            # Warm up caches, etc.
+            run_check()
+
+            benchmark.pedantic(measurements.timed(run_check), setup=aggregator.reset, rounds=rounds)
+            aggregator.reset()
+            measurements.trace_memory(run_check)
+
+        name = name or request.node.name
+        summary = measurements.summary()
+        benchmark.extra_info.update(summary)
+
+        baselines = Baselines(os.path.join(here, BASELINES_FILE))
+        regressions = find_regressions(summary, baselines.get(name), request.config.getoption('--dd-bench-threshold'))
+
+        if request.config.getoption('--dd-bench-save'):
+            baselines.set(name, summary)
+            baselines.save()
+        elif regressions:
+            message = format_regressions(name, regressions)
+            if request.config.getoption('--dd-bench-fail'):
+                pytest.fail(message)
+            else:
+                warnings.warn(message, BenchmarkRegressionWarning)
+
+        return summary
+
+    return run_benchmark
+
+
 @pytest.fixture
 def dd_get_state():
     return get_state
@@ -225,6 +289,22 @@ def dd_save_state():
     return save_state
 
 
+def pytest_addoption(parser):
+    group = parser.getgroup('datadog_checks')
+    group.addoption(
+        '--dd-bench-save', action='store_true', help='Save the results of `dd_benchmark_check` as the new baselines'
+    )
+    group.addoption(
+        '--dd-bench-threshold',
+        type=float,
+        default=0.2,
+        help='Ratio above the baselines from which `dd_benchmark_check` results are regressions',
+    )
+    group.addoption(
+        '--dd-bench-fail', action='store_true', help='Fail instead of warning on `dd_benchmark_check` regressions'
+    )
+
+
 def pytest_configure(config):
     # pytest will emit warnings if these aren't registered ahead of time
     config.addinivalue_line('markers', 'unit: marker for unit tests')
@@ -26,6 +26,8 @@ def display_envs(check_envs):
 @click.option('--format-style', '-fs', is_flag=True, help='Run only the code style formatter')
 @click.option('--style', '-s', is_flag=True, help='Run only style checks')
 @click.option('--bench', '-b', is_flag=True, help='Run only benchmarks')
+@click.option('--bench-save', is_flag=True, help='Save the benchmark results as the new baselines')
+@click.option('--bench-fail', is_flag=True, help='Fail benchmarks regressing from their baselines')
 @click.option('--e2e', is_flag=True, help='Run only end-to-end tests')
 @click.option('--cov', '-c', 'coverage', is_flag=True, help='Measure code coverage')
 @click.option('--cov-missing', '-cm', is_flag=True, help='Show line numbers of statements that were not executed')
@@ -47,6 +49,8 @@ def test(
     format_style,
     style,
     bench,
+    bench_save,
+    bench_fail,
     e2e,
     coverage,
     junit,
@@ -88,6 +92,10 @@ def test(
     if e2e:
         marker = 'e2e'
 
+    # Implicitly run benchmarks
+    if bench_save or bench_fail:
+        bench = True
+
     coverage_show_missing_lines = str(cov_missing or testing_on_ci)
 
     test_env_vars = {
@@ -141,6 +149,8 @@ def test(
             enter_pdb=enter_pdb,
             debug=debug,
             bench=bench,
+            bench_save=bench_save,
+            bench_fail=bench_fail,
             coverage=coverage,
             junit=junit,
             marker=marker,
@@ -164,6 +164,8 @@ def construct_pytest_options(
     enter_pdb=False,
     debug=False,
     bench=False,
+    bench_save=False,
+    bench_fail=False,
     coverage=False,
     junit=False,
     marker='',
@@ -189,6 +191,11 @@ def construct_pytest_options(
 
     if bench:
         pytest_options += ' --benchmark-only --benchmark-cprofile=tottime'
+
+        if bench_save:
+            pytest_options += ' --dd-bench-save'
+        elif bench_fail:
+            pytest_options += ' --dd-bench-fail'
     else:
         pytest_options += ' --benchmark-skip'
 
@@ -0,0 +1,139 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under a 3-clause BSD style license (see LICENSE)
+import gzip
+import os
+import subprocess
+from io import BytesIO
+
+import pytest
+import requests
+from six import PY3
+
+from datadog_checks.base import AgentCheck
+from datadog_checks.dev.benchmark import Baselines, Measurements, Recording, find_regressions, format_regressions
+from datadog_checks.dev.utils import write_file
+
+
+class StatusCheck(AgentCheck):
+    def check(self, instance):
+        response = self.http.get(instance['url'])
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            name, value = line.split()
+            self.gauge(name, float(value))
+
+
+def test_recording_http(tmpdir):
+    write_file(str(tmpdir.join('metrics.txt')), u'foo 1\nbar 2\n')
+    tmpdir.join('recording.yaml').write(
+        '''
+http:
+  - url: http://localhost:8080/metrics
+    body_file: metrics.txt
+  - pattern: /status/\\d+$
+    method: get
+    status: 503
+'''
+    )
+    recording = Recording.load(str(tmpdir.join('recording.yaml')))
+
+    with recording.replay():
+        response = requests.get('http://localhost:8080/metrics', stream=True)
+        assert response.status_code == 200
+        assert list(response.iter_lines()) == [b'foo 1', b'bar 2']
+
+        assert requests.get('http://localhost:8080/status/1').status_code == 503
+
+        with pytest.raises(requests.exceptions.ConnectionError, match='No recorded response for POST'):
+            requests.post('http://localhost:8080/status/1')
+
+
+def test_recording_http_compressed():
+    body = BytesIO()
+    with gzip.GzipFile(fileobj=body, mode='wb') as f:
+        f.write(b'foo')
+
+    recording = Recording(
+        http=[{'url': 'http://localhost/', 'headers': {'Content-Encoding': 'gzip'}, 'body': body.getvalue()}]
+    )
+
+    with recording.replay():
+        assert requests.get('http://localhost/').content == b'foo'
+
+
+def test_recording_patches():
+    recording = Recording(
+        patches={'subprocess.check_output': {'side_effect': [b'foo', b'bar']}, 'os.getcwd': {'return_value': 'root'}}
+    )
+
+    with recording.replay():
+        assert [subprocess.check_output(['ls']) for _ in range(3)] == [b'foo', b'bar', b'foo']
+        assert os.getcwd() == 'root'
+
+    assert os.getcwd() != 'root'
+
+
+def test_measurements():
+    calls = []
+
+    def run():
+        del calls[:]
+        calls.append(list(range(10000)))
+
+    measurements = Measurements()
+    timed_run = measurements.timed(run)
+    for _ in range(3):
+        timed_run()
+    measurements.trace_memory(run)
+
+    summary = measurements.summary()
+    assert len(measurements.wall_times) == 3
+    assert summary['rounds'] == 3
+    assert summary['wall_time'] > 0
+    assert summary['cpu_time'] >= 0
+    if PY3:
+        assert summary['retained_memory'] >= 10000 * 8
+        assert summary['peak_memory'] >= summary['retained_memory']
+    else:
+        assert summary['retained_memory'] is None
+
+
+def test_baselines(tmpdir):
+    path = str(tmpdir.join('benchmarks.json'))
+
+    baselines = Baselines(path)
+    assert baselines.get('test_foo') is None
+
+    baselines.set('test_foo', {'wall_time': 0.5})
+    baselines.save()
+
+    assert Baselines(path).get('test_foo') == {'wall_time': 0.5}
+
+
+def test_find_regressions():
+    baseline = {'wall_time': 0.1, 'cpu_time': 0.1, 'peak_memory': 1000000, 'retained_memory': 1000}
+    summary = {'wall_time': 0.13, 'cpu_time': 0.11, 'peak_memory': 2000000, 'retained_memory': 10000}
+
+    regressions = find_regressions(summary, baseline, threshold=0.2)
+    # Differences below the minimum are ignored
+    assert regressions == [('wall_time', 0.1, 0.13), ('peak_memory', 1000000, 2000000)]
+    assert find_regressions(summary, None) == []
+    assert find_regressions(summary, baseline, threshold=1.5) == []
+
+    assert format_regressions('test_foo', regressions) == (
+        'Benchmark `test_foo` regressed:\n'
+        '  - wall_time: 0.1 -> 0.13 (+30.0%)\n'
+        '  - peak_memory: 1e+06 -> 2e+06 (+100.0%)'
+    )
+
+
+def test_dd_benchmark_check(dd_benchmark_check, aggregator):
+    check = StatusCheck('status', {}, [{'url': 'http://localhost:8080/metrics'}])
+    recording = Recording(http=[{'url': 'http://localhost:8080/metrics', 'body': 'foo 1\nbar 2\n'}])
+
+    summary = dd_benchmark_check(check, recording, rounds=2)
+
+    assert summary['rounds'] == 2
+    aggregator.assert_metric('foo', 1)
+    aggregator.assert_metric('bar', 2)
@@ -13,7 +13,7 @@ from six import iteritems, string_types
 from datadog_checks.base import AgentCheck, ConfigurationError, is_affirmative
 from datadog_checks.base.utils.platform import Platform
 from datadog_checks.base.utils.subprocess_output import SubprocessOutputEmptyError, get_subprocess_output
-from datadog_checks.base.utils.timeout import TimeoutException, timeout
+from datadog_checks.base.utils.timeout import TimeoutException, get_executor, timeout
 
 # See: https://github.com/DataDog/integrations-core/pull/1109#discussion_r167133580
 IGNORE_CASE = re.I if platform.system() == 'Windows' else 0
@@ -45,6 +45,7 @@ class Disk(AgentCheck):
         self._custom_tags = instance.get('tags', [])
         self._service_check_rw = is_affirmative(instance.get('service_check_rw', False))
         self._min_disk_size = instance.get('min_disk_size', 0) * 1024 * 1024
+        self._telemetry = is_affirmative(instance.get('telemetry', False))
 
         self._compile_pattern_filters(instance)
         self._compile_tag_re()
@@ -65,7 +66,7 @@ class Disk(AgentCheck):
 
             # Get disk metrics here to be able to exclude on total usage
             try:
-                disk_usage = timeout(5)(psutil.disk_usage)(part.mountpoint)
+                disk_usage = timeout(5, owner=self.check_id)(psutil.disk_usage)(part.mountpoint)
             except TimeoutException:
                 self.log.warning(
                     u'Timeout while retrieving the disk usage of `%s` mountpoint. Skipping...', part.mountpoint
@@ -118,6 +119,9 @@ class Disk(AgentCheck):
 
         self.collect_latency_metrics()
 
+        if self._telemetry:
+            get_executor().report(self, 'datadog.agent.disk.timeout', tags=self._custom_tags)
+
     def exclude_disk(self, part):
         # skip cd-rom drives with no disk in it; they may raise
         # ENOENT, pop-up a Windows GUI error for a non-ready
@@ -218,7 +222,7 @@ class Disk(AgentCheck):
         metrics = {}
         # we need to timeout this, too.
         try:
-            inodes = timeout(5)(os.statvfs)(mountpoint)
+            inodes = timeout(5, owner=self.check_id)(os.statvfs)(mountpoint)
         except TimeoutException:
             self.log.warning(u'Timeout while retrieving the disk usage of `%s` mountpoint. Skipping...', mountpoint)
             return metrics
@@ -155,3 +155,16 @@ def test_min_disk_size(aggregator, gauge_metrics, rate_metrics):
         aggregator.assert_metric_has_tag(name, 'device:{}'.format(DEFAULT_DEVICE_NAME))
 
     aggregator.assert_all_metrics_covered()
+
+
+@pytest.mark.usefixtures('psutil_mocks')
+def test_telemetry(aggregator):
+    instance = {'telemetry': True, 'tag_by_label': False, 'tags': ['optional:tags1']}
+    c = Disk('disk', {}, [instance])
+    c.check_id = 'disk:telemetry'
+    c.check(instance)
+
+    for name in ('workers', 'busy', 'abandoned'):
+        aggregator.assert_metric('datadog.agent.disk.timeout.{}'.format(name), tags=['optional:tags1'])
+    for name in ('timeouts', 'rejected', 'saturated'):
+        aggregator.assert_metric('datadog.agent.disk.timeout.{}'.format(name), value=0, tags=['optional:tags1'])
@@ -1,7 +1,6 @@
 # (C) Datadog, Inc. 2018-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
-import re
 from collections import defaultdict
 
 import requests
@@ -10,6 +9,12 @@ from datadog_checks.checks import AgentCheck
 
 from .errors import UnknownMetric, UnknownTags
 from .parser import parse_histogram, parse_metric
+from .utils import compile_patterns
+
+DEFAULT_CACHE_SIZE = 100000
+
+# Read the payload in large chunks, the default of `iter_lines` is only 512 bytes
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 class Envoy(AgentCheck):
@@ -23,12 +28,12 @@ class Envoy(AgentCheck):
         self.whitelist = None
         self.blacklist = None
 
-        # The memory implications here are unclear to me. We may want a bloom filter
-        # or a data structure that expires elements based on inactivity.
-        self.whitelisted_metrics = set()
-        self.blacklisted_metrics = set()
+        # Envoy stat name -> result of `parse_stat`. The cache is rebuilt every run with the stats
+        # of the payload so names that are no longer exposed don't use memory.
+        self.parse_cache = {}
 
         self.caching_metrics = None
+        self.cache_size = None
 
     def check(self, instance):
         custom_tags = instance.get('tags', [])
@@ -42,18 +47,17 @@ class Envoy(AgentCheck):
             return
 
         if self.whitelist is None:
-            whitelist = set(re.sub(r'^envoy\\?\.', '', s, 1) for s in instance.get('metric_whitelist', []))
-            self.whitelist = [re.compile(pattern) for pattern in whitelist]
+            self.whitelist = compile_patterns(instance.get('metric_whitelist', []))
 
         if self.blacklist is None:
-            blacklist = set(re.sub(r'^envoy\\?\.', '', s, 1) for s in instance.get('metric_blacklist', []))
-            self.blacklist = [re.compile(pattern) for pattern in blacklist]
+            self.blacklist = compile_patterns(instance.get('metric_blacklist', []))
 
         if self.caching_metrics is None:
             self.caching_metrics = instance.get('cache_metrics', True)
+            self.cache_size = int(instance.get('cache_metrics_size', DEFAULT_CACHE_SIZE)) if self.caching_metrics else 0
 
         try:
-            response = self.http.get(stats_url)
+            response = self.http.get(stats_url, stream=True)
         except requests.exceptions.Timeout:
             msg = 'Envoy endpoint `{}` timed out after {} seconds'.format(
                 stats_url, timeout=self.http.options['timeout']
@@ -67,74 +71,97 @@ class Envoy(AgentCheck):
             self.log.exception(msg)
             return
 
-        if response.status_code != 200:
-            msg = 'Envoy endpoint `{}` responded with HTTP status code {}'.format(stats_url, response.status_code)
-            self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL, message=msg, tags=custom_tags)
-            self.log.warning(msg)
-            return
-
-        # Avoid repeated global lookups.
-        get_method = getattr
-
-        for line in response.content.decode().splitlines():
-            try:
-                envoy_metric, value = line.split(': ')
-            except ValueError:
-                continue
-
-            if not self.whitelisted_metric(envoy_metric):
-                continue
-
-            try:
-                metric, tags, method = parse_metric(envoy_metric)
-            except UnknownMetric:
-                if envoy_metric not in self.unknown_metrics:
-                    self.log.debug('Unknown metric `%s`', envoy_metric)
-                self.unknown_metrics[envoy_metric] += 1
-                continue
-            except UnknownTags as e:
-                unknown_tags = str(e).split('|||')
-                for tag in unknown_tags:
-                    if tag not in self.unknown_tags:
-                        self.log.debug('Unknown tag `%s` in metric `%s`', tag, envoy_metric)
-                    self.unknown_tags[tag] += 1
-                continue
-
-            tags.extend(custom_tags)
-
+        try:
+            if response.status_code != 200:
+                msg = 'Envoy endpoint `{}` responded with HTTP status code {}'.format(stats_url, response.status_code)
+                self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL, message=msg, tags=custom_tags)
+                self.log.warning(msg)
+                return
+
+            # Avoid repeated global and attribute lookups.
+            get_method = getattr
+            parse_cache = self.parse_cache
+            parse_stat = self.parse_stat
+            cache_size = self.cache_size
+            next_cache = {}
+
+            # The payload can be huge so the lines are processed as they are received
+            response.encoding = 'utf-8'
             try:
-                value = int(value)
-                get_method(self, method)(metric, value, tags=tags)
-
-            # If the value isn't an integer assume it's pre-computed histogram data.
-            except (ValueError, TypeError):
-                for metric, value in parse_histogram(metric, value):
-                    self.gauge(metric, value, tags=tags)
+                for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE, decode_unicode=True):
+                    try:
+                        envoy_metric, value = line.split(': ')
+                    except ValueError:
+                        continue
+
+                    try:
+                        result = parse_cache[envoy_metric]
+                    except KeyError:
+                        result = parse_stat(envoy_metric, custom_tags)
+
+                    if len(next_cache) < cache_size:
+                        next_cache[envoy_metric] = result
+
+                    if result is None:
+                        continue
+
+                    metric, tags, method = result
+                    if metric is None:
+                        self.record_unknown(envoy_metric, tags)
+                        continue
+
+                    try:
+                        value = int(value)
+                        get_method(self, method)(metric, value, tags=tags)
+
+                    # If the value isn't an integer assume it's pre-computed histogram data.
+                    except (ValueError, TypeError):
+                        for metric, value in parse_histogram(metric, value):
+                            self.gauge(metric, value, tags=tags)
+            except requests.exceptions.RequestException:
+                # The payload is read while the metrics are submitted, the connection can still fail
+                msg = 'Error reading the response of Envoy endpoint `{}`'.format(stats_url)
+                self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL, message=msg, tags=custom_tags)
+                self.log.exception(msg)
+                return
+        finally:
+            response.close()
+
+        self.parse_cache = next_cache
 
         self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.OK, tags=custom_tags)
 
-    def whitelisted_metric(self, metric):
-        if self.caching_metrics:
-            if metric in self.whitelisted_metrics:
-                return True
-            elif metric in self.blacklisted_metrics:
-                return False
-
-        if self.whitelist:
-            whitelisted = any(pattern.search(metric) for pattern in self.whitelist)
-            if self.blacklist:
-                whitelisted = whitelisted and not any(pattern.search(metric) for pattern in self.blacklist)
+    def parse_stat(self, envoy_metric, custom_tags):
+        """
+        Returns the metric name, tags and submission method of an Envoy stat, with a `None` metric
+        name and the unknown tags if it could not be parsed, or `None` if it is filtered out.
+        """
+        if not self.whitelisted_metric(envoy_metric):
+            return None
 
-            if self.caching_metrics and whitelisted:
-                self.whitelisted_metrics.add(metric)
-
-            return whitelisted
-        elif self.blacklist:
-            blacklisted = any(pattern.search(metric) for pattern in self.blacklist)
+        try:
+            metric, tags, method = parse_metric(envoy_metric)
+        except UnknownMetric:
+            return None, (), None
+        except UnknownTags as e:
+            return None, tuple(str(e).split('|||')), None
+
+        tags.extend(custom_tags)
+        return metric, tags, method
+
+    def record_unknown(self, envoy_metric, unknown_tags):
+        if unknown_tags:
+            for tag in unknown_tags:
+                if tag not in self.unknown_tags:
+                    self.log.debug('Unknown tag `%s` in metric `%s`', tag, envoy_metric)
+                self.unknown_tags[tag] += 1
+        else:
+            if envoy_metric not in self.unknown_metrics:
+                self.log.debug('Unknown metric `%s`', envoy_metric)
+            self.unknown_metrics[envoy_metric] += 1
 
-            if self.caching_metrics and blacklisted:
-                self.blacklisted_metrics.add(metric)
+    def whitelisted_metric(self, metric):
+        if self.whitelist is not None and not self.whitelist(metric):
+            return False
 
-            return not blacklisted
-        else:
-            return True
+        return self.blacklist is None or not self.blacklist(metric)
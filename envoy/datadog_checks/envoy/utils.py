@@ -1,3 +1,6 @@
+import re
+
+
 def make_metric_tree(metrics):
     metric_tree = {}
 
@@ -33,3 +36,15 @@ def make_metric_tree(metrics):
                 tree['|_tags_|'] = sorted(tree['|_tags_|'], key=lambda t: len(t), reverse=True)
 
     return metric_tree
+
+
+def compile_patterns(patterns):
+    """
+    Combine regular expressions into a single one, matching metric names without the `envoy.` prefix.
+    Returns its `search` method, or `None` if there are no patterns.
+    """
+    patterns = sorted(set(re.sub(r'^envoy\\?\.', '', pattern, 1) for pattern in patterns))
+    if not patterns:
+        return None
+
+    return re.compile('|'.join('(?:{})'.format(pattern) for pattern in patterns)).search
@@ -29,6 +29,14 @@ class MockResponse:
     def __init__(self, content, status_code):
         self.content = content
         self.status_code = status_code
+        self.encoding = None
+
+    def iter_lines(self, chunk_size=512, decode_unicode=False):
+        for line in self.content.splitlines():
+            yield line.decode(self.encoding or 'utf-8') if decode_unicode else line
+
+    def close(self):
+        pass
 
 
 @lru_cache(maxsize=None)
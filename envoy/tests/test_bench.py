@@ -26,3 +26,9 @@ def test_fixture(benchmark):
         c.check(instance)
 
         benchmark(c.check, instance)
+
+
+def test_recording(dd_benchmark_check):
+    c = Envoy('envoy', {}, [INSTANCES['main']])
+
+    dd_benchmark_check(c, 'fixtures/recording.yaml')
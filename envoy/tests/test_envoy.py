@@ -5,6 +5,7 @@ from copy import deepcopy
 
 import mock
 import pytest
+import requests
 
 from datadog_checks.envoy import Envoy
 from datadog_checks.envoy.metrics import METRIC_PREFIX, METRICS
@@ -86,6 +87,31 @@ def test_service_check(aggregator):
     assert aggregator.service_checks(Envoy.SERVICE_CHECK_NAME)[0].status == Envoy.OK
 
 
+def test_service_check_error_status(aggregator):
+    instance = INSTANCES['main']
+    c = Envoy(CHECK_NAME, {}, [instance])
+    error_response = mock.MagicMock(status_code=503)
+
+    with mock.patch('requests.get', return_value=error_response):
+        c.check(instance)
+
+    assert aggregator.service_checks(Envoy.SERVICE_CHECK_NAME)[0].status == Envoy.CRITICAL
+    error_response.close.assert_called_once_with()
+
+
+def test_service_check_read_error(aggregator):
+    instance = INSTANCES['main']
+    c = Envoy(CHECK_NAME, {}, [instance])
+    error_response = mock.MagicMock(status_code=200)
+    error_response.iter_lines.side_effect = requests.exceptions.ChunkedEncodingError()
+
+    with mock.patch('requests.get', return_value=error_response):
+        c.check(instance)
+
+    assert aggregator.service_checks(Envoy.SERVICE_CHECK_NAME)[0].status == Envoy.CRITICAL
+    error_response.close.assert_called_once_with()
+
+
 def test_unknown():
     instance = INSTANCES['main']
     c = Envoy(CHECK_NAME, {}, [instance])
@@ -96,6 +122,56 @@ def test_unknown():
     assert sum(c.unknown_metrics.values()) == 5
 
 
+def test_parse_cache(aggregator):
+    instance = INSTANCES['whitelist']
+    c = Envoy(CHECK_NAME, {}, [instance])
+
+    with mock.patch('requests.get', return_value=response('multiple_services')):
+        c.check(instance)
+        metrics = {name: len(aggregator.metrics(name)) for name in aggregator.metric_names}
+        aggregator.reset()
+
+        # Every stat is cached, filtered out or not
+        stats = {line.split(b': ')[0] for line in response('multiple_services').content.splitlines()}
+        assert len(c.parse_cache) == len(stats)
+
+        with mock.patch('datadog_checks.envoy.envoy.parse_metric') as parse_metric:
+            c.check(instance)
+            assert not parse_metric.called
+
+    assert {name: len(aggregator.metrics(name)) for name in aggregator.metric_names} == metrics
+
+    # Stats no longer exposed are dropped
+    with mock.patch('requests.get', return_value=response('unknown_metrics')):
+        c.check(instance)
+    assert len(c.parse_cache) == 4
+
+
+@pytest.mark.parametrize(
+    'extra_config, cache_size', [({'cache_metrics': False}, 0), ({'cache_metrics_size': 100}, 100)]
+)
+def test_parse_cache_size(extra_config, cache_size):
+    instance = deepcopy(INSTANCES['main'])
+    instance.update(extra_config)
+    c = Envoy(CHECK_NAME, {}, [instance])
+
+    with mock.patch('requests.get', return_value=response('multiple_services')):
+        c.check(instance)
+
+    assert len(c.parse_cache) == cache_size
+
+
+def test_unknown_cached():
+    instance = INSTANCES['main']
+    c = Envoy(CHECK_NAME, {}, [instance])
+
+    with mock.patch('requests.get', return_value=response('unknown_metrics')):
+        c.check(instance)
+        c.check(instance)
+
+    assert sum(c.unknown_metrics.values()) == 10
+
+
 @pytest.mark.parametrize(
     'test_case, extra_config, expected_http_kwargs',
     [
@@ -116,7 +192,13 @@ def test_config(test_case, extra_config, expected_http_kwargs):
         check.check(instance)
 
         http_wargs = dict(
-            auth=mock.ANY, cert=mock.ANY, headers=mock.ANY, proxies=mock.ANY, timeout=mock.ANY, verify=mock.ANY
+            auth=mock.ANY,
+            cert=mock.ANY,
+            headers=mock.ANY,
+            proxies=mock.ANY,
+            stream=True,
+            timeout=mock.ANY,
+            verify=mock.ANY,
         )
         http_wargs.update(expected_http_kwargs)
         r.get.assert_called_with('http://{}:8001/stats'.format(HOST), **http_wargs)
@@ -1,4 +1,4 @@
-from datadog_checks.envoy.utils import make_metric_tree
+from datadog_checks.envoy.utils import compile_patterns, make_metric_tree
 
 
 def test_make_metric_tree():
@@ -47,3 +47,14 @@ def test_make_metric_tree():
         },
     }
     # fmt: on
+
+
+def test_compile_patterns():
+    assert compile_patterns([]) is None
+
+    search = compile_patterns([r'envoy\.cluster\.(in|out)\.', r'^http\.', 'envoy.listener'])
+    assert search('cluster.in.foo')
+    assert search('http.foo')
+    assert search('listener.foo')
+    assert not search('foo.http.bar')
+    assert not search('cluster.other.foo')
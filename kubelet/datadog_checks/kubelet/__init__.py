@@ -1,10 +1,11 @@
 from .__about__ import __version__
-from .common import KubeletCredentials, PodListUtils, get_pod_by_uid, is_static_pending_pod
+from .common import KubeletCredentials, PodList, PodListUtils, get_pod_by_uid, is_static_pending_pod
 from .kubelet import KubeletCheck
 
 __all__ = [
     'KubeletCheck',
     '__version__',
+    'PodList',
     'PodListUtils',
     'KubeletCredentials',
     'get_pod_by_uid',
@@ -164,25 +164,19 @@ class CadvisorScraper(object):
 
         # Let's see who we have here
         if is_pod:
-            tags = tags_for_pod(pod_uid, tagger.HIGH)
+            tags = tags_for_pod(pod_uid, tagger.HIGH, self.tagger_cache)
         elif in_static_pod and k_container_name:
             # FIXME static pods don't have container statuses so we can't
             # get the container id with the scheme, assuming docker here
-            tags = tags_for_docker(subcontainer_id, tagger.HIGH)
-            tags += tags_for_pod(pod_uid, tagger.HIGH)
+            tags = tags_for_docker(subcontainer_id, tagger.HIGH, self.tagger_cache)
+            tags += tags_for_pod(pod_uid, tagger.HIGH, self.tagger_cache)
             tags.append("kube_container_name:%s" % k_container_name)
         else:  # Standard container
-            cid = pod_list_utils.get_cid_by_name_tuple(
-                (
-                    pod.get('metadata', {}).get('namespace', ""),
-                    pod.get('metadata', {}).get('name', ""),
-                    k_container_name,
-                )
-            )
+            cid = pod_list_utils.get_cid_by_name_tuple((pod.namespace, pod.name, k_container_name))
             if pod_list_utils.is_excluded(cid):
                 self.log.debug("Filtering out %s", cid)
                 return
-            tags = tagger.tag(replace_container_rt_prefix(cid), tagger.HIGH) or []
+            tags = self.tagger_cache.tag(replace_container_rt_prefix(cid), tagger.HIGH) or []
 
         if not tags:
             self.log.debug("Subcontainer %s doesn't have tags, skipping.", subcontainer_id)
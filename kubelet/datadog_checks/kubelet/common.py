@@ -1,6 +1,9 @@
 # (C) Datadog, Inc. 2018-present
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
+import json
+
+from six import iteritems
 
 from datadog_checks.base.utils.tagging import tagger
 
@@ -22,57 +25,53 @@ SOURCE_TYPE = 'kubelet'
 CADVISOR_DEFAULT_PORT = 0
 
 
-def tags_for_pod(pod_id, cardinality):
+def tags_for_pod(pod_id, cardinality, tagger_cache=None):
     """
     Queries the tagger for a given pod uid
+    :param tagger_cache: (optional) TaggerCache to query instead of the tagger
     :return: string array, empty if pod not found
     """
-    return tagger.tag('kubernetes_pod_uid://%s' % pod_id, cardinality) or []
+    source = tagger if tagger_cache is None else tagger_cache
+    return source.tag('kubernetes_pod_uid://%s' % pod_id, cardinality) or []
 
 
-def tags_for_docker(cid, cardinality):
+def tags_for_docker(cid, cardinality, tagger_cache=None):
     """
     Queries the tagger for a given container id
+    :param tagger_cache: (optional) TaggerCache to query instead of the tagger
     :return: string array, empty if container not found
     """
-    return tagger.tag('container_id://%s' % cid, cardinality) or []
+    source = tagger if tagger_cache is None else tagger_cache
+    return source.tag('container_id://%s' % cid, cardinality) or []
 
 
 def get_pod_by_uid(uid, podlist):
     """
     Searches for a pod uid in the podlist and returns the pod if found
     :param uid: pod uid
-    :param podlist: podlist dict object
-    :return: pod dict object if found, None if not found
+    :param podlist: PodList object
+    :return: Pod object if found, None if not found
     """
-    for pod in podlist.get("items", []):
-        try:
-            if pod["metadata"]["uid"] == uid:
-                return pod
-        except KeyError:
-            continue
-    return None
+    if podlist is None:
+        return None
+    return podlist.get_pod(uid)
 
 
 def is_static_pending_pod(pod):
     """
     Return if the pod is a static pending pod
     See https://github.com/kubernetes/kubernetes/pull/57106
-    :param pod: dict
+    :param pod: Pod object
     :return: bool
     """
-    try:
-        if pod["metadata"]["annotations"]["kubernetes.io/config.source"] == "api":
-            return False
-
-        pod_status = pod["status"]
-        if pod_status["phase"] != "Pending":
-            return False
+    if pod.config_source is None or pod.config_source == "api":
+        return False
 
-        return "containerStatuses" not in pod_status
-    except KeyError:
+    if pod.phase != "Pending":
         return False
 
+    return pod.containers is None
+
 
 def replace_container_rt_prefix(cid):
     """
@@ -88,6 +87,156 @@ def replace_container_rt_prefix(cid):
     return cid
 
 
+class Container(object):
+    """
+    Fields of a container status, and of its spec, used by the check.
+    The states are projected to a mapping of state name (running, waiting, terminated) -> reason.
+    """
+
+    __slots__ = ('name', 'id', 'image', 'state', 'last_state', 'restart_count', 'requests', 'limits')
+
+    def __init__(self, name, id, image=None, state=None, last_state=None, restart_count=0, requests=None, limits=None):
+        self.name = name
+        self.id = id
+        self.image = image
+        self.state = state or {}
+        self.last_state = last_state or {}
+        self.restart_count = restart_count
+        self.requests = requests
+        self.limits = limits
+
+    @staticmethod
+    def project_state(state):
+        return {name: (value or {}).get('reason') for name, value in iteritems(state or {})}
+
+    @classmethod
+    def from_dict(cls, status, spec=None):
+        resources = (spec or {}).get('resources') or {}
+        return cls(
+            status.get('name'),
+            status.get('containerID'),
+            image=status.get('image'),
+            state=cls.project_state(status.get('state')),
+            last_state=cls.project_state(status.get('lastState')),
+            restart_count=status.get('restartCount', 0),
+            requests=resources.get('requests'),
+            limits=resources.get('limits'),
+        )
+
+
+class Pod(object):
+    """
+    Fields of a pod used by the check, projected from the podlist.
+    `containers` is None if the pod has no container statuses, e.g. for static pods.
+    """
+
+    __slots__ = ('uid', 'name', 'namespace', 'phase', 'config_source', 'host_network', 'containers')
+
+    def __init__(self, uid, name, namespace, phase=None, config_source=None, host_network=False, containers=None):
+        self.uid = uid
+        self.name = name
+        self.namespace = namespace
+        self.phase = phase
+        self.config_source = config_source
+        self.host_network = host_network
+        self.containers = containers
+
+    @classmethod
+    def from_dict(cls, pod):
+        metadata = pod.get('metadata') or {}
+        status = pod.get('status') or {}
+        spec = pod.get('spec') or {}
+
+        containers = None
+        if 'containerStatuses' in status:
+            specs = {ctr.get('name'): ctr for ctr in spec.get('containers') or []}
+            containers = [
+                Container.from_dict(ctr, specs.get(ctr.get('name'))) for ctr in status['containerStatuses'] or []
+            ]
+
+        return cls(
+            metadata.get('uid'),
+            metadata.get('name'),
+            metadata.get('namespace'),
+            phase=status.get('phase'),
+            config_source=(metadata.get('annotations') or {}).get('kubernetes.io/config.source'),
+            host_network=spec.get('hostNetwork', False),
+            containers=containers,
+        )
+
+
+class PodList(object):
+    """
+    Pods of the kubelet podlist, indexed by uid, (namespace, name) and container id.
+    """
+
+    __slots__ = ('pods', 'expired_count', 'containers', '_pods_by_uid', '_uids_by_name', '_cids_by_name')
+
+    def __init__(self, pods, expired_count=0):
+        self.pods = pods
+        self.expired_count = expired_count
+
+        # Container id (with runtime scheme) -> Container
+        self.containers = {}
+        self._pods_by_uid = {}
+        self._uids_by_name = {}
+        self._cids_by_name = {}
+
+        for pod in pods:
+            if pod.uid is not None:
+                self._pods_by_uid[pod.uid] = pod
+            self._uids_by_name[(pod.namespace, pod.name)] = pod.uid
+
+            for ctr in pod.containers or ():
+                if not ctr.id:
+                    continue
+                self.containers[ctr.id] = ctr
+                self._cids_by_name[(pod.namespace, pod.name, ctr.name)] = ctr.id
+
+    @classmethod
+    def from_dict(cls, podlist):
+        return cls([Pod.from_dict(pod) for pod in podlist.get('items') or []])
+
+    def __iter__(self):
+        return iter(self.pods)
+
+    def __len__(self):
+        return len(self.pods)
+
+    def get_pod(self, uid):
+        return self._pods_by_uid.get(uid)
+
+    def get_uid_by_name_tuple(self, name_tuple):
+        return self._uids_by_name.get(name_tuple)
+
+    def get_cid_by_name_tuple(self, name_tuple):
+        return self._cids_by_name.get(name_tuple)
+
+
+def parse_pod_list(fp, pod_filter=None):
+    """
+    Decodes a podlist, every pod is projected to a Pod object as soon as it is decoded
+    so that the fields the check doesn't use are freed right away.
+    :param fp: file-like object
+    :param pod_filter: (optional) function called with every pod dict, the pod is dropped if it returns None
+    :return: PodList
+    """
+
+    def object_hook(obj):
+        # Not a pod (hook is called for all objects)
+        if 'metadata' not in obj or 'status' not in obj:
+            return obj
+
+        if pod_filter is not None and pod_filter(obj) is None:
+            return None
+
+        return Pod.from_dict(obj)
+
+    # Sanitize input: if no pod are running, 'items' is a NoneObject
+    pods = json.load(fp, object_hook=object_hook).get('items') or []
+    return PodList([pod for pod in pods if pod is not None])
+
+
 class PodListUtils(object):
     """
     Queries the podlist and the agent6's filtering logic to determine whether to
@@ -101,35 +250,19 @@ class PodListUtils(object):
     """
 
     def __init__(self, podlist):
+        self.podlist = podlist
         self.containers = {}
         self.static_pod_uids = set()
         self.cache = {}
-        self.pod_uid_by_name_tuple = {}
-        self.container_id_by_name_tuple = {}
 
         if podlist is None:
             return
 
-        pods = podlist.get('items') or []
+        self.containers = podlist.containers
 
-        for pod in pods:
-            metadata = pod.get("metadata", {})
-            uid = metadata.get("uid")
-            namespace = metadata.get("namespace")
-            pod_name = metadata.get("name")
-            self.pod_uid_by_name_tuple[(namespace, pod_name)] = uid
-
-            # FIXME we are forced to do that because the Kubelet PodList isn't updated
-            # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
-            if is_static_pending_pod(pod):
-                self.static_pod_uids.add(uid)
-
-            for ctr in pod.get('status', {}).get('containerStatuses', []):
-                cid = ctr.get('containerID')
-                if not cid:
-                    continue
-                self.containers[cid] = ctr
-                self.container_id_by_name_tuple[(namespace, pod_name, ctr.get('name'))] = cid
+        # FIXME we are forced to do that because the Kubelet PodList isn't updated
+        # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
+        self.static_pod_uids = {pod.uid for pod in podlist if is_static_pending_pod(pod)}
 
     def get_uid_by_name_tuple(self, name_tuple):
         """
@@ -138,7 +271,9 @@ class PodListUtils(object):
         :param name_tuple: (pod_namespace, pod_name)
         :return: str or None
         """
-        return self.pod_uid_by_name_tuple.get(name_tuple, None)
+        if self.podlist is None:
+            return None
+        return self.podlist.get_uid_by_name_tuple(name_tuple)
 
     def get_cid_by_name_tuple(self, name_tuple):
         """
@@ -148,7 +283,9 @@ class PodListUtils(object):
         :param name_tuple: (pod_namespace, pod_name, container_name)
         :return: str or None
         """
-        return self.container_id_by_name_tuple.get(name_tuple, None)
+        if self.podlist is None:
+            return None
+        return self.podlist.get_cid_by_name_tuple(name_tuple)
 
     def is_excluded(self, cid, pod_uid=None):
         """
@@ -176,12 +313,12 @@ class PodListUtils(object):
             self.cache[cid] = True
             return True
         ctr = self.containers[cid]
-        if not ("name" in ctr and "image" in ctr):
+        if ctr.name is None or ctr.image is None:
             # Filter out invalid containers
             self.cache[cid] = True
             return True
 
-        excluded = is_excluded(ctr.get("name"), ctr.get("image"))
+        excluded = is_excluded(ctr.name, ctr.image)
         self.cache[cid] = excluded
         return excluded
 
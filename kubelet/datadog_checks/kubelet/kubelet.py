@@ -3,26 +3,33 @@
 # Licensed under Simplified BSD License (see LICENSE)
 from __future__ import division
 
-import json
 import logging
 import re
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from copy import deepcopy
 from datetime import datetime, timedelta
+from timeit import default_timer
 
-import requests
 from kubeutil import get_connection_info
 from six import iteritems
 from six.moves.urllib.parse import urljoin
 
 from datadog_checks.base.utils.date import UTC, parse_rfc3339
-from datadog_checks.base.utils.tagging import tagger
+from datadog_checks.base.utils.http import RequestsWrapper
+from datadog_checks.base.utils.tagging import TaggerCache, tagger
+from datadog_checks.base.utils.thread_pool import BoundedThreadPool
 from datadog_checks.checks import AgentCheck
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
 from datadog_checks.errors import CheckException
 
 from .cadvisor import CadvisorScraper
-from .common import CADVISOR_DEFAULT_PORT, KubeletCredentials, PodListUtils, replace_container_rt_prefix
+from .common import (
+    CADVISOR_DEFAULT_PORT,
+    KubeletCredentials,
+    PodListUtils,
+    parse_pod_list,
+    replace_container_rt_prefix,
+)
 from .prometheus import CadvisorPrometheusScraperMixin
 
 try:
@@ -40,6 +47,15 @@ CADVISOR_METRICS_PATH = '/metrics/cadvisor'
 KUBELET_METRICS_PATH = '/metrics'
 STATS_PATH = '/stats/summary/'
 
+# Timeout of the requests to the kubelet API endpoints, in seconds
+DEFAULT_TIMEOUT = 10
+
+# Endpoints fetched concurrently: the pod list, node spec, stats summary, and both Prometheus endpoints
+FETCH_CONCURRENCY = 5
+TELEMETRY_HISTOGRAM_FETCH_DURATION = 'kubelet.fetch.duration'
+TELEMETRY_COUNTER_TAGGER_CACHE_HITS_COUNT = 'kubelet.tagger_cache.hits.count'
+TELEMETRY_COUNTER_TAGGER_CACHE_MISSES_COUNT = 'kubelet.tagger_cache.misses.count'
+
 # Suffixes per
 # https://github.com/kubernetes/kubernetes/blob/8fd414537b5143ab039cb910590237cabf4af783/pkg/api/resource/suffix.go#L108
 FACTORS = {
@@ -193,6 +209,20 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
         for d in [self.CADVISOR_METRIC_TRANSFORMERS, counter_transformers, histogram_transformers]:
             self.transformers.update(d)
 
+        self.node_spec_timeout = float(inst.get('node_spec_timeout', DEFAULT_TIMEOUT))
+        self.pod_list_timeout = float(inst.get('pod_list_timeout', DEFAULT_TIMEOUT))
+        self.stats_timeout = float(inst.get('stats_timeout', DEFAULT_TIMEOUT))
+
+        # Session shared by the requests to the kubelet API, created on first use
+        self._http_handler = None
+
+        # Worker threads fetching the endpoints, created on first use
+        self._fetch_pool = None
+        self._fetch_durations = {}
+
+        # Tags of the containers and pods, looked up for every metric
+        self.tagger_cache = TaggerCache(ttl=float(inst.get('tagger_cache_ttl', 0)))
+
     def _create_kubelet_prometheus_instance(self, instance):
         """
         Create a copy of the instance and set default values.
@@ -266,15 +296,21 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
         except Exception as e:
             self.log.debug('cAdvisor not found, running in prometheus mode: %s', e)
 
-        self.pod_list = self.retrieve_pod_list()
+        # The tags are looked up again at every run, unless a TTL is configured
+        self.tagger_cache.reset()
+
+        # The endpoints are fetched concurrently, but processed in order as they are needed
+        fetches = self._fetch_endpoints()
+
+        self.pod_list = fetches['pod_list'].get()
         self.pod_list_utils = PodListUtils(self.pod_list)
 
-        self._report_node_metrics(self.instance_tags)
+        self._report_node_metrics(self.instance_tags, node_spec=fetches['node_spec'].get())
         self._report_pods_running(self.pod_list, self.instance_tags)
         self._report_container_spec_metrics(self.pod_list, self.instance_tags)
         self._report_container_state_metrics(self.pod_list, self.instance_tags)
 
-        self.stats = self._retrieve_stats()
+        self.stats = fetches['stats'].get()
         self._report_ephemeral_storage_usage(self.pod_list, self.stats, self.instance_tags)
         self._report_system_container_metrics(self.stats, self.instance_tags)
 
@@ -283,21 +319,141 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             self.process_cadvisor(instance, self.cadvisor_legacy_url, self.pod_list, self.pod_list_utils)
         elif self.cadvisor_scraper_config['prometheus_url']:  # Prometheus
             self.log.debug('processing cadvisor metrics')
+            self.cadvisor_scraper_config['_prefetched_response'] = fetches['cadvisor']
             self.process(self.cadvisor_scraper_config, metric_transformers=self.transformers)
 
         if self.kubelet_scraper_config['prometheus_url']:  # Prometheus
             self.log.debug('processing kubelet metrics')
+            self.kubelet_scraper_config['_prefetched_response'] = fetches['kubelet']
             self.process(self.kubelet_scraper_config, metric_transformers=self.transformers)
 
+        self._report_fetch_durations()
+        self._report_connection_stats()
+        self._report_tagger_cache_stats()
+
         # Free up memory
         self.pod_list = None
         self.pod_list_utils = None
 
+    def cancel(self):
+        if self._fetch_pool is not None:
+            self._fetch_pool.cancel()
+            self._fetch_pool = None
+
+        for http_handler in (
+            self._http_handler,
+            self.cadvisor_scraper_config['_http_handler'],
+            self.kubelet_scraper_config['_http_handler'],
+        ):
+            if http_handler is not None:
+                http_handler.close_session()
+
+    def _fetch_endpoints(self):
+        """
+        Start fetching the independent endpoints concurrently.
+
+        :returns: OrderedDict of endpoint names to their `AsyncResult`
+        """
+        if self._fetch_pool is None:
+            self._fetch_pool = BoundedThreadPool(FETCH_CONCURRENCY, name='kubelet')
+
+        # Create the session before the worker threads use it
+        self._get_http_handler().session
+
+        fetches = OrderedDict()
+        fetches['pod_list'] = self.retrieve_pod_list
+        fetches['node_spec'] = self._retrieve_node_spec
+        fetches['stats'] = self._retrieve_stats
+        if not self.cadvisor_legacy_url and self.cadvisor_scraper_config['prometheus_url']:
+            fetches['cadvisor'] = lambda: self._prefetch_response(self.cadvisor_scraper_config)
+        if self.kubelet_scraper_config['prometheus_url']:
+            fetches['kubelet'] = lambda: self._prefetch_response(self.kubelet_scraper_config)
+
+        self._fetch_durations = {}
+        return OrderedDict(
+            (name, self._fetch_pool.apply_async(self._timed_fetch, (name, fetch))) for name, fetch in iteritems(fetches)
+        )
+
+    def _timed_fetch(self, name, fetch):
+        start = default_timer()
+        try:
+            return fetch()
+        finally:
+            self._fetch_durations[name] = default_timer() - start
+
+    def _prefetch_response(self, scraper_config):
+        response = self.poll(scraper_config)
+
+        # Download the payload now so that only parsing it is left for `process`
+        response.content
+        return response
+
+    def poll(self, scraper_config, headers=None):
+        """
+        Returns the response fetched ahead by `_fetch_endpoints`, if any.
+        """
+        prefetched_response = scraper_config.pop('_prefetched_response', None)
+        if prefetched_response is not None:
+            return prefetched_response.get()
+
+        return super(KubeletCheck, self).poll(scraper_config, headers=headers)
+
+    def _report_tagger_cache_stats(self):
+        hits, misses = self.tagger_cache.flush_stats()
+        self._send_telemetry_counter(TELEMETRY_COUNTER_TAGGER_CACHE_HITS_COUNT, hits, self.kubelet_scraper_config)
+        self._send_telemetry_counter(TELEMETRY_COUNTER_TAGGER_CACHE_MISSES_COUNT, misses, self.kubelet_scraper_config)
+
+    def _report_fetch_durations(self):
+        for name, duration in sorted(iteritems(self._fetch_durations)):
+            self._send_telemetry_histogram(
+                TELEMETRY_HISTOGRAM_FETCH_DURATION,
+                duration,
+                self.kubelet_scraper_config,
+                extra_tags=['endpoint:{}'.format(name)],
+            )
+
+    def _get_http_handler(self):
+        """
+        Get the HTTP handler whose session is shared by the requests to the kubelet API,
+        so that connections are pooled and reused across runs. The Prometheus scrapers
+        persist their connections too, each with its own handler.
+        """
+        if self._http_handler is None:
+            self._http_handler = RequestsWrapper(
+                {
+                    'persist_connections': True,
+                    'connection_pool_size': FETCH_CONCURRENCY,
+                    'connection_idle_timeout': self.kubelet_scraper_config['connection_idle_timeout'],
+                    'connection_max_age': self.kubelet_scraper_config['connection_max_age'],
+                },
+                # Keep relying on the environment for proxies, like non persistent requests do
+                {'use_agent_proxy': False},
+                logger=self.log,
+            )
+
+            for scraper_config in (self.cadvisor_scraper_config, self.kubelet_scraper_config):
+                scraper_config['persist_connections'] = True
+
+        return self._http_handler
+
+    def _report_connection_stats(self):
+        if self._http_handler is None:
+            return
+
+        new_connections, reused_connections = self._http_handler.connection_stats()
+        for metric_name, value in (
+            (self.TELEMETRY_COUNTER_CONNECTIONS_NEW_COUNT, new_connections),
+            (self.TELEMETRY_COUNTER_CONNECTIONS_REUSED_COUNT, reused_connections),
+        ):
+            self._send_telemetry_counter(
+                metric_name, value, self.kubelet_scraper_config, extra_tags=['endpoint:kubelet_api']
+            )
+
     def perform_kubelet_query(self, url, verbose=True, timeout=10, stream=False):
         """
         Perform and return a GET request against kubelet. Support auth and TLS validation.
         """
-        return requests.get(
+        return self._get_http_handler().get(
             url,
             timeout=timeout,
             verify=self.kubelet_credentials.verify(),
@@ -310,20 +466,14 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
     def retrieve_pod_list(self):
         try:
             cutoff_date = self._compute_pod_expiration_datetime()
-            with self.perform_kubelet_query(self.pod_list_url, stream=True) as r:
+            with self.perform_kubelet_query(self.pod_list_url, stream=True, timeout=self.pod_list_timeout) as r:
                 if cutoff_date:
                     f = ExpiredPodFilter(cutoff_date)
-                    pod_list = json.load(r.raw, object_hook=f.json_hook)
-                    pod_list['expired_count'] = f.expired_count
-                    if pod_list.get("items") is not None:
-                        # Filter out None items from the list
-                        pod_list['items'] = [p for p in pod_list['items'] if p is not None]
+                    pod_list = parse_pod_list(r.raw, pod_filter=f.json_hook)
+                    pod_list.expired_count = f.expired_count
                 else:
-                    pod_list = json.load(r.raw)
+                    pod_list = parse_pod_list(r.raw)
 
-            if pod_list.get("items") is None:
-                # Sanitize input: if no pod are running, 'items' is a NoneObject
-                pod_list['items'] = []
             return pod_list
         except Exception as e:
             self.log.warning('failed to retrieve pod list from the kubelet at %s : %s', self.pod_list_url, e)
@@ -348,7 +498,7 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
         """
         Retrieve node spec from kubelet.
         """
-        node_spec = self.perform_kubelet_query(self.node_spec_url).json()
+        node_spec = self.perform_kubelet_query(self.node_spec_url, timeout=self.node_spec_timeout).json()
         # TODO: report allocatable for cpu, mem, and pod capacity
         # if we can get it locally or thru the DCA instead of the /nodes endpoint directly
         return node_spec
@@ -358,15 +508,16 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
         Retrieve stats from kubelet.
         """
         try:
-            stats_response = self.perform_kubelet_query(self.stats_url)
+            stats_response = self.perform_kubelet_query(self.stats_url, timeout=self.stats_timeout)
             stats_response.raise_for_status()
             return stats_response.json()
         except Exception as e:
             self.log.warning('GET on kubelet s `/stats/summary` failed: %s', e)
             return {}
 
-    def _report_node_metrics(self, instance_tags):
-        node_spec = self._retrieve_node_spec()
+    def _report_node_metrics(self, instance_tags, node_spec=None):
+        if node_spec is None:
+            node_spec = self._retrieve_node_spec()
         num_cores = node_spec.get('num_cores', 0)
         memory_capacity = node_spec.get('memory_capacity', 0)
 
@@ -423,19 +574,18 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
         """
         pods_tag_counter = defaultdict(int)
         containers_tag_counter = defaultdict(int)
-        for pod in pods['items']:
+        for pod in pods:
             # Containers reporting
-            containers = pod.get('status', {}).get('containerStatuses', [])
             has_container_running = False
-            for container in containers:
-                container_id = container.get('containerID')
+            for container in pod.containers or ():
+                container_id = container.id
                 if not container_id:
                     self.log.debug('skipping container with no id')
                     continue
-                if "running" not in container.get('state', {}):
+                if "running" not in container.state:
                     continue
                 has_container_running = True
-                tags = tagger.tag(replace_container_rt_prefix(container_id), tagger.LOW) or None
+                tags = self.tagger_cache.tag(replace_container_rt_prefix(container_id), tagger.LOW) or None
                 if not tags:
                     continue
                 tags += instance_tags
@@ -444,61 +594,60 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             # Pod reporting
             if not has_container_running:
                 continue
-            pod_id = pod.get('metadata', {}).get('uid')
+            pod_id = pod.uid
             if not pod_id:
                 self.log.debug('skipping pod with no uid')
                 continue
-            tags = tagger.tag('kubernetes_pod_uid://%s' % pod_id, tagger.LOW) or None
+            tags = self.tagger_cache.tag('kubernetes_pod_uid://%s' % pod_id, tagger.LOW) or None
             if not tags:
                 continue
             tags += instance_tags
             hash_tags = tuple(sorted(tags))
             pods_tag_counter[hash_tags] += 1
-        for tags, count in iteritems(pods_tag_counter):
-            self.gauge(self.NAMESPACE + '.pods.running', count, list(tags))
-        for tags, count in iteritems(containers_tag_counter):
-            self.gauge(self.NAMESPACE + '.containers.running', count, list(tags))
+        self.submit_batch(
+            'gauge',
+            self.NAMESPACE + '.pods.running',
+            [(count, list(tags)) for tags, count in iteritems(pods_tag_counter)],
+        )
+        self.submit_batch(
+            'gauge',
+            self.NAMESPACE + '.containers.running',
+            [(count, list(tags)) for tags, count in iteritems(containers_tag_counter)],
+        )
 
     def _report_container_spec_metrics(self, pod_list, instance_tags):
         """Reports pod requests & limits by looking at pod specs."""
-        for pod in pod_list['items']:
-            pod_name = pod.get('metadata', {}).get('name')
-            pod_phase = pod.get('status', {}).get('phase')
-            if self._should_ignore_pod(pod_name, pod_phase):
+        for pod in pod_list:
+            if self._should_ignore_pod(pod.name, pod.phase):
                 continue
 
-            for ctr in pod['spec']['containers']:
-                if not ctr.get('resources'):
+            for ctr in pod.containers or ():
+                if not (ctr.requests or ctr.limits):
                     continue
 
-                c_name = ctr.get('name', '')
-                cid = None
-                for ctr_status in pod['status'].get('containerStatuses', []):
-                    if ctr_status.get('name') == c_name:
-                        # it is already prefixed with 'runtime://'
-                        cid = ctr_status.get('containerID')
-                        break
+                c_name = ctr.name
+                # it is already prefixed with 'runtime://'
+                cid = ctr.id
                 if not cid:
                     continue
 
-                pod_uid = pod.get('metadata', {}).get('uid')
-                if self.pod_list_utils.is_excluded(cid, pod_uid):
+                if self.pod_list_utils.is_excluded(cid, pod.uid):
                     continue
 
-                tags = tagger.tag(replace_container_rt_prefix(cid), tagger.HIGH)
+                tags = self.tagger_cache.tag(replace_container_rt_prefix(cid), tagger.HIGH)
                 if not tags:
                     continue
                 tags += instance_tags
 
                 try:
-                    for resource, value_str in iteritems(ctr.get('resources', {}).get('requests', {})):
+                    for resource, value_str in iteritems(ctr.requests or {}):
                         value = self.parse_quantity(value_str)
                         self.gauge('{}.{}.requests'.format(self.NAMESPACE, resource), value, tags)
                 except (KeyError, AttributeError) as e:
                     self.log.debug("Unable to retrieve container requests for %s: %s", c_name, e)
 
                 try:
-                    for resource, value_str in iteritems(ctr.get('resources', {}).get('limits', {})):
+                    for resource, value_str in iteritems(ctr.limits or {}):
                         value = self.parse_quantity(value_str)
                         self.gauge('{}.{}.limits'.format(self.NAMESPACE, resource), value, tags)
                 except (KeyError, AttributeError) as e:
@@ -506,19 +655,19 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
 
     def _report_container_state_metrics(self, pod_list, instance_tags):
         """Reports container state & reasons by looking at container statuses"""
-        if pod_list.get('expired_count'):
-            self.gauge(self.NAMESPACE + '.pods.expired', pod_list.get('expired_count'), tags=instance_tags)
+        if pod_list.expired_count:
+            self.gauge(self.NAMESPACE + '.pods.expired', pod_list.expired_count, tags=instance_tags)
 
-        for pod in pod_list['items']:
-            pod_name = pod.get('metadata', {}).get('name')
-            pod_uid = pod.get('metadata', {}).get('uid')
+        for pod in pod_list:
+            pod_name = pod.name
+            pod_uid = pod.uid
 
             if not pod_name or not pod_uid:
                 continue
 
-            for ctr_status in pod['status'].get('containerStatuses', []):
-                c_name = ctr_status.get('name')
-                cid = ctr_status.get('containerID')
+            for ctr_status in pod.containers or ():
+                c_name = ctr_status.name
+                cid = ctr_status.id
 
                 if not c_name or not cid:
                     continue
@@ -526,16 +675,14 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
                 if self.pod_list_utils.is_excluded(cid, pod_uid):
                     continue
 
-                tags = tagger.tag(replace_container_rt_prefix(cid), tagger.ORCHESTRATOR)
+                tags = self.tagger_cache.tag(replace_container_rt_prefix(cid), tagger.ORCHESTRATOR)
                 if not tags:
                     continue
                 tags += instance_tags
 
-                restart_count = ctr_status.get('restartCount', 0)
-                self.gauge(self.NAMESPACE + '.containers.restarts', restart_count, tags)
+                self.gauge(self.NAMESPACE + '.containers.restarts', ctr_status.restart_count, tags)
 
-                for (metric_name, field_name) in [('state', 'state'), ('last_state', 'lastState')]:
-                    c_state = ctr_status.get(field_name, {})
+                for (metric_name, c_state) in [('state', ctr_status.state), ('last_state', ctr_status.last_state)]:
 
                     for state_name in ['terminated', 'waiting']:
                         state_reasons = WHITELISTED_CONTAINER_STATE_REASONS.get(state_name, [])
@@ -544,9 +691,8 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
     def _submit_container_state_metric(self, metric_name, state_name, c_state, state_reasons, tags):
         reason_tags = []
 
-        state_value = c_state.get(state_name)
-        if state_value:
-            reason = state_value.get('reason', '')
+        if state_name in c_state:
+            reason = c_state[state_name] or ''
 
             if reason.lower() in state_reasons:
                 reason_tags.append('reason:%s' % (reason))
@@ -564,8 +710,8 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             if pod_uid and pod_ephemeral_usage:
                 ephemeral_storage_usage[pod_uid] = pod_ephemeral_usage
 
-        for pod in pod_list['items']:
-            pod_uid = pod.get('metadata', {}).get('uid')
+        for pod in pod_list:
+            pod_uid = pod.uid
             if pod_uid is None:
                 continue
 
@@ -573,7 +719,7 @@ class KubeletCheck(CadvisorPrometheusScraperMixin, OpenMetricsBaseCheck, Cadviso
             if pod_usage is None:
                 continue
 
-            tags = tagger.tag('kubernetes_pod_uid://{}'.format(pod_uid), tagger.ORCHESTRATOR)
+            tags = self.tagger_cache.tag('kubernetes_pod_uid://{}'.format(pod_uid), tagger.ORCHESTRATOR)
             if not tags:
                 continue
             tags += instance_tags
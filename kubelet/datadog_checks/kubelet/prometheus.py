@@ -222,10 +222,10 @@ class CadvisorPrometheusScraperMixin(object):
         :param pod_uid: str
         :return: bool
         """
-        for pod in self.pod_list['items']:
-            if pod.get('metadata', {}).get('uid', '') == pod_uid:
-                return pod.get('spec', {}).get('hostNetwork', False)
-        return False
+        pod = get_pod_by_uid(pod_uid, self.pod_list)
+        if pod is None:
+            return False
+        return pod.host_network
 
     def _get_pod_by_metric_label(self, labels):
         """
@@ -302,7 +302,7 @@ class CadvisorPrometheusScraperMixin(object):
             if self.pod_list_utils.is_excluded(c_id, pod_uid):
                 continue
 
-            tags = tagger.tag(replace_container_rt_prefix(c_id), tagger.HIGH)
+            tags = self.tagger_cache.tag(replace_container_rt_prefix(c_id), tagger.HIGH)
             if not tags:
                 continue
             tags += scraper_config['custom_tags']
@@ -311,7 +311,7 @@ class CadvisorPrometheusScraperMixin(object):
             # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
             pod = self._get_pod_by_metric_label(sample[self.SAMPLE_LABELS])
             if pod is not None and is_static_pending_pod(pod):
-                pod_tags = tagger.tag('kubernetes_pod_uid://%s' % pod["metadata"]["uid"], tagger.HIGH)
+                pod_tags = self.tagger_cache.tag('kubernetes_pod_uid://%s' % pod.uid, tagger.HIGH)
                 if not pod_tags:
                     continue
                 tags += pod_tags
@@ -346,7 +346,7 @@ class CadvisorPrometheusScraperMixin(object):
         for pod_uid, sample in iteritems(samples):
             if '.network.' in metric_name and self._is_pod_host_networked(pod_uid):
                 continue
-            tags = tagger.tag('kubernetes_pod_uid://%s' % pod_uid, tagger.HIGH)
+            tags = self.tagger_cache.tag('kubernetes_pod_uid://%s' % pod_uid, tagger.HIGH)
             if not tags:
                 continue
             tags += scraper_config['custom_tags']
@@ -378,7 +378,7 @@ class CadvisorPrometheusScraperMixin(object):
             if self.pod_list_utils.is_excluded(c_id, pod_uid):
                 continue
 
-            tags = tagger.tag(replace_container_rt_prefix(c_id), tagger.HIGH)
+            tags = self.tagger_cache.tag(replace_container_rt_prefix(c_id), tagger.HIGH)
             if not tags:
                 continue
             tags += scraper_config['custom_tags']
@@ -387,7 +387,7 @@ class CadvisorPrometheusScraperMixin(object):
             # for static pods, see https://github.com/kubernetes/kubernetes/pull/59948
             pod = self._get_pod_by_metric_label(sample[self.SAMPLE_LABELS])
             if pod is not None and is_static_pending_pod(pod):
-                pod_tags = tagger.tag('kubernetes_pod_uid://%s' % pod["metadata"]["uid"], tagger.HIGH)
+                pod_tags = self.tagger_cache.tag('kubernetes_pod_uid://%s' % pod.uid, tagger.HIGH)
                 if not pod_tags:
                     continue
                 tags += pod_tags
@@ -422,7 +422,7 @@ class CadvisorPrometheusScraperMixin(object):
             if self.pod_list_utils.is_excluded(c_id, pod_uid):
                 continue
 
-            tags = tagger.tag(replace_container_rt_prefix(c_id), tagger.HIGH)
+            tags = self.tagger_cache.tag(replace_container_rt_prefix(c_id), tagger.HIGH)
             if not tags:
                 continue
             tags += scraper_config['custom_tags']
@@ -9,7 +9,7 @@ import pytest
 import requests_mock
 from requests.exceptions import HTTPError
 
-from datadog_checks.kubelet import KubeletCheck
+from datadog_checks.kubelet import KubeletCheck, PodList
 
 from .test_kubelet import EXPECTED_METRICS_COMMON, NODE_SPEC, mock_from_file
 
@@ -59,7 +59,9 @@ def test_kubelet_check_cadvisor(monkeypatch, aggregator, tagger):
     cadvisor_url = "http://valid:port/url"
     check = KubeletCheck('kubelet', None, {}, [instance_with_tag])
     monkeypatch.setattr(
-        check, 'retrieve_pod_list', mock.Mock(return_value=json.loads(mock_from_file('pods_list_1.2.json')))
+        check,
+        'retrieve_pod_list',
+        mock.Mock(return_value=PodList.from_dict(json.loads(mock_from_file('pods_list_1.2.json')))),
     )
     monkeypatch.setattr(check, '_retrieve_node_spec', mock.Mock(return_value=NODE_SPEC))
     monkeypatch.setattr(
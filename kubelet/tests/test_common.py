@@ -7,9 +7,11 @@ import sys
 
 import mock
 import pytest
+from six import StringIO
 
 from datadog_checks.checks.openmetrics import OpenMetricsBaseCheck
-from datadog_checks.kubelet import KubeletCredentials, PodListUtils, get_pod_by_uid, is_static_pending_pod
+from datadog_checks.kubelet import KubeletCredentials, PodList, PodListUtils, get_pod_by_uid, is_static_pending_pod
+from datadog_checks.kubelet.common import parse_pod_list
 
 from .test_kubelet import mock_from_file
 
@@ -28,7 +30,7 @@ def test_container_filter(monkeypatch):
     ctr_name = "datadog-agent"
     ctr_image = "datadog/agent-dev:haissam-tagger-pod-entity"
 
-    pods = json.loads(mock_from_file('pods.json'))
+    pods = PodList.from_dict(json.loads(mock_from_file('pods.json')))
     pod_list_utils = PodListUtils(pods)
 
     assert pod_list_utils is not None
@@ -72,7 +74,7 @@ def test_filter_staticpods(monkeypatch):
     is_excluded = mock.Mock(return_value=True)
     monkeypatch.setattr('datadog_checks.kubelet.common.is_excluded', is_excluded)
 
-    pods = json.loads(mock_from_file('pods.json'))
+    pods = PodList.from_dict(json.loads(mock_from_file('pods.json')))
     pod_list_utils = PodListUtils(pods)
 
     # kube-proxy-gke-haissam-default-pool-be5066f1-wnvn is static
@@ -90,18 +92,18 @@ def test_filter_staticpods(monkeypatch):
 
 
 def test_pod_by_uid():
-    podlist = json.loads(mock_from_file('pods.json'))
+    podlist = PodList.from_dict(json.loads(mock_from_file('pods.json')))
 
     pod = get_pod_by_uid("260c2b1d43b094af6d6b4ccba082c2db", podlist)
     assert pod is not None
-    assert pod["metadata"]["name"] == "kube-proxy-gke-haissam-default-pool-be5066f1-wnvn"
+    assert pod.name == "kube-proxy-gke-haissam-default-pool-be5066f1-wnvn"
 
     pod = get_pod_by_uid("unknown", podlist)
     assert pod is None
 
 
 def test_is_static_pod():
-    podlist = json.loads(mock_from_file('pods.json'))
+    podlist = PodList.from_dict(json.loads(mock_from_file('pods.json')))
 
     # kube-proxy-gke-haissam-default-pool-be5066f1-wnvn is static
     pod = get_pod_by_uid("260c2b1d43b094af6d6b4ccba082c2db", podlist)
@@ -114,6 +116,79 @@ def test_is_static_pod():
     assert is_static_pending_pod(pod) is False
 
 
+def test_parse_pod_list():
+    with open(os.path.join(HERE, 'fixtures', 'pods_crashed.json')) as f:
+        podlist = parse_pod_list(f)
+
+    assert len(podlist) == 6
+    assert podlist.expired_count == 0
+
+    pod = podlist.get_pod("2edfd4d9-10ce-11e8-bd5a-42010af00137")
+    assert (pod.namespace, pod.name, pod.phase, pod.host_network) == (
+        "kube-system",
+        "fluentd-gcp-v2.0.10-9q9t4",
+        "Running",
+        False,
+    )
+    fluentd, exporter = pod.containers
+    assert fluentd.name == "fluentd-gcp"
+    assert fluentd.id == "docker://5741ed2471c0e458b6b95db40ba05d1a5ee168256638a0264f08703e48d76561"
+    assert fluentd.restart_count == 1
+    assert fluentd.state == {"running": None}
+    assert fluentd.last_state == {"terminated": "OOMKilled"}
+    assert fluentd.requests == {"cpu": "100m", "memory": "200Mi"}
+    assert fluentd.limits == {"memory": "300Mi"}
+    assert exporter.state == {"waiting": "CrashLoopBackOff"}
+    assert exporter.requests is None and exporter.limits is None
+
+    # Only the fields used by the check are kept
+    assert not hasattr(pod, '__dict__')
+    assert not hasattr(fluentd, '__dict__')
+
+    # Static pods have no container statuses
+    pod = podlist.get_pod("260c2b1d43b094af6d6b4ccba082c2db")
+    assert pod.containers is None
+    assert pod.config_source == "file"
+
+
+def test_parse_pod_list_filter():
+    with open(os.path.join(HERE, 'fixtures', 'pods_crashed.json')) as f:
+        podlist = parse_pod_list(f, pod_filter=lambda pod: None if pod['status']['phase'] == 'Pending' else pod)
+
+    assert len(podlist) == 5
+    assert podlist.get_pod("260c2b1d43b094af6d6b4ccba082c2db") is None
+
+
+def test_parse_pod_list_empty():
+    podlist = parse_pod_list(StringIO('{"kind": "PodList", "apiVersion": "v1", "metadata": {}, "items": null}'))
+
+    assert len(podlist) == 0
+    assert list(podlist) == []
+    assert get_pod_by_uid("260c2b1d43b094af6d6b4ccba082c2db", podlist) is None
+
+
+def test_pod_list_indexes():
+    podlist = PodList.from_dict(json.loads(mock_from_file('pods.json')))
+
+    uid = podlist.get_uid_by_name_tuple(("kube-system", "fluentd-gcp-v2.0.10-9q9t4"))
+    assert uid == "2edfd4d9-10ce-11e8-bd5a-42010af00137"
+    assert podlist.get_pod(uid).name == "fluentd-gcp-v2.0.10-9q9t4"
+
+    cid = podlist.get_cid_by_name_tuple(("kube-system", "fluentd-gcp-v2.0.10-9q9t4", "fluentd-gcp"))
+    assert cid == "docker://5741ed2471c0e458b6b95db40ba05d1a5ee168256638a0264f08703e48d76561"
+    assert podlist.containers[cid].name == "fluentd-gcp"
+
+    assert podlist.get_uid_by_name_tuple(("default", "unknown")) is None
+    assert podlist.get_cid_by_name_tuple(("kube-system", "fluentd-gcp-v2.0.10-9q9t4", "unknown")) is None
+
+    # The utils share the indexes of the podlist
+    pod_list_utils = PodListUtils(podlist)
+    assert pod_list_utils.containers is podlist.containers
+    assert pod_list_utils.get_uid_by_name_tuple(("kube-system", "fluentd-gcp-v2.0.10-9q9t4")) == uid
+    assert pod_list_utils.get_cid_by_name_tuple(("kube-system", "fluentd-gcp-v2.0.10-9q9t4", "fluentd-gcp")) == cid
+    assert PodListUtils(None).get_uid_by_name_tuple(("kube-system", "fluentd-gcp-v2.0.10-9q9t4")) is None
+
+
 def test_credentials_empty():
     creds = KubeletCredentials({})
     assert creds.verify() is None
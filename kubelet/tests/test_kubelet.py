@@ -4,6 +4,8 @@
 import json
 import os
 import sys
+import threading
+import time
 from datetime import datetime
 
 import mock
@@ -11,7 +13,7 @@ import pytest
 from six import iteritems
 
 from datadog_checks.base.utils.date import UTC, parse_rfc3339
-from datadog_checks.kubelet import KubeletCheck, KubeletCredentials
+from datadog_checks.kubelet import KubeletCheck, KubeletCredentials, PodList
 
 # Skip the whole tests module on Windows
 pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='tests for linux only')
@@ -199,7 +201,9 @@ def mock_kubelet_check(monkeypatch, instances, kube_version=KUBE_1_14, stats_sum
     and node spec.
     """
     check = KubeletCheck('kubelet', None, {}, instances)
-    monkeypatch.setattr(check, 'retrieve_pod_list', mock.Mock(return_value=json.loads(mock_from_file('pods.json'))))
+    monkeypatch.setattr(
+        check, 'retrieve_pod_list', mock.Mock(return_value=PodList.from_dict(json.loads(mock_from_file('pods.json'))))
+    )
     monkeypatch.setattr(check, '_retrieve_node_spec', mock.Mock(return_value=NODE_SPEC))
     if stats_summary_fail:
         monkeypatch.setattr(check, '_retrieve_stats', mock.Mock(return_value={}))
@@ -472,67 +476,57 @@ def test_kubelet_check_instance_config(monkeypatch):
     check.check({"cadvisor_port": 0, "metrics_endpoint": "", "kubelet_metrics_endpoint": "http://dummy"})
 
 
-def test_report_pods_running(monkeypatch, tagger):
+def test_report_pods_running(monkeypatch, aggregator, tagger):
     check = KubeletCheck('kubelet', None, {}, [{}])
-    monkeypatch.setattr(check, 'retrieve_pod_list', mock.Mock(return_value=json.loads(mock_from_file('pods.json'))))
-    monkeypatch.setattr(check, 'gauge', mock.Mock())
+    monkeypatch.setattr(
+        check, 'retrieve_pod_list', mock.Mock(return_value=PodList.from_dict(json.loads(mock_from_file('pods.json'))))
+    )
     pod_list = check.retrieve_pod_list()
 
     check._report_pods_running(pod_list, [])
 
-    calls = [
-        mock.call('kubernetes.pods.running', 1, ["pod_name:fluentd-gcp-v2.0.10-9q9t4"]),
-        mock.call('kubernetes.pods.running', 1, ["pod_name:fluentd-gcp-v2.0.10-p13r3"]),
-        mock.call('kubernetes.pods.running', 1, ['pod_name:demo-app-success-c485bc67b-klj45']),
-        mock.call(
-            'kubernetes.containers.running',
-            2,
-            ["kube_container_name:fluentd-gcp", "kube_deployment:fluentd-gcp-v2.0.10"],
-        ),
-        mock.call(
-            'kubernetes.containers.running',
-            2,
-            ["kube_container_name:prometheus-to-sd-exporter", "kube_deployment:fluentd-gcp-v2.0.10"],
-        ),
-        mock.call('kubernetes.containers.running', 1, ['pod_name:demo-app-success-c485bc67b-klj45']),
-    ]
-    check.gauge.assert_has_calls(calls, any_order=True)
+    aggregator.assert_metric('kubernetes.pods.running', 1, ["pod_name:fluentd-gcp-v2.0.10-9q9t4"])
+    aggregator.assert_metric('kubernetes.pods.running', 1, ["pod_name:fluentd-gcp-v2.0.10-p13r3"])
+    aggregator.assert_metric('kubernetes.pods.running', 1, ['pod_name:demo-app-success-c485bc67b-klj45'])
+    aggregator.assert_metric(
+        'kubernetes.containers.running', 2, ["kube_container_name:fluentd-gcp", "kube_deployment:fluentd-gcp-v2.0.10"]
+    )
+    aggregator.assert_metric(
+        'kubernetes.containers.running',
+        2,
+        ["kube_container_name:prometheus-to-sd-exporter", "kube_deployment:fluentd-gcp-v2.0.10"],
+    )
+    aggregator.assert_metric('kubernetes.containers.running', 1, ['pod_name:demo-app-success-c485bc67b-klj45'])
     # Make sure non running container/pods are not sent
-    bad_calls = [
-        mock.call('kubernetes.pods.running', 1, ['pod_name:dd-agent-q6hpw']),
-        mock.call('kubernetes.containers.running', 1, ['pod_name:dd-agent-q6hpw']),
-    ]
-    for c in bad_calls:
-        assert c not in check.gauge.mock_calls
+    aggregator.assert_metric('kubernetes.pods.running', tags=['pod_name:dd-agent-q6hpw'], count=0)
+    aggregator.assert_metric('kubernetes.containers.running', tags=['pod_name:dd-agent-q6hpw'], count=0)
 
 
-def test_report_pods_running_none_ids(monkeypatch, tagger):
+def test_report_pods_running_none_ids(monkeypatch, aggregator, tagger):
     # Make sure the method is resilient to inconsistent podlists
     podlist = json.loads(mock_from_file('pods.json'))
     podlist["items"][0]['metadata']['uid'] = None
     podlist["items"][1]['status']['containerStatuses'][0]['containerID'] = None
 
     check = KubeletCheck('kubelet', None, {}, [{}])
-    monkeypatch.setattr(check, 'retrieve_pod_list', mock.Mock(return_value=podlist))
-    monkeypatch.setattr(check, 'gauge', mock.Mock())
+    monkeypatch.setattr(check, 'retrieve_pod_list', mock.Mock(return_value=PodList.from_dict(podlist)))
     pod_list = check.retrieve_pod_list()
 
     check._report_pods_running(pod_list, [])
 
-    calls = [
-        mock.call('kubernetes.pods.running', 1, ["pod_name:fluentd-gcp-v2.0.10-9q9t4"]),
-        mock.call(
-            'kubernetes.containers.running',
-            2,
-            ["kube_container_name:prometheus-to-sd-exporter", "kube_deployment:fluentd-gcp-v2.0.10"],
-        ),
-    ]
-    check.gauge.assert_has_calls(calls, any_order=True)
+    aggregator.assert_metric('kubernetes.pods.running', 1, ["pod_name:fluentd-gcp-v2.0.10-9q9t4"])
+    aggregator.assert_metric(
+        'kubernetes.containers.running',
+        2,
+        ["kube_container_name:prometheus-to-sd-exporter", "kube_deployment:fluentd-gcp-v2.0.10"],
+    )
 
 
 def test_report_container_spec_metrics(monkeypatch, tagger):
     check = KubeletCheck('kubelet', None, {}, [{}])
-    monkeypatch.setattr(check, 'retrieve_pod_list', mock.Mock(return_value=json.loads(mock_from_file('pods.json'))))
+    monkeypatch.setattr(
+        check, 'retrieve_pod_list', mock.Mock(return_value=PodList.from_dict(json.loads(mock_from_file('pods.json'))))
+    )
     monkeypatch.setattr(check, 'gauge', mock.Mock())
 
     attrs = {'is_excluded.return_value': False}
@@ -660,10 +654,10 @@ def test_pod_expiration(monkeypatch, aggregator, tagger):
     check.pod_list_utils = mock.Mock(**attrs)
 
     pod_list = check.retrieve_pod_list()
-    assert pod_list['expired_count'] == 1
+    assert pod_list.expired_count == 1
 
     expected_names = ['dd-agent-ntepl', 'hello5-1550509440-rlgvf', 'hello8-1550505780-kdnjx']
-    collected_names = [p['metadata']['name'] for p in pod_list['items']]
+    collected_names = [p.name for p in pod_list]
     assert collected_names == expected_names
 
     # Test .pods.expired gauge is submitted
@@ -690,22 +684,17 @@ def test_perform_kubelet_check(monkeypatch):
 
     instance_tags = ["one:1"]
     get = MockResponse()
-    with mock.patch("requests.get", side_effect=get):
+    with mock.patch("requests.Session.get", side_effect=get):
         check._perform_kubelet_check(instance_tags)
 
-    get.assert_has_calls(
-        [
-            mock.call(
-                'http://127.0.0.1:10255/healthz',
-                cert=None,
-                headers=None,
-                params={'verbose': True},
-                stream=False,
-                timeout=10,
-                verify=None,
-            )
-        ]
-    )
+    args, kwargs = get.call_args
+    assert args == ('http://127.0.0.1:10255/healthz',)
+    assert kwargs['cert'] is None
+    assert kwargs['headers'] is None
+    assert kwargs['params'] == {'verbose': True}
+    assert kwargs['stream'] is False
+    assert kwargs['timeout'] == 10
+    assert kwargs['verify'] is None
     calls = [mock.call('kubernetes.kubelet.check', 0, tags=instance_tags)]
     check.service_check.assert_has_calls(calls)
 
@@ -722,6 +711,139 @@ def test_report_node_metrics(monkeypatch):
     check.gauge.assert_has_calls(calls, any_order=False)
 
 
+def test_concurrent_fetch(monkeypatch, aggregator, tagger):
+    instance = {'telemetry': True}
+    check = mock_kubelet_check(monkeypatch, [instance])
+
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def slow(value):
+        def fetch(*args, **kwargs):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return value
+
+        return fetch
+
+    for method in ('retrieve_pod_list', '_retrieve_node_spec', '_retrieve_stats'):
+        mocked = getattr(check, method)
+        monkeypatch.setattr(check, method, mock.Mock(side_effect=slow(mocked.return_value)))
+
+    check.check(instance)
+    check.cancel()
+
+    # Fetched at the same time, processed as usual
+    assert active[1] > 1
+    aggregator.assert_metric('kubernetes.cpu.capacity')
+    aggregator.assert_metric('kubernetes.pods.running')
+    aggregator.assert_metric('kubernetes.cpu.usage.total')
+    aggregator.assert_metric('kubernetes.rest.client.requests')
+    for endpoint in ('pod_list', 'node_spec', 'stats', 'cadvisor', 'kubelet'):
+        aggregator.assert_metric(
+            'kubernetes.telemetry.kubelet.fetch.duration', tags=['endpoint:{}'.format(endpoint)], count=1
+        )
+    for name in ('new', 'reused'):
+        aggregator.assert_metric_has_tag(
+            'kubernetes.telemetry.connections.{}.count'.format(name), 'endpoint:kubelet_api', count=1
+        )
+
+
+def test_http_handlers():
+    check = KubeletCheck('kubelet', None, {}, [{'connection_max_age': 60}])
+    http_handler = check._get_http_handler()
+
+    assert http_handler.connection_max_age == 60
+    # The scrapers persist their connections, with their own handler
+    assert check.kubelet_scraper_config['persist_connections']
+    assert check.cadvisor_scraper_config['persist_connections']
+    kubelet_handler = check.get_http_handler(check.kubelet_scraper_config)
+    cadvisor_handler = check.get_http_handler(check.cadvisor_scraper_config)
+    assert len({id(http_handler), id(kubelet_handler), id(cadvisor_handler)}) == 3
+
+    check.cancel()
+
+
+def test_prefetched_responses(monkeypatch, aggregator, tagger):
+    check = mock_kubelet_check(monkeypatch, [{}])
+    # Scrape through the actual `poll`
+    poll = check.poll
+    del check.poll
+
+    def send_request(endpoint, scraper_config, headers=None):
+        response = poll(scraper_config)
+        response.raise_for_status.return_value = None
+        return response
+
+    monkeypatch.setattr(check, 'send_request', mock.Mock(side_effect=send_request))
+    check.check({})
+    check.cancel()
+
+    # The responses fetched ahead are processed, not fetched again
+    assert check.send_request.call_count == 2
+    assert '_prefetched_response' not in check.cadvisor_scraper_config
+    assert '_prefetched_response' not in check.kubelet_scraper_config
+    aggregator.assert_metric('kubernetes.cpu.usage.total')
+    aggregator.assert_metric('kubernetes.rest.client.requests')
+
+
+def test_tagger_cache(monkeypatch, aggregator, tagger):
+    instance = {'telemetry': True}
+    check = mock_kubelet_check(monkeypatch, [instance])
+    check.check(instance)
+
+    # Every entity is looked up once per cardinality
+    assert len(tagger._calls) == len(set(tagger._calls))
+    hits, misses = check.tagger_cache.flush_stats()
+    assert (hits, misses) == (0, 0)
+    aggregator.assert_metric('kubernetes.telemetry.kubelet.tagger_cache.misses.count', value=len(tagger._calls))
+    hits = sum(m.value for m in aggregator.metrics('kubernetes.telemetry.kubelet.tagger_cache.hits.count'))
+    assert hits > 0
+
+    # Looked up again at the next run
+    aggregator.reset()
+    calls = len(tagger._calls)
+    check.check(instance)
+    check.cancel()
+    assert len(tagger._calls) == 2 * calls
+    aggregator.assert_metric('kubernetes.telemetry.kubelet.tagger_cache.misses.count', value=calls)
+
+
+def test_tagger_cache_ttl(monkeypatch, aggregator, tagger):
+    instance = {'tagger_cache_ttl': 60}
+    check = mock_kubelet_check(monkeypatch, [instance])
+    check.check(instance)
+    calls = len(tagger._calls)
+
+    # Only the entities without tags are looked up again
+    check.check(instance)
+    check.cancel()
+    unknown = set(call for call in tagger._calls[:calls] if call[0] not in COMMON_TAGS)
+    assert unknown
+    assert set(tagger._calls[calls:]) == unknown
+    aggregator.assert_metric('kubernetes.pods.running')
+
+
+def test_endpoint_timeouts(monkeypatch):
+    check = KubeletCheck('kubelet', None, {}, [{'pod_list_timeout': 30, 'stats_timeout': 5}])
+    check.node_spec_url = 'http://127.0.0.1:10255/spec'
+    check.stats_url = 'http://127.0.0.1:10255/stats/summary/'
+    check.kubelet_credentials = KubeletCredentials({})
+    monkeypatch.setattr(check, 'perform_kubelet_query', mock.Mock())
+
+    check._retrieve_node_spec()
+    check._retrieve_stats()
+
+    check.perform_kubelet_query.assert_has_calls(
+        [mock.call(check.node_spec_url, timeout=10), mock.call(check.stats_url, timeout=5)], any_order=True
+    )
+    assert check.pod_list_timeout == 30
+
+
 def test_retrieve_pod_list_success(monkeypatch):
     check = KubeletCheck('kubelet', None, {}, [{}])
     check.pod_list_url = "dummyurl"
@@ -730,7 +852,11 @@ def test_retrieve_pod_list_success(monkeypatch):
 
     retrieved = check.retrieve_pod_list()
     expected = json.loads(mock_from_file("pod_list_raw.json"))
-    assert json.dumps(retrieved, sort_keys=True) == json.dumps(expected, sort_keys=True)
+    assert [(p.uid, p.namespace, p.name, p.phase) for p in retrieved] == [
+        (p['metadata']['uid'], p['metadata']['namespace'], p['metadata']['name'], p['status']['phase'])
+        for p in expected['items']
+    ]
+    assert retrieved.expired_count == 0
 
 
 def test_retrieved_pod_list_failure(monkeypatch):
@@ -782,7 +908,9 @@ def test_add_labels_to_tags(monkeypatch, aggregator):
 def test_report_container_requests_limits(monkeypatch, tagger):
     check = KubeletCheck('kubelet', None, {}, [{}])
     monkeypatch.setattr(
-        check, 'retrieve_pod_list', mock.Mock(return_value=json.loads(mock_from_file('pods_requests_limits.json')))
+        check,
+        'retrieve_pod_list',
+        mock.Mock(return_value=PodList.from_dict(json.loads(mock_from_file('pods_requests_limits.json')))),
     )
     monkeypatch.setattr(check, 'gauge', mock.Mock())
 
@@ -9,7 +9,7 @@ import mock
 import pytest
 
 from datadog_checks.kubelet import KubeletCheck
-from datadog_checks.kubelet.common import PodListUtils
+from datadog_checks.kubelet.common import PodList, PodListUtils
 from datadog_checks.kubelet.prometheus import CadvisorPrometheusScraperMixin
 
 # Skip the whole tests module on Windows
@@ -40,7 +40,7 @@ def check():
 def cadvisor_scraper(check):
     with mock.patch(
         'datadog_checks.kubelet.kubelet.KubeletCheck.retrieve_pod_list',
-        return_value=json.loads(mock_from_file('podlist_containerd.json')),
+        return_value=PodList.from_dict(json.loads(mock_from_file('podlist_containerd.json'))),
     ):
         check.pod_list = check.retrieve_pod_list()
         check.pod_list_utils = PodListUtils(check.pod_list)
@@ -224,14 +224,14 @@ def test_get_pod_uid(cadvisor_scraper):
 
 
 def test_is_pod_host_networked(cadvisor_scraper):
-    assert len(cadvisor_scraper.pod_list) == 4
+    assert len(cadvisor_scraper.pod_list) == 8
     assert cadvisor_scraper._is_pod_host_networked("not-here") is False
     assert cadvisor_scraper._is_pod_host_networked('8abf1ed0-94c4-11e8-96a3-42010a840157') is True
     assert cadvisor_scraper._is_pod_host_networked('b66c40af-997d-11e8-96a3-42010a840157') is False
 
 
 def test_get_pod_by_metric_label(cadvisor_scraper):
-    assert len(cadvisor_scraper.pod_list) == 4
+    assert len(cadvisor_scraper.pod_list) == 8
     kube_proxy_1_16 = cadvisor_scraper._get_pod_by_metric_label(
         {"container": "POD", "namespace": "kube-system", "pod": "kube-proxy-2d2bq"}
     )
@@ -241,9 +241,9 @@ def test_get_pod_by_metric_label(cadvisor_scraper):
     fluentd = cadvisor_scraper._get_pod_by_metric_label(
         {"container_name": "POD", "namespace": "kube-system", "pod_name": "fluentd-gcp-v3.0.0-z55q5"}
     )
-    assert kube_proxy_1_16["metadata"]["uid"] == "8abf1ed0-94c4-11e8-96a3-42010a840157"
-    assert kube_proxy["metadata"]["uid"] == "8abf1ed0-94c4-11e8-96a3-42010a840157"
-    assert fluentd["metadata"]["uid"] == "fe3d57c4-94c4-11e8-96a3-42010a840157"
+    assert kube_proxy_1_16.uid == "8abf1ed0-94c4-11e8-96a3-42010a840157"
+    assert kube_proxy.uid == "8abf1ed0-94c4-11e8-96a3-42010a840157"
+    assert fluentd.uid == "fe3d57c4-94c4-11e8-96a3-42010a840157"
 
 
 def test_get_kube_container_name():
@@ -5,8 +5,11 @@ from __future__ import division
 
 import re
 import time
+from collections import namedtuple
+from contextlib import contextmanager
 from copy import deepcopy
 from distutils.version import LooseVersion
+from timeit import default_timer
 
 import pymongo
 from six import PY3, iteritems, itervalues
@@ -14,16 +17,48 @@ from six.moves.urllib.parse import unquote_plus, urlsplit
 
 from datadog_checks.base import AgentCheck, is_affirmative
 from datadog_checks.base.utils.common import round_value
+from datadog_checks.base.utils.thread_pool import BoundedThreadPool
 
 if PY3:
     long = int
 
 DEFAULT_TIMEOUT = 30
+DEFAULT_DBSTATS_WORKERS = 5
+DEFAULT_DBSTATS_INTERVAL = 0
 GAUGE = AgentCheck.gauge
 RATE = AgentCheck.rate
 ALLOWED_CUSTOM_METRICS_TYPES = ['gauge', 'rate', 'count', 'monotonic_count']
 ALLOWED_CUSTOM_QUERIES_COMMANDS = ['aggregate', 'count', 'find']
 
+# Metrics to collect compiled by `MongoDb._compile_metrics_plan`
+MetricsPlan = namedtuple('MetricsPlan', ['status', 'dbstats', 'top'])
+
+
+class CommandLatencyListener(pymongo.monitoring.CommandListener):
+    """
+    Submits the latency of every command sent by a client.
+    """
+
+    def __init__(self, check, tags):
+        self.check = check
+        self.tags = tags
+
+    def _submit(self, event):
+        self.check.histogram(
+            'mongodb.client.command.latency',
+            event.duration_micros / 1e6,
+            tags=self.tags + ['command:{}'.format(event.command_name)],
+        )
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._submit(event)
+
+    def failed(self, event):
+        self._submit(event)
+
 
 class MongoDb(AgentCheck):
     """
@@ -427,13 +462,33 @@ class MongoDb(AgentCheck):
         # Members' last replica set states
         self._last_state_by_server = {}
 
-        # List of metrics to collect per instance
+        # List of metrics to collect, and their compiled plan, per instance
         self.metrics_to_collect_by_instance = {}
 
         self.collection_metrics_names = []
         for key in self.COLLECTION_METRICS:
             self.collection_metrics_names.append(key.split('.')[1])
 
+        # Clients kept across runs, by (server, replica set name)
+        self._clients = {}
+        # Keys of the clients already authenticated
+        self._authenticated_clients = set()
+        # Last topology known by the clients, to detect its changes
+        self._topologies = {}
+
+        # Workers sending the dbstats and collstats commands
+        self._stats_pool = None
+        # Database names, dbstats and collstats by server, with their expiration time
+        self._stats_cache = {}
+
+    def cancel(self):
+        if self._stats_pool is not None:
+            self._stats_pool.cancel()
+            self._stats_pool = None
+
+        for key in list(self._clients):
+            self._close_client(key)
+
     @classmethod
     def get_library_versions(cls):
         return {'pymongo': pymongo.version}
@@ -531,11 +586,73 @@ class MongoDb(AgentCheck):
 
     def _get_metrics_to_collect(self, instance_key, additional_metrics):
         """
-        Return and cache the list of metrics to collect.
+        Return and cache the list of metrics to collect and its compiled plan, rebuilt when
+        `additional_metrics` changes.
+
+        :returns: (dict of metrics to collect, MetricsPlan)
+        """
+        cached = self.metrics_to_collect_by_instance.get(instance_key)
+        if cached is None or cached[0] != additional_metrics:
+            metrics_to_collect = self._build_metric_list_to_collect(additional_metrics)
+            cached = (list(additional_metrics), metrics_to_collect, self._compile_metrics_plan(metrics_to_collect))
+            self.metrics_to_collect_by_instance[instance_key] = cached
+
+        return cached[1], cached[2]
+
+    def _compile_metrics_plan(self, metrics_to_collect):
+        """
+        Resolve the submit method and name of the metrics to collect once, and arrange the serverStatus
+        ones in a tree of the keys leading to their value, so that shared prefixes are walked once:
+
+          {key: (children tree, [(original metric name, submit method, metric name), ...])}
+
+        :returns: MetricsPlan
         """
-        if instance_key not in self.metrics_to_collect_by_instance:
-            self.metrics_to_collect_by_instance[instance_key] = self._build_metric_list_to_collect(additional_metrics)
-        return self.metrics_to_collect_by_instance[instance_key]
+        status = {}
+        dbstats = []
+        for metric_name in metrics_to_collect:
+            submit_method, metric_name_alias = self._resolve_metric(metric_name, metrics_to_collect)
+            if metric_name.startswith('stats'):
+                if metric_name.startswith('stats.'):
+                    dbstats.append((metric_name.split('.')[1], metric_name, submit_method, metric_name_alias))
+                continue
+
+            node = status
+            keys = metric_name.split('.')
+            for key in keys[:-1]:
+                node = node.setdefault(key, ({}, []))[0]
+            node.setdefault(keys[-1], ({}, []))[1].append((metric_name, submit_method, metric_name_alias))
+
+        top = []
+        for metric_name in self.TOP_METRICS:
+            if metric_name in metrics_to_collect:
+                submit_method, metric_name_alias = self._resolve_metric(metric_name, metrics_to_collect, prefix="usage")
+                top.append((metric_name.split('.'), metric_name, submit_method, metric_name_alias))
+
+        return MetricsPlan(status, dbstats, top)
+
+    def _submit_status_metrics(self, tree, document, tags):
+        """
+        Submit the metrics of a `MetricsPlan.status` tree found in the serverStatus `document`.
+        """
+        for key, (children, metrics) in iteritems(tree):
+            try:
+                value = document[key]
+            except KeyError:
+                continue
+
+            for metric_name, submit_method, metric_name_alias in metrics:
+                if not isinstance(value, (int, long, float)):
+                    raise TypeError(
+                        u"{0} value is a {1}, it should be an int, a float or a long instead.".format(
+                            metric_name, type(value)
+                        )
+                    )
+
+                submit_method(self, metric_name_alias, value, tags=tags)
+
+            if children:
+                self._submit_status_metrics(children, value, tags)
 
     def _resolve_metric(self, original_metric_name, metrics_to_collect, prefix=""):
         """
@@ -610,6 +727,145 @@ class MongoDb(AgentCheck):
 
         return authenticated
 
+    def _get_client(self, key, tags, timeout, ssl_params, read_preference):
+        """
+        Return the client kept for `key`, a (server, replica set name) tuple, or create a new one.
+
+        Clients live as long as the check, along with their connection pool, the topology
+        they discovered and their authentication, unless they fail.
+        """
+        client = self._clients.get(key)
+        if client is not None:
+            self.count('mongodb.client.reused', 1, tags=tags)
+            return client
+
+        server, replicaset = key
+        options = dict(ssl_params)
+        if replicaset is not None:
+            options['replicaset'] = replicaset
+            # The replica set was renamed, the clients of the previous one are useless
+            for other_key in list(self._clients):
+                if other_key[0] == server and other_key[1] is not None:
+                    self._close_client(other_key)
+
+        client = pymongo.mongo_client.MongoClient(
+            server,
+            socketTimeoutMS=timeout,
+            connectTimeoutMS=timeout,
+            serverSelectionTimeoutMS=timeout,
+            read_preference=read_preference,
+            event_listeners=[CommandLatencyListener(self, list(tags))],
+            **options
+        )
+        self._clients[key] = client
+        self.count('mongodb.client.created', 1, tags=tags)
+        return client
+
+    def _close_client(self, key):
+        """
+        Close the client kept for `key`, the next run connects again.
+        """
+        client = self._clients.pop(key, None)
+        self._authenticated_clients.discard(key)
+        self._topologies.pop(key, None)
+        if client is not None:
+            client.close()
+
+    def _authenticate_client(self, key, database, username, password, use_x509, server_name, service_check_tags):
+        """
+        Authenticate a client once, its credentials are then used for all the connections of its pool.
+        """
+        if key in self._authenticated_clients:
+            return
+
+        try:
+            self._authenticate(database, username, password, use_x509, server_name, service_check_tags)
+        except Exception:
+            self._close_client(key)
+            raise
+
+        self._authenticated_clients.add(key)
+
+    def _check_topology(self, key, client, tags):
+        """
+        Compare the primary and the members known by a client to the ones of the previous run.
+        """
+        topology = (client.primary, frozenset(client.nodes))
+        previous = self._topologies.get(key)
+        self._topologies[key] = topology
+
+        if previous is not None and previous != topology:
+            self.log.info(u"Topology of `%s` changed: %s -> %s", key[0], previous, topology)
+            self.count('mongodb.client.topology_changes', 1, tags=tags)
+
+    @contextmanager
+    def _timed_phase(self, phase, tags):
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.gauge('mongodb.check.phase.duration', default_timer() - start, tags=tags + ['phase:%s' % phase])
+
+    @staticmethod
+    def _is_database_collected(dbname, include, exclude):
+        """
+        Whether or not to collect the stats of a database, according to the `databases_include`
+        and `databases_exclude` patterns.
+        """
+        if include and not any(re.search(pattern, dbname) for pattern in include):
+            return False
+
+        return not any(re.search(pattern, dbname) for pattern in exclude)
+
+    def _get_stats(self, instance, server, cli, db_name, tags):
+        """
+        Returns the database names, the dbstats of the collected databases and the collstats of the configured
+        collections, refreshed at most every `dbstats_interval` seconds.
+
+        The commands are sent concurrently by a bounded pool of workers.
+
+        :returns: (list of database names, dict of database names -> dbstats, list of (collection name, collstats))
+        """
+        now = time.time()
+        cached = self._stats_cache.get(server)
+        if cached is not None and cached[0] > now:
+            return cached[1:]
+
+        if self._stats_pool is None:
+            workers = int(instance.get('dbstats_workers', DEFAULT_DBSTATS_WORKERS))
+            self._stats_pool = BoundedThreadPool(max(workers, 1), name=self.name)
+
+        with self._timed_phase('dbstats', tags):
+            dbnames = cli.database_names()
+
+            include = instance.get('databases_include') or []
+            exclude = instance.get('databases_exclude') or []
+            # The configured database is always collected
+            collected = [db_name] + [
+                db_n for db_n in dbnames if db_n != db_name and self._is_database_collected(db_n, include, exclude)
+            ]
+
+            results = [(db_n, self._stats_pool.apply_async(cli[db_n].command, ('dbstats',))) for db_n in collected]
+            dbstats = {db_n: {'stats': result.get()} for db_n, result in results}
+
+        with self._timed_phase('collstats', tags):
+            db = cli[db_name]
+            results = [
+                (coll_name, self._stats_pool.apply_async(db.command, ('collstats', coll_name)))
+                for coll_name in instance.get('collections', [])
+            ]
+
+            collstats = []
+            for coll_name, result in results:
+                try:
+                    collstats.append((coll_name, result.get()))
+                except Exception as e:
+                    self.log.warning(u"Failed to record `collection` metrics for `%s`: %s", coll_name, e)
+
+        interval = float(instance.get('dbstats_interval', DEFAULT_DBSTATS_INTERVAL))
+        self._stats_cache[server] = (now + interval, dbnames, dbstats, collstats)
+        return dbnames, dbstats, collstats
+
     @classmethod
     def _parse_uri(cls, server, sanitize_username=False):
         """
@@ -805,7 +1061,7 @@ class MongoDb(AgentCheck):
 
         # Get the list of metrics to collect
         collect_tcmalloc_metrics = 'tcmalloc' in additional_metrics
-        metrics_to_collect = self._get_metrics_to_collect(server, additional_metrics)
+        metrics_to_collect, metrics_plan = self._get_metrics_to_collect(server, additional_metrics)
 
         # Tagging
         tags = instance.get('tags', [])
@@ -829,14 +1085,10 @@ class MongoDb(AgentCheck):
             service_check_tags = service_check_tags + ["host:%s" % host, "port:%s" % port]
 
         timeout = float(instance.get('timeout', DEFAULT_TIMEOUT)) * 1000
+        client_key = (server, None)
         try:
-            cli = pymongo.mongo_client.MongoClient(
-                server,
-                socketTimeoutMS=timeout,
-                connectTimeoutMS=timeout,
-                serverSelectionTimeoutMS=timeout,
-                read_preference=pymongo.ReadPreference.PRIMARY_PREFERRED,
-                **ssl_params
+            cli = self._get_client(
+                client_key, tags, timeout, ssl_params, read_preference=pymongo.ReadPreference.PRIMARY_PREFERRED
             )
             # some commands can only go against the admin DB
             admindb = cli['admin']
@@ -857,28 +1109,33 @@ class MongoDb(AgentCheck):
             if auth_source:
                 msg = "authSource was specified in the the server URL: using '%s' as the authentication database"
                 self.log.info(msg, auth_source)
-                self._authenticate(
-                    cli[auth_source], username, password, use_x509, clean_server_name, service_check_tags
+                self._authenticate_client(
+                    client_key, cli[auth_source], username, password, use_x509, clean_server_name, service_check_tags
                 )
             else:
-                self._authenticate(db, username, password, use_x509, clean_server_name, service_check_tags)
+                self._authenticate_client(
+                    client_key, db, username, password, use_x509, clean_server_name, service_check_tags
+                )
 
         try:
-            status = db.command('serverStatus', tcmalloc=collect_tcmalloc_metrics)
+            with self._timed_phase('server_status', tags):
+                status = db.command('serverStatus', tcmalloc=collect_tcmalloc_metrics)
         except Exception:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL, tags=service_check_tags)
+            # Start over with a new client at the next run
+            self._close_client(client_key)
             raise
         else:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.OK, tags=service_check_tags)
 
+        self._check_topology(client_key, cli, tags)
+
         if status['ok'] == 0:
             raise Exception(status['errmsg'].__str__())
 
         ops = db.current_op()
         status['fsyncLocked'] = 1 if ops.get('fsyncLock') else 0
 
-        status['stats'] = db.command('dbstats')
-        dbstats = {db_name: {'stats': status['stats']}}
         try:
             mongo_version = cli.server_info().get('version', '0.0')
             self.set_metadata('version', mongo_version)
@@ -900,25 +1157,21 @@ class MongoDb(AgentCheck):
 
                     # need a new connection to deal with replica sets
                     setname = replSet.get('set')
-                    cli_rs = pymongo.mongo_client.MongoClient(
-                        server,
-                        socketTimeoutMS=timeout,
-                        connectTimeoutMS=timeout,
-                        serverSelectionTimeoutMS=timeout,
-                        replicaset=setname,
-                        read_preference=pymongo.ReadPreference.NEAREST,
-                        **ssl_params
+                    rs_client_key = (server, setname)
+                    cli_rs = self._get_client(
+                        rs_client_key, tags, timeout, ssl_params, read_preference=pymongo.ReadPreference.NEAREST
                     )
 
                     if do_auth:
-                        if auth_source:
-                            self._authenticate(
-                                cli_rs[auth_source], username, password, use_x509, server, service_check_tags
-                            )
-                        else:
-                            self._authenticate(
-                                cli_rs[db_name], username, password, use_x509, server, service_check_tags
-                            )
+                        self._authenticate_client(
+                            rs_client_key,
+                            cli_rs[auth_source or db_name],
+                            username,
+                            password,
+                            use_x509,
+                            server,
+                            service_check_tags,
+                        )
 
                     # Replication set information
                     replset_name = replSet['set']
@@ -976,47 +1229,16 @@ class MongoDb(AgentCheck):
         except KeyError:
             pass
 
-        dbnames = cli.database_names()
+        dbnames, dbstats, collstats = self._get_stats(instance, server, cli, db_name, tags)
         self.gauge('mongodb.dbs', len(dbnames), tags=tags)
 
-        for db_n in dbnames:
-            db_aux = cli[db_n]
-            dbstats[db_n] = {'stats': db_aux.command('dbstats')}
-
         # Go through the metrics and save the values
-        for metric_name in metrics_to_collect:
-            # each metric is of the form: x.y.z with z optional
-            # and can be found at status[x][y][z]
-            value = status
-
-            if metric_name.startswith('stats'):
-                continue
-            else:
-                try:
-                    for c in metric_name.split("."):
-                        value = value[c]
-                except KeyError:
-                    continue
-
-            # value is now status[x][y][z]
-            if not isinstance(value, (int, long, float)):
-                raise TypeError(
-                    u"{0} value is a {1}, it should be an int, a float or a long instead.".format(
-                        metric_name, type(value)
-                    )
-                )
-
-            # Submit the metric
-            submit_method, metric_name_alias = self._resolve_metric(metric_name, metrics_to_collect)
-            submit_method(self, metric_name_alias, value, tags=tags)
+        self._submit_status_metrics(metrics_plan.status, status, tags)
 
         for st, value in iteritems(dbstats):
-            for metric_name in metrics_to_collect:
-                if not metric_name.startswith('stats.'):
-                    continue
-
+            for field, metric_name, submit_method, metric_name_alias in metrics_plan.dbstats:
                 try:
-                    val = value['stats'][metric_name.split('.')[1]]
+                    val = value['stats'][field]
                 except KeyError:
                     continue
 
@@ -1034,7 +1256,6 @@ class MongoDb(AgentCheck):
                     u"db:{0}".format(st),
                 ]
 
-                submit_method, metric_name_alias = self._resolve_metric(metric_name, metrics_to_collect)
                 submit_method(self, metric_name_alias, val, tags=metrics_tags)
 
         if is_affirmative(instance.get('collections_indexes_stats')):
@@ -1057,12 +1278,12 @@ class MongoDb(AgentCheck):
                     ns_tags = tags + ["db:%s" % dbname, "collection:%s" % collname]
 
                     # iterate over DBTOP metrics
-                    for m in self.TOP_METRICS:
+                    for keys, m, submit_method, metric_name_alias in metrics_plan.top:
                         # each metric is of the form: x.y.z with z optional
                         # and can be found at ns_metrics[x][y][z]
                         value = ns_metrics
                         try:
-                            for c in m.split("."):
+                            for c in keys:
                                 value = value[c]
                         except Exception:
                             continue
@@ -1076,7 +1297,6 @@ class MongoDb(AgentCheck):
                             )
 
                         # Submit the metric
-                        submit_method, metric_name_alias = self._resolve_metric(m, metrics_to_collect, prefix="usage")
                         submit_method(self, metric_name_alias, value, tags=ns_tags)
                         # Keep old incorrect metric
                         if metric_name_alias.endswith('countps'):
@@ -1131,12 +1351,8 @@ class MongoDb(AgentCheck):
         try:
             # Ensure that you're on the right db
             db = cli[db_name]
-            # grab the collections from the configutation
-            coll_names = instance.get('collections', [])
-            # loop through the collections
-            for coll_name in coll_names:
-                # grab the stats from the collection
-                stats = db.command("collstats", coll_name)
+            # loop through the configured collections
+            for coll_name, stats in collstats:
                 # loop through the metrics
                 for m in self.collection_metrics_names:
                     coll_tags = tags + ["db:%s" % db_name, "collection:%s" % coll_name]
@@ -1165,9 +1381,13 @@ class MongoDb(AgentCheck):
 
         custom_queries = instance.get("custom_queries", [])
         custom_query_tags = tags + ["db:{}".format(db_name)]
-        for raw_query in custom_queries:
-            try:
-                self._collect_custom_metrics_for_query(db, raw_query, custom_query_tags)
-            except Exception as e:
-                metric_prefix = raw_query.get('metric_prefix')
-                self.log.warning("Errors while collecting custom metrics with prefix %s", metric_prefix, exc_info=e)
+        if custom_queries:
+            with self._timed_phase('custom_queries', tags):
+                for raw_query in custom_queries:
+                    try:
+                        self._collect_custom_metrics_for_query(db, raw_query, custom_query_tags)
+                    except Exception as e:
+                        metric_prefix = raw_query.get('metric_prefix')
+                        self.log.warning(
+                            "Errors while collecting custom metrics with prefix %s", metric_prefix, exc_info=e
+                        )
@@ -0,0 +1,345 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+"""
+Parser of the output of `SHOW ENGINE INNODB STATUS`, heavily inspired by the Percona monitoring plugins work.
+
+The output is split in sections, each one titled between two lines of dashes:
+
+    ----------
+    SEMAPHORES
+    ----------
+    OS WAIT ARRAY INFO: reservation count 3452
+    ...
+
+Lines are only matched against the patterns of the section they belong to, every line is read once.
+"""
+import re
+from collections import defaultdict
+
+_DASHES = re.compile(r'-+$')
+
+
+def _set(*metrics):
+    """
+    Handler setting the `metrics` to the groups of the match, in order, unmatched optional groups are skipped.
+    """
+
+    def handler(match, results, state):
+        for metric, value in zip(metrics, match.groups()):
+            if value is not None:
+                results[metric] = int(value)
+
+    return handler
+
+
+def _add(*metrics):
+    """
+    Handler adding the groups of the match to the `metrics`, in order.
+    """
+
+    def handler(match, results, state):
+        for metric, value in zip(metrics, match.groups()):
+            results[metric] += int(value)
+
+    return handler
+
+
+def _lsn(metric):
+    """
+    Handler setting `metric` to a log sequence number, printed as two 32 bits words before the InnoDB plugin:
+
+      Log sequence number 0 45930133
+    """
+
+    def handler(match, results, state):
+        high, low = match.groups()
+        results[metric] = int(high) if low is None else (int(high) << 32) + int(low)
+
+    return handler
+
+
+def _aio_values(values):
+    # `0 [0, 0, 0, 0]` -> 0: the total, followed by the value of every thread, or only the latter
+    values = values.strip()
+    if not values:
+        return 0
+    elif not values.startswith('['):
+        return int(values.split()[0])
+
+    return sum(int(value) for value in values.strip('[]').split(','))
+
+
+def _pending_normal_aio(match, results, state):
+    # Pending normal aio reads: 0, aio writes: 0,
+    # Pending normal aio reads: 0 [0, 0, 0, 0] , aio writes: 0 [0, 0, 0, 0] ,
+    # Pending normal aio reads: [0, 0, 0, 0] , aio writes: [0, 0, 0, 0] ,
+    results['Innodb_pending_normal_aio_reads'] = _aio_values(match.group(1))
+    results['Innodb_pending_normal_aio_writes'] = _aio_values(match.group(2))
+
+
+def _ibuf_aio(match, results, state):
+    # ibuf aio reads: 0, log i/o's: 0, sync i/o's: 0
+    # ibuf aio reads:, log i/o's:, sync i/o's:
+    results['Innodb_pending_ibuf_aio_reads'] = int(match.group(1) or 0)
+    results['Innodb_pending_aio_log_ios'] = int(match.group(2) or 0)
+    if match.group(3) is not None:
+        results['Innodb_pending_aio_sync_ios'] = int(match.group(3) or 0)
+
+
+def _semaphore_wait(match, results, state):
+    # --Thread 907205 has waited at handler/ha_innodb.cc line 7156 for 1.00 seconds the semaphore:
+    results['Innodb_semaphore_waits'] += 1
+    results['Innodb_semaphore_wait_time'] += int(float(match.group(1))) * 1000
+
+
+def _transaction(match, results, state):
+    # ---TRANSACTION 0, not started, process no 13510, OS thread id 1170446656
+    results['Innodb_current_transactions'] += 1
+    if 'ACTIVE' in match.group(1):
+        results['Innodb_active_transactions'] += 1
+
+
+def _lock_structs(match, results, state):
+    # 23 lock struct(s), heap size 3024, undo log entries 27
+    # LOCK WAIT 12 lock struct(s), heap size 3024, undo log entries 5
+    # ROLLING BACK 127539 lock struct(s), heap size 15201832, 4411492 row lock(s), undo log entries 1042488
+    results['Innodb_lock_structs'] += int(match.group(2))
+    if match.group(1) == 'LOCK WAIT':
+        results['Innodb_locked_transactions'] += 1
+
+
+def _row_lock_wait(match, results, state):
+    # ------- TRX HAS BEEN WAITING 32 SEC FOR THIS LOCK TO BE GRANTED:
+    results['Innodb_row_lock_time'] += int(match.group(1)) * 1000
+
+
+def _ibuf_operations(match, results, state):
+    # merged operations:
+    #  insert 593983, delete mark 387006, delete 73092
+    # discarded operations:
+    #  insert 0, delete mark 0, delete 0
+    if not state['prev_line'].startswith('merged operations:'):
+        return
+
+    _set('Innodb_ibuf_merged_inserts', 'Innodb_ibuf_merged_delete_marks', 'Innodb_ibuf_merged_deletes')(
+        match, results, state
+    )
+    results['Innodb_ibuf_merged'] = (
+        results['Innodb_ibuf_merged_inserts']
+        + results['Innodb_ibuf_merged_delete_marks']
+        + results['Innodb_ibuf_merged_deletes']
+    )
+
+
+def _hash_table(match, results, state):
+    # In some versions of InnoDB, the used cells is omitted.
+    # Hash table size 4425293, used cells 4229064, ....
+    # Hash table size 57374437, node heap has 72964 buffer(s)
+    results['Innodb_hash_index_cells_total'] = int(match.group(1))
+    results['Innodb_hash_index_cells_used'] = int(match.group(2) or 0)
+
+
+def _compile(rules):
+    return [(re.compile(pattern), handler) for pattern, handler in rules]
+
+
+# Patterns of every section, matched from the beginning of the stripped lines
+SECTION_RULES = {
+    'SEMAPHORES': _compile(
+        [
+            # Mutex spin waits 79626940, rounds 157459864, OS waits 698719
+            (
+                r'Mutex spin waits (\d+), rounds (\d+), OS waits (\d+)',
+                _set('Innodb_mutex_spin_waits', 'Innodb_mutex_spin_rounds', 'Innodb_mutex_os_waits'),
+            ),
+            # RW-shared spins 3859028, OS waits 2100750; RW-excl spins 4641946, OS waits 1530310
+            (
+                r'RW-shared spins (\d+), OS waits (\d+); RW-excl spins (\d+), OS waits (\d+)',
+                _set(
+                    'Innodb_s_lock_spin_waits',
+                    'Innodb_s_lock_os_waits',
+                    'Innodb_x_lock_spin_waits',
+                    'Innodb_x_lock_os_waits',
+                ),
+            ),
+            # Post 5.5.17 syntax
+            # RW-shared spins 604733, rounds 8107431, OS waits 241268
+            (
+                r'RW-shared spins (\d+), rounds (\d+), OS waits (\d+)',
+                _set('Innodb_s_lock_spin_waits', 'Innodb_s_lock_spin_rounds', 'Innodb_s_lock_os_waits'),
+            ),
+            # RW-excl spins 604733, rounds 8107431, OS waits 241268
+            (
+                r'RW-excl spins (\d+), rounds (\d+), OS waits (\d+)',
+                _set('Innodb_x_lock_spin_waits', 'Innodb_x_lock_spin_rounds', 'Innodb_x_lock_os_waits'),
+            ),
+            (r'--Thread \d+ has waited at .* for ([\d.]+) seconds the semaphore:', _semaphore_wait),
+        ]
+    ),
+    'TRANSACTIONS': _compile(
+        [
+            (r'---TRANSACTION (.*)', _transaction),
+            (r'(?:(LOCK WAIT|ROLLING BACK) )?(\d+) lock struct\(s\)', _lock_structs),
+            # mysql tables in use 2, locked 2
+            (r'mysql tables in use (\d+), locked (\d+)', _add('Innodb_tables_in_use', 'Innodb_locked_tables')),
+            (r'------- TRX HAS BEEN WAITING (\d+) SEC', _row_lock_wait),
+            # History list length 132
+            (r'History list length (\d+)', _set('Innodb_history_list_length')),
+        ]
+    ),
+    'FILE I/O': _compile(
+        [
+            # 8782182 OS file reads, 15635445 OS file writes, 947800 OS fsyncs
+            (
+                r'(\d+) OS file reads, (\d+) OS file writes, (\d+) OS fsyncs',
+                _set('Innodb_os_file_reads', 'Innodb_os_file_writes', 'Innodb_os_file_fsyncs'),
+            ),
+            (r'Pending normal aio reads:([\d\[\], ]*?),? *aio writes:([\d\[\], ]*?),? *$', _pending_normal_aio),
+            (r"ibuf aio reads:\s*(\d*), log i/o's:\s*(\d*)(?:, sync i/o's:\s*(\d*))?", _ibuf_aio),
+            # Pending flushes (fsync) log: 0; buffer pool: 0
+            (
+                r'Pending flushes \(fsync\) log: (\d+); buffer pool: (\d+)',
+                _set('Innodb_pending_log_flushes', 'Innodb_pending_buffer_pool_flushes'),
+            ),
+        ]
+    ),
+    'INSERT BUFFER AND ADAPTIVE HASH INDEX': _compile(
+        [
+            # Ibuf: size 1, free list len 4634, seg size 4636, 14 merges
+            (
+                r'Ibuf: size (\d+), free list len (\d+), seg size (\d+),(?: (\d+) merges)?',
+                _set('Innodb_ibuf_size', 'Innodb_ibuf_free_list', 'Innodb_ibuf_segment_size', 'Innodb_ibuf_merges'),
+            ),
+            # Older InnoDB code seemed to be ready for an ibuf per tablespace.
+            # Ibuf for space 0: size 1, free list len 887, seg size 889, is not empty
+            (
+                r'Ibuf for space 0: size (\d+), free list len (\d+), seg size (\d+)',
+                _set('Innodb_ibuf_size', 'Innodb_ibuf_free_list', 'Innodb_ibuf_segment_size'),
+            ),
+            (r'insert (\d+), delete mark (\d+), delete (\d+)', _ibuf_operations),
+            # 19817685 inserts, 19817684 merged recs, 3552620 merges
+            (
+                r'(\d+) inserts, (\d+) merged recs, (\d+) merges',
+                _set('Innodb_ibuf_merged_inserts', 'Innodb_ibuf_merged', 'Innodb_ibuf_merges'),
+            ),
+            (r'Hash table size (\d+)(?:, used cells (\d+))?', _hash_table),
+        ]
+    ),
+    'LOG': _compile(
+        [
+            # This number is NOT printed in hex in InnoDB plugin.
+            # Log sequence number 272588624
+            (r'Log sequence number\s+(\d+)(?: (\d+))?', _lsn('Innodb_lsn_current')),
+            # Log flushed up to   272588624
+            (r'Log flushed up to\s+(\d+)(?: (\d+))?', _lsn('Innodb_lsn_flushed')),
+            # Last checkpoint at  272588624
+            (r'Last checkpoint at\s+(\d+)(?: (\d+))?', _lsn('Innodb_lsn_last_checkpoint')),
+            # 0 pending log writes, 0 pending chkp writes
+            (
+                r'(\d+) pending log writes, (\d+) pending chkp writes',
+                _set('Innodb_pending_log_writes', 'Innodb_pending_checkpoint_writes'),
+            ),
+            # 3430041 log i/o's done, 17.44 log i/o's/second
+            (r"(\d+) log i/o's done, ", _set('Innodb_log_writes')),
+        ]
+    ),
+    'BUFFER POOL AND MEMORY': _compile(
+        [
+            # Total memory allocated 29642194944; in additional pool allocated 0
+            (
+                r'Total memory allocated (\d+); in additional pool allocated (\d+)',
+                _set('Innodb_mem_total', 'Innodb_mem_additional_pool'),
+            ),
+            #   Adaptive hash index 1538240664     (186998824 + 1351241840)
+            (r'Adaptive hash index (\d+)', _set('Innodb_mem_adaptive_hash')),
+            #   Page hash           11688584
+            (r'Page hash\s+(\d+)', _set('Innodb_mem_page_hash')),
+            #   Dictionary cache    145525560      (140250984 + 5274576)
+            (r'Dictionary cache\s+(\d+)', _set('Innodb_mem_dictionary')),
+            #   File system         313848         (82672 + 231176)
+            (r'File system\s+(\d+)', _set('Innodb_mem_file_system')),
+            #   Lock system         29232616       (29219368 + 13248)
+            (r'Lock system\s+(\d+)', _set('Innodb_mem_lock_system')),
+            #   Recovery system     0      (0 + 0)
+            (r'Recovery system\s+(\d+)', _set('Innodb_mem_recovery_system')),
+            #   Threads             409336         (406936 + 2400)
+            (r'Threads\s+(\d+)', _set('Innodb_mem_thread_hash')),
+            # Buffer pool size        1769471
+            # but not: Buffer pool size, bytes 28991012864
+            (r'Buffer pool size\s+(\d+)', _set('Innodb_buffer_pool_pages_total')),
+            (r'Free buffers\s+(\d+)', _set('Innodb_buffer_pool_pages_free')),
+            (r'Database pages\s+(\d+)', _set('Innodb_buffer_pool_pages_data')),
+            (r'Modified db pages\s+(\d+)', _set('Innodb_buffer_pool_pages_dirty')),
+            # Pages read 15240822, created 1770238, written 21705836
+            # but not: Pages read ahead 0.00/s, evicted without access 0.06/s
+            (
+                r'Pages read (\d+), created (\d+), written (\d+)',
+                _set('Innodb_pages_read', 'Innodb_pages_created', 'Innodb_pages_written'),
+            ),
+        ]
+    ),
+    'ROW OPERATIONS': _compile(
+        [
+            # 0 queries inside InnoDB, 0 queries in queue
+            (
+                r'(\d+) queries inside InnoDB, (\d+) queries in queue',
+                _set('Innodb_queries_inside', 'Innodb_queries_queued'),
+            ),
+            # 1 read views open inside InnoDB
+            (r'(\d+) read views open inside InnoDB', _set('Innodb_read_views')),
+            # Number of rows inserted 50678311, updated 66425915, deleted 20605903, read 454561562
+            (
+                r'Number of rows inserted (\d+), updated (\d+), deleted (\d+), read (\d+)',
+                _set('Innodb_rows_inserted', 'Innodb_rows_updated', 'Innodb_rows_deleted', 'Innodb_rows_read'),
+            ),
+        ]
+    ),
+}
+
+# Sections without metrics, their lines are skipped, e.g. the transactions of the latest deadlock
+# or the buffer pool lines of every instance, only the aggregated ones are reported
+IGNORED_SECTIONS = frozenset(
+    (
+        'BACKGROUND THREAD',
+        'LATEST FOREIGN KEY ERROR',
+        'LATEST DETECTED DEADLOCK',
+        'INDIVIDUAL BUFFER POOL INFO',
+        'END OF INNODB MONITOR OUTPUT',
+    )
+)
+
+
+def parse_innodb_status(text):
+    """
+    Parse the output of `SHOW ENGINE INNODB STATUS`.
+
+    :param text: the `Status` column of the output
+    :returns: dict of metric names, as in `SHOW GLOBAL STATUS`, to int values
+    """
+    results = defaultdict(int)
+    # State shared by the handlers across lines
+    state = {'prev_line': ''}
+    rules = ()
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        # Section title, preceded by a line of dashes
+        if line in SECTION_RULES and _DASHES.match(state['prev_line']):
+            rules = SECTION_RULES[line]
+        elif line in IGNORED_SECTIONS and _DASHES.match(state['prev_line']):
+            rules = ()
+        else:
+            for pattern, handler in rules:
+                match = pattern.match(line)
+                if match:
+                    handler(match, results, state)
+                    break
+
+        state['prev_line'] = line
+
+    if 'Innodb_lsn_current' in results and 'Innodb_lsn_last_checkpoint' in results:
+        results['Innodb_checkpoint_age'] = results['Innodb_lsn_current'] - results['Innodb_lsn_last_checkpoint']
+
+    return dict(results)
@@ -0,0 +1,261 @@
+# (C) Datadog, Inc. 2020-present
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+import os
+
+import pytest
+
+from datadog_checks.mysql.innodb_status import parse_innodb_status
+
+pytestmark = pytest.mark.unit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'innodb_status')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize(
+    'fixture, expected',
+    [
+        pytest.param(
+            'mysql_5.1.txt',
+            {
+                'Innodb_mutex_spin_waits': 79626940,
+                'Innodb_mutex_spin_rounds': 157459864,
+                'Innodb_mutex_os_waits': 698719,
+                'Innodb_s_lock_spin_waits': 3859028,
+                'Innodb_s_lock_os_waits': 2100750,
+                'Innodb_x_lock_spin_waits': 4641946,
+                'Innodb_x_lock_os_waits': 1530310,
+                'Innodb_history_list_length': 132,
+                'Innodb_current_transactions': 3,
+                'Innodb_active_transactions': 2,
+                'Innodb_tables_in_use': 3,
+                'Innodb_locked_tables': 3,
+                'Innodb_lock_structs': 35,
+                'Innodb_locked_transactions': 1,
+                'Innodb_row_lock_time': 32000,
+                'Innodb_pending_normal_aio_reads': 0,
+                'Innodb_pending_normal_aio_writes': 0,
+                'Innodb_os_file_reads': 8782182,
+                'Innodb_os_file_writes': 15635445,
+                'Innodb_os_file_fsyncs': 947800,
+                'Innodb_ibuf_size': 1,
+                'Innodb_ibuf_free_list': 887,
+                'Innodb_ibuf_segment_size': 889,
+                'Innodb_ibuf_merged_inserts': 19817685,
+                'Innodb_ibuf_merged': 19817684,
+                'Innodb_ibuf_merges': 3552620,
+                'Innodb_hash_index_cells_total': 4425293,
+                'Innodb_hash_index_cells_used': 4229064,
+                'Innodb_lsn_current': 45930133,
+                'Innodb_lsn_flushed': 45930133,
+                'Innodb_lsn_last_checkpoint': 45929891,
+                'Innodb_checkpoint_age': 242,
+                'Innodb_log_writes': 3430041,
+                'Innodb_mem_total': 29642194944,
+                'Innodb_buffer_pool_pages_total': 1769471,
+                'Innodb_buffer_pool_pages_free': 0,
+                'Innodb_buffer_pool_pages_data': 1696503,
+                'Innodb_buffer_pool_pages_dirty': 160602,
+                'Innodb_pages_read': 15240822,
+                'Innodb_pages_created': 1770238,
+                'Innodb_pages_written': 21705836,
+                'Innodb_read_views': 1,
+                'Innodb_rows_inserted': 50678311,
+                'Innodb_rows_updated': 66425915,
+                'Innodb_rows_deleted': 20605903,
+                'Innodb_rows_read': 454561562,
+            },
+            id='mysql 5.1',
+        ),
+        pytest.param(
+            'mysql_5.6.txt',
+            {
+                'Innodb_semaphore_waits': 2,
+                'Innodb_semaphore_wait_time': 3000,
+                'Innodb_mutex_spin_waits': 412,
+                'Innodb_s_lock_spin_rounds': 6150,
+                'Innodb_x_lock_os_waits': 32,
+                'Innodb_history_list_length': 645,
+                'Innodb_current_transactions': 3,
+                'Innodb_active_transactions': 2,
+                'Innodb_lock_structs': 131,
+                'Innodb_pending_normal_aio_reads': 2,
+                'Innodb_pending_normal_aio_writes': 3,
+                'Innodb_pending_ibuf_aio_reads': 1,
+                'Innodb_pending_aio_log_ios': 2,
+                'Innodb_pending_aio_sync_ios': 3,
+                'Innodb_pending_log_flushes': 1,
+                'Innodb_pending_buffer_pool_flushes': 4,
+                'Innodb_ibuf_merges': 14,
+                'Innodb_ibuf_merged_inserts': 593983,
+                'Innodb_ibuf_merged_delete_marks': 387006,
+                'Innodb_ibuf_merged_deletes': 73092,
+                'Innodb_ibuf_merged': 1054081,
+                'Innodb_hash_index_cells_used': 0,
+                'Innodb_checkpoint_age': 8613,
+                'Innodb_pending_log_writes': 0,
+                'Innodb_mem_total': 274726912,
+                'Innodb_mem_additional_pool': 0,
+                # Only the aggregated buffer pool metrics
+                'Innodb_buffer_pool_pages_total': 16382,
+                'Innodb_buffer_pool_pages_dirty': 7,
+                'Innodb_pages_written': 3211,
+                'Innodb_read_views': 2,
+            },
+            id='mysql 5.6',
+        ),
+        pytest.param(
+            'mysql_5.7.txt',
+            {
+                'Innodb_s_lock_spin_waits': 0,
+                'Innodb_s_lock_spin_rounds': 1553,
+                'Innodb_s_lock_os_waits': 761,
+                'Innodb_x_lock_spin_rounds': 4108,
+                'Innodb_x_lock_os_waits': 79,
+                'Innodb_history_list_length': 31,
+                'Innodb_current_transactions': 3,
+                'Innodb_active_transactions': 2,
+                # The transactions of the latest deadlock are not counted
+                'Innodb_tables_in_use': 1,
+                'Innodb_locked_tables': 1,
+                'Innodb_lock_structs': 4,
+                'Innodb_locked_transactions': 1,
+                'Innodb_row_lock_time': 23000,
+                'Innodb_pending_normal_aio_reads': 0,
+                'Innodb_pending_normal_aio_writes': 0,
+                'Innodb_pending_ibuf_aio_reads': 0,
+                'Innodb_pending_aio_log_ios': 0,
+                'Innodb_pending_aio_sync_ios': 0,
+                'Innodb_os_file_reads': 463,
+                'Innodb_ibuf_merged': 0,
+                'Innodb_hash_index_cells_total': 34673,
+                'Innodb_lsn_current': 12947653,
+                'Innodb_checkpoint_age': 9,
+                'Innodb_log_writes': 870,
+                'Innodb_buffer_pool_pages_total': 8191,
+                'Innodb_buffer_pool_pages_free': 7653,
+                'Innodb_pages_read': 428,
+                'Innodb_rows_read': 86012,
+            },
+            id='mysql 5.7',
+        ),
+        pytest.param(
+            'mysql_8.0.txt',
+            {
+                'Innodb_s_lock_os_waits': 0,
+                'Innodb_history_list_length': 0,
+                'Innodb_current_transactions': 3,
+                'Innodb_active_transactions': 1,
+                'Innodb_tables_in_use': 1,
+                'Innodb_lock_structs': 1,
+                'Innodb_pending_normal_aio_reads': 0,
+                'Innodb_os_file_fsyncs': 107,
+                'Innodb_hash_index_cells_total': 34679,
+                'Innodb_lsn_current': 19644321,
+                'Innodb_lsn_flushed': 19644321,
+                'Innodb_checkpoint_age': 0,
+                'Innodb_log_writes': 22,
+                'Innodb_buffer_pool_pages_total': 8192,
+                'Innodb_buffer_pool_pages_data': 1099,
+                'Innodb_pages_created': 145,
+                'Innodb_rows_inserted': 3,
+                'Innodb_rows_read': 12,
+            },
+            id='mysql 8.0',
+        ),
+        pytest.param(
+            'mariadb_10.1.txt',
+            {
+                'Innodb_mutex_spin_rounds': 60,
+                'Innodb_s_lock_spin_waits': 6,
+                'Innodb_current_transactions': 1,
+                'Innodb_pending_normal_aio_writes': 0,
+                'Innodb_pending_aio_sync_ios': 0,
+                'Innodb_hash_index_cells_total': 276707,
+                'Innodb_lsn_last_checkpoint': 1616829,
+                'Innodb_log_writes': 24,
+                'Innodb_mem_total': 137887744,
+                'Innodb_mem_adaptive_hash': 2217584,
+                'Innodb_mem_page_hash': 139112,
+                'Innodb_mem_dictionary': 597325,
+                'Innodb_mem_file_system': 812272,
+                'Innodb_mem_lock_system': 333248,
+                'Innodb_mem_recovery_system': 0,
+                'Innodb_buffer_pool_pages_total': 8191,
+                'Innodb_buffer_pool_pages_free': 7884,
+                'Innodb_rows_inserted': 0,
+            },
+            id='mariadb 10.1',
+        ),
+        pytest.param(
+            'percona_5.6.txt',
+            {
+                'Innodb_mutex_spin_waits': 10832,
+                'Innodb_x_lock_spin_waits': 240,
+                'Innodb_history_list_length': 2108,
+                'Innodb_current_transactions': 3,
+                'Innodb_active_transactions': 2,
+                'Innodb_tables_in_use': 4,
+                'Innodb_locked_tables': 4,
+                'Innodb_lock_structs': 11,
+                'Innodb_locked_transactions': 1,
+                'Innodb_row_lock_time': 2000,
+                'Innodb_pending_normal_aio_writes': 1,
+                'Innodb_ibuf_free_list': 146,
+                'Innodb_ibuf_merges': 2209,
+                'Innodb_ibuf_merged': 4003,
+                'Innodb_lsn_current': 138229071223,
+                'Innodb_checkpoint_age': 1120021,
+                'Innodb_pending_log_writes': 1,
+                'Innodb_mem_adaptive_hash': 70908912,
+                'Innodb_buffer_pool_pages_total': 131071,
+                'Innodb_buffer_pool_pages_dirty': 1184,
+                'Innodb_queries_inside': 2,
+                'Innodb_queries_queued': 1,
+                'Innodb_read_views': 3,
+                'Innodb_rows_read': 912834210,
+            },
+            id='percona 5.6',
+        ),
+    ],
+)
+def test_parse_innodb_status(fixture, expected):
+    results = parse_innodb_status(read_fixture(fixture))
+
+    assert {metric: results.get(metric) for metric in expected} == expected
+
+
+def test_parse_innodb_status_sections():
+    """
+    Lines are only matched in their section.
+    """
+    results = parse_innodb_status(
+        '\n'.join(
+            [
+                '------------------------',
+                'LATEST DETECTED DEADLOCK',
+                '------------------------',
+                'mysql tables in use 1, locked 1',
+                'Number of rows inserted 1, updated 2, deleted 3, read 4',
+                '------------',
+                'TRANSACTIONS',
+                '------------',
+                'mysql tables in use 2, locked 1',
+                '---',
+                'LOG',
+                '---',
+                'Log sequence number 12',
+            ]
+        )
+    )
+
+    assert results == {'Innodb_tables_in_use': 2, 'Innodb_locked_tables': 1, 'Innodb_lsn_current': 12}
+
+
+def test_parse_innodb_status_empty():
+    assert parse_innodb_status('') == {}
@@ -7,11 +7,13 @@ from os import environ
 
 import mock
 import psutil
+import pymysql
 import pytest
 from pkg_resources import parse_version
 
 from datadog_checks.base.utils.platform import Platform
 from datadog_checks.mysql import MySql
+from datadog_checks.mysql.innodb_status import parse_innodb_status
 
 from . import common, tags, variables
 from .common import MYSQL_VERSION_PARSED
@@ -44,6 +46,10 @@ def test_minimal_config(aggregator, instance_basic):
 @pytest.mark.usefixtures('dd_environment')
 def test_complex_config(aggregator, instance_complex):
     mysql_check = MySql(common.CHECK_NAME, {}, instances=[instance_complex])
+    # The performance metrics are computed from the statements run between two check runs
+    mysql_check.check(instance_complex)
+    _run_testdb_query()
+    aggregator.reset()
     mysql_check.check(instance_complex)
 
     _assert_complex_config(aggregator)
@@ -53,10 +59,47 @@ def test_complex_config(aggregator, instance_complex):
 def test_e2e(dd_agent_check, instance_complex):
     aggregator = dd_agent_check(instance_complex)
 
-    _assert_complex_config(aggregator)
+    _assert_complex_config(aggregator, performance_interval=False)
 
 
-def _assert_complex_config(aggregator):
+@pytest.mark.integration
+@pytest.mark.usefixtures('dd_environment')
+def test_parse_innodb_status():
+    conn = pymysql.connect(host=common.HOST, port=common.PORT, user=common.USER, passwd=common.PASS)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW /*!50000 ENGINE*/ INNODB STATUS")
+            innodb_status_text = cursor.fetchone()[2]
+    finally:
+        conn.close()
+
+    results = parse_innodb_status(innodb_status_text)
+
+    for metric in (
+        'Innodb_history_list_length',
+        'Innodb_current_transactions',
+        'Innodb_pending_normal_aio_reads',
+        'Innodb_os_file_reads',
+        'Innodb_hash_index_cells_total',
+        'Innodb_lsn_current',
+        'Innodb_checkpoint_age',
+        'Innodb_buffer_pool_pages_total',
+        'Innodb_pages_read',
+        'Innodb_rows_read',
+    ):
+        assert metric in results, metric
+
+
+def _run_testdb_query():
+    conn = pymysql.connect(host=common.HOST, port=common.PORT, user=common.USER, passwd=common.PASS, db='testdb')
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM users")
+    finally:
+        conn.close()
+
+
+def _assert_complex_config(aggregator, performance_interval=True):
     # Test service check
     aggregator.assert_service_check('mysql.can_connect', status=MySql.OK, tags=tags.SC_TAGS, count=1)
     aggregator.assert_service_check('mysql.replication.slave_running', status=MySql.OK, tags=tags.SC_TAGS, at_least=1)
@@ -85,8 +128,10 @@ def _assert_complex_config(aggregator):
             continue
 
         if mname == 'mysql.performance.query_run_time.avg':
-            aggregator.assert_metric(mname, tags=tags.METRIC_TAGS + ['schema:testdb'], count=1)
-            aggregator.assert_metric(mname, tags=tags.METRIC_TAGS + ['schema:mysql'], count=1)
+            if performance_interval:
+                aggregator.assert_metric(mname, tags=tags.METRIC_TAGS + ['schema:testdb'], count=1)
+            else:
+                aggregator.assert_metric(mname, at_least=0)
         elif mname == 'mysql.info.schema.size':
             aggregator.assert_metric(mname, tags=tags.METRIC_TAGS + ['schema:testdb'], count=1)
             aggregator.assert_metric(mname, tags=tags.METRIC_TAGS + ['schema:information_schema'], count=1)
@@ -249,6 +294,75 @@ def test__get_server_pid():
             assert mysql_check.log.exception.call_count == 0
 
 
+@pytest.mark.unit
+def test_digest_deltas():
+    """
+    Test the performance metrics computed from the digests executed between two runs
+    """
+    mysql_check = MySql(common.CHECK_NAME, {}, instances=[{}])
+    mysql_check._get_config({'server': 'localhost', 'port': 3306})
+    db = mock.MagicMock()
+    cursor = db.cursor.return_value
+
+    cursor.fetchall.return_value = [
+        ('testdb', 'a', 10, 10 * 10 ** 6),
+        ('testdb', 'b', 5, 5 * 10 ** 6),
+        ('mysql', 'c', 2, 10 ** 6),
+    ]
+    # The first snapshot is the baseline
+    assert mysql_check._get_digest_deltas(db) is None
+
+    cursor.fetchall.return_value = [
+        ('testdb', 'a', 20, 10 * 10 ** 6 + 10 * 30 * 10 ** 6),
+        ('testdb', 'b', 5, 5 * 10 ** 6),
+        # The table was truncated and the digest run again since the previous run
+        ('mysql', 'c', 1, 50 * 10 ** 6),
+        ('testdb', 'd', 2, 2 * 10 ** 6),
+        (None, None, 4, 4 * 10 ** 6),
+    ]
+    deltas = mysql_check._get_digest_deltas(db)
+
+    assert deltas == {
+        ('testdb', 'a'): (10, 300 * 10 ** 6),
+        ('mysql', 'c'): (1, 50 * 10 ** 6),
+        ('testdb', 'd'): (2, 2 * 10 ** 6),
+        (None, None): (4, 4 * 10 ** 6),
+    }
+    assert MySql._get_query_exec_time_95th_us(deltas) == 50
+    assert MySql._get_query_exec_time_95th_us({}) is None
+    assert MySql._query_exec_time_per_schema(deltas) == {'schema:testdb': 25, 'schema:mysql': 50}
+
+
+@pytest.mark.unit
+def test_top_digests(aggregator):
+    mysql_check = MySql(common.CHECK_NAME, {}, instances=[{}])
+    deltas = {
+        ('testdb', 'a'): (10, 300 * 10 ** 6),
+        ('mysql', 'c'): (1, 50 * 10 ** 6),
+        ('testdb', 'd'): (2, 2 * 10 ** 6),
+        (None, None): (4, 400 * 10 ** 6),
+    }
+
+    mysql_check._submit_top_digests(deltas, 0, ['foo:bar'])
+    assert not aggregator.metric_names
+
+    mysql_check._submit_top_digests(deltas, 2, ['foo:bar'])
+
+    aggregator.assert_metric(
+        'mysql.performance.digest.executions', value=10, tags=['foo:bar', 'digest:a', 'schema:testdb'], count=1
+    )
+    aggregator.assert_metric(
+        'mysql.performance.digest.avg_us', value=30, tags=['foo:bar', 'digest:a', 'schema:testdb'], count=1
+    )
+    aggregator.assert_metric(
+        'mysql.performance.digest.executions', value=1, tags=['foo:bar', 'digest:c', 'schema:mysql'], count=1
+    )
+    aggregator.assert_metric(
+        'mysql.performance.digest.avg_us', value=50, tags=['foo:bar', 'digest:c', 'schema:mysql'], count=1
+    )
+    aggregator.assert_all_metrics_covered()
+
+
 @pytest.mark.integration
 @pytest.mark.usefixtures('dd_environment')
 def test_version_metadata(instance_basic, datadog_agent, version_metadata):
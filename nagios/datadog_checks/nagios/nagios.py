@@ -1,12 +1,24 @@
 # (C) Datadog, Inc. 2018-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import hashlib
 import json
 import re
 from collections import namedtuple
 
-from datadog_checks.base import AgentCheck
-from datadog_checks.base.utils.tailfile import TailFile
+from datadog_checks.base import AgentCheck, ensure_bytes
+from datadog_checks.base.utils.tailfile import ChunkedTailFile
+
+try:
+    from datadog_agent import read_persistent_cache, write_persistent_cache
+except ImportError:
+
+    def write_persistent_cache(value, key):
+        pass
+
+    def read_persistent_cache(value):
+        return ''
+
 
 # fields order for each event type, as named tuples
 EVENT_FIELDS = {
@@ -112,6 +124,7 @@ class NagiosCheck(AgentCheck):
                     event_func=self.event,
                     tags=custom_tag,
                     passive_checks=instance.get('passive_checks_events', False),
+                    gauge_func=self.gauge,
                 )
             )
         if (
@@ -193,19 +206,47 @@ class NagiosCheck(AgentCheck):
 
 
 class NagiosTailer(object):
-    def __init__(self, log_path, logger, parse_line):
+    def __init__(self, log_path, logger, parse_line, gauge_func=None, tags=None):
         """
         :param log_path: string, path to the file to parse
         :param logger: Logger object
+        :param gauge_func: (optional) function submitting the tailing throughput as gauges
+        :param tags: (optional) list of tags added to the throughput gauges
         """
         self.log_path = log_path
         self.log = logger
         self._nested_parse_line = parse_line
+        self._gauge = gauge_func
+        self._tags = ['file:{}'.format(log_path)] + list(tags or [])
         self._line_parsed = 0
 
-        tail = TailFile(self.log, self.log_path, self.parse_line)
-        self.gen = tail.tail(line_by_line=False, move_end=True)
-        next(self.gen)
+        # Resume from where the previous agent run stopped rather than from the end of the file
+        self._cache_key = 'nagios:{}'.format(hashlib.sha256(ensure_bytes(log_path)).hexdigest())
+        offset, inode = self.read_position()
+
+        self.tail = ChunkedTailFile(self.log, self.log_path, self.parse_line, offset=offset, inode=inode)
+        # Only open the file for now: the lines are processed by the first check run, once
+        # the check can submit the events and metrics
+        try:
+            self.tail.open(move_end=True)
+        except Exception as e:
+            self.log.warning("Can't open %s file: %s", self.log_path, e)
+        self.gen = self.tail.tail(line_by_line=False, move_end=True)
+
+    def read_position(self):
+        cache = read_persistent_cache(self._cache_key)
+        if cache:
+            try:
+                position = json.loads(cache)
+                return int(position['offset']), int(position['inode'])
+            except Exception as e:
+                self.log.warning("Ignoring invalid saved position of file %s: %s", self.log_path, e)
+
+        return None, None
+
+    def write_position(self):
+        if self.tail.offset is not None and self.tail.inode is not None:
+            write_persistent_cache(self._cache_key, json.dumps({'offset': self.tail.offset, 'inode': self.tail.inode}))
 
     def parse_line(self, line):
         self._line_parsed += 1
@@ -217,27 +258,42 @@ class NagiosTailer(object):
         try:
             self.log.debug("Start nagios check for file %s", self.log_path)
             next(self.gen)
-            self.log.debug("Done nagios check for file %s (parsed %s line(s))", self.log_path, self._line_parsed)
+            self.write_position()
+            lines, bytes_read, elapsed = self.tail.flush_stats()
+            lines_per_second = lines / elapsed if elapsed else 0
+            self.log.debug(
+                "Done nagios check for file %s (parsed %s line(s), %.1f line(s)/s over %.1fs, %s byte(s) read)",
+                self.log_path,
+                self._line_parsed,
+                lines_per_second,
+                elapsed,
+                bytes_read,
+            )
+            if self._gauge is not None:
+                self._gauge('nagios.tail.lines_read', lines, tags=self._tags)
+                self._gauge('nagios.tail.lines_per_second', lines_per_second, tags=self._tags)
+                self._gauge('nagios.tail.bytes_read', bytes_read, tags=self._tags)
         except StopIteration as e:
             self.log.exception(e)
             self.log.warning("Can't tail %s file", self.log_path)
 
 
 class NagiosEventLogTailer(object):
-    def __init__(self, log_path, logger, hostname, event_func, tags, passive_checks):
+    def __init__(self, log_path, logger, hostname, event_func, tags, passive_checks, gauge_func=None):
         """
         :param log_path: string, path to the file to parse
         :param logger: Logger object
         :param hostname: string, name of the host this agent is running on
         :param event_func: function to create event, should accept dict
         :param passive_checks: bool, enable or not passive checks events
+        :param gauge_func: (optional) function submitting the tailing throughput as gauges
         """
         self.log = logger
         self.hostname = hostname
         self._event = event_func
         self._tags = tags
         self._passive_checks = passive_checks
-        self.check = NagiosTailer(log_path, logger, self._parse_line).check
+        self.check = NagiosTailer(log_path, logger, self._parse_line, gauge_func=gauge_func, tags=tags).check
 
     def _parse_line(self, line):
         """
@@ -345,7 +401,7 @@ class NagiosPerfDataTailer(object):
         self._tags = tags
         self._get_metric_prefix = metric_prefix
         self._perfdata_field = perfdata_field
-        self.check = NagiosTailer(log_path, logger, self._parse_line).check
+        self.check = NagiosTailer(log_path, logger, self._parse_line, gauge_func=gauge_func, tags=tags).check
 
     def compile_file_template(self, file_template):
         try:
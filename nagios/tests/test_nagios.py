@@ -21,6 +21,11 @@ from .common import (
 )
 
 
+def assert_tail_metrics(aggregator):
+    for name in ('lines_read', 'lines_per_second', 'bytes_read'):
+        aggregator.assert_metric('nagios.tail.{}'.format(name))
+
+
 class TestEventLogTailer:
     def test_line_parser(self, aggregator):
         """
@@ -214,6 +219,8 @@ class TestPerfDataTailer:
                 expected_tags.append('max:' + values[4])
             aggregator.assert_metric(metric_name, value=value, tags=expected_tags, count=1)
 
+        assert_tail_metrics(aggregator)
+
         aggregator.assert_all_metrics_covered()
 
     def test_service_perfdata_special_cases(self, aggregator):
@@ -253,6 +260,8 @@ class TestPerfDataTailer:
 
             aggregator.assert_metric("nagios.disk_space", value=value, tags=expected_tags, count=1)
 
+        assert_tail_metrics(aggregator)
+
         aggregator.assert_all_metrics_covered()
 
     def test_host_perfdata(self, aggregator):
@@ -297,6 +306,8 @@ class TestPerfDataTailer:
 
             aggregator.assert_metric(metric_name, value=value, tags=expected_tags, count=1)
 
+        assert_tail_metrics(aggregator)
+
         aggregator.assert_all_metrics_covered()
 
     def test_alt_service_perfdata(self, aggregator):
@@ -362,6 +373,8 @@ class TestPerfDataTailer:
         for metric in expected_metrics:
             aggregator.assert_metric(metric['name'], metric['value'], tags=metric['tags'], hostname=metric['hostname'])
 
+        assert_tail_metrics(aggregator)
+
         aggregator.assert_all_metrics_covered()
 
     def test_alt_host_perfdata(self, aggregator):
@@ -413,6 +426,8 @@ class TestPerfDataTailer:
         for metric in expected_metrics:
             aggregator.assert_metric(metric['name'], metric['value'], tags=metric['tags'], hostname=metric['hostname'])
 
+        assert_tail_metrics(aggregator)
+
         aggregator.assert_all_metrics_covered()
 
     def _write_log(self, log_data):
@@ -1,9 +1,13 @@
 # (C) Datadog, Inc. 2018-present
 # All rights reserved
 # Licensed under a 3-clause BSD style license (see LICENSE)
+import json
+import os
 
+import mock
 from mock import MagicMock
 
+from datadog_checks.nagios import NagiosCheck
 from datadog_checks.nagios.nagios import NagiosEventLogTailer
 
 from .common import NAGIOS_TEST_LOG
@@ -21,3 +25,72 @@ def test_centreon_event_logs():
     assert len(events) == 1
     assert events[0]['event_type'] == 'SERVICE ALERT'
     assert events[0]['host'] == 'SOMEHOST'
+
+
+def test_tail_position_persisted(tmpdir):
+    log_path = str(tmpdir.join('nagios.log'))
+    with open(log_path, 'w') as f:
+        f.write("[1571848012] SERVICE ALERT: host0;check;CRITICAL;SOFT;1;payload\n")
+
+    cache = {}
+    events = []
+    with mock.patch('datadog_checks.nagios.nagios.read_persistent_cache', side_effect=lambda key: cache.get(key)):
+        with mock.patch('datadog_checks.nagios.nagios.write_persistent_cache', side_effect=cache.__setitem__):
+            tailer = NagiosEventLogTailer(log_path, MagicMock(), "host", events.append, None, False)
+            with open(log_path, 'a') as f:
+                f.write("[1571848013] SERVICE ALERT: host1;check;CRITICAL;SOFT;1;payload\n")
+            tailer.check()
+
+            # The agent is restarted while the file keeps growing
+            with open(log_path, 'a') as f:
+                f.write("[1571848014] SERVICE ALERT: host2;check;CRITICAL;SOFT;1;payload\n")
+            tailer = NagiosEventLogTailer(log_path, MagicMock(), "host", events.append, None, False)
+            tailer.check()
+
+    assert [event['host'] for event in events] == ['host1', 'host2']
+    assert json.loads(list(cache.values())[0])['offset'] == os.path.getsize(log_path)
+
+
+def test_tail_position_resumed_by_check(aggregator, tmpdir):
+    log_path = str(tmpdir.join('nagios.log'))
+    perfdata_path = str(tmpdir.join('service-perfdata'))
+    conf_path = str(tmpdir.join('nagios.cfg'))
+    with open(conf_path, 'w') as f:
+        f.write(
+            'log_file={}\n'
+            'service_perfdata_file={}\n'
+            'service_perfdata_file_template=DATATYPE::SERVICEPERFDATA\\tTIMET::$TIMET$\\tHOSTNAME::$HOSTNAME$'
+            '\\tSERVICEDESC::$SERVICEDESC$\\tSERVICEPERFDATA::$SERVICEPERFDATA$\n'.format(log_path, perfdata_path)
+        )
+    for path in (log_path, perfdata_path):
+        open(path, 'w').close()
+
+    instance = {'nagios_conf': conf_path, 'collect_service_performance_data': True}
+    cache = {}
+    with mock.patch('datadog_checks.nagios.nagios.read_persistent_cache', side_effect=lambda key: cache.get(key)):
+        with mock.patch('datadog_checks.nagios.nagios.write_persistent_cache', side_effect=cache.__setitem__):
+            check = NagiosCheck('nagios', {}, [instance])
+            check.check(instance)
+
+            # Written while the agent is stopped
+            with open(log_path, 'a') as f:
+                f.write("[1571848013] SERVICE ALERT: host1;check;CRITICAL;SOFT;1;payload\n")
+            with open(perfdata_path, 'a') as f:
+                f.write(
+                    'DATATYPE::SERVICEPERFDATA\tTIMET::1571848013\tHOSTNAME::host1\tSERVICEDESC::load'
+                    '\tSERVICEPERFDATA::load1=0.5\n'
+                )
+
+            # The lines are submitted by the first run of the restarted check, not when it is created
+            check = NagiosCheck('nagios', {}, [instance])
+            check.check_id = 'nagios:restarted'
+            assert not aggregator.events
+            check.check(instance)
+
+    assert [event['host'] for event in aggregator.events] == ['host1']
+    aggregator.assert_metric('nagios.load.load1', value=0.5, hostname='host1')
+    # The throughput of every file is submitted at every run
+    for path in (log_path, perfdata_path):
+        for name in ('lines_read', 'lines_per_second', 'bytes_read'):
+            aggregator.assert_metric('nagios.tail.{}'.format(name), count=2, tags=['file:{}'.format(path)])
+    aggregator.assert_metric('nagios.tail.lines_read', value=1, tags=['file:{}'.format(log_path)])
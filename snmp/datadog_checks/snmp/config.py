@@ -55,6 +55,8 @@ class InstanceConfig:
     DEFAULT_TIMEOUT = 1
     DEFAULT_ALLOWED_FAILURES = 3
     DEFAULT_BULK_THRESHOLD = 0
+    DEFAULT_DISCOVERY_WORKERS = 5
+    DEFAULT_MIN_COLLECTION_INTERVAL = 15
 
     def __init__(self, instance, warning, log, global_metrics, mibs_path, profiles, profiles_by_oid):
         self.instance = instance
@@ -75,6 +77,16 @@ class InstanceConfig:
         self.failing_instances = defaultdict(int)
         self.allowed_failures = int(instance.get('discovery_allowed_failures', self.DEFAULT_ALLOWED_FAILURES))
         self.bulk_threshold = int(instance.get('bulk_threshold', self.DEFAULT_BULK_THRESHOLD))
+        self.discovery_workers = int(instance.get('discovery_workers', self.DEFAULT_DISCOVERY_WORKERS))
+        # Time allowed to poll the discovered devices at every run, and to poll each of them
+        self.discovery_time_budget = float(
+            instance.get(
+                'discovery_time_budget', instance.get('min_collection_interval', self.DEFAULT_MIN_COLLECTION_INTERVAL)
+            )
+        )
+        self.discovery_device_timeout = float(instance.get('discovery_device_timeout', 0)) or None
+        # Window of the run across which the polls of the discovered devices are started
+        self.discovery_stagger = float(instance.get('discovery_stagger', 0))
         # Temporary flag until we secure the content
         self.autofetch = is_affirmative(instance.get('autofetch', False))
 
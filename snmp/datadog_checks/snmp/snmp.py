@@ -8,6 +8,7 @@ import os
 import threading
 import time
 from collections import defaultdict
+from zlib import crc32
 
 import pysnmp.proto.rfc1902 as snmp_type
 import yaml
@@ -20,6 +21,7 @@ from six import iteritems
 
 from datadog_checks.base import AgentCheck, ConfigurationError, is_affirmative
 from datadog_checks.base.errors import CheckException
+from datadog_checks.base.utils.thread_pool import BoundedThreadPool, PoolTimeoutError
 
 from .config import InstanceConfig, ParsedTableMetric
 
@@ -76,6 +78,7 @@ class SnmpCheck(AgentCheck):
     SC_STATUS = 'snmp.can_check'
     _running = True
     _thread = None
+    _pool = None
     _NON_REPEATERS = 0
     _MAX_REPETITIONS = 25
 
@@ -111,6 +114,9 @@ class SnmpCheck(AgentCheck):
         self.instance['name'] = self._get_instance_key(self.instance)
         self._config = self._build_config(self.instance)
 
+        # Discovered devices that could not be polled within the time budget of the last run
+        self._skipped_devices = set()
+
     def _build_config(self, instance):
         return InstanceConfig(
             instance,
@@ -176,7 +182,11 @@ class SnmpCheck(AgentCheck):
             message = '{} for instance {}'.format(error_indication, ip_address)
             raise CheckException(message)
 
-    def fetch_results(self, config, all_oids, bulk_oids):
+    @staticmethod
+    def deadline_exceeded(deadline):
+        return deadline is not None and time.time() > deadline
+
+    def fetch_results(self, config, all_oids, bulk_oids, deadline=None):
         """
         Perform a snmpwalk on the domain specified by the oids, on the device
         configured in instance.
@@ -184,18 +194,31 @@ class SnmpCheck(AgentCheck):
         Returns a dictionary:
         dict[oid/metric_name][row index] = value
         In case of scalar objects, the row index is just 0
+
+        If a `deadline` timestamp is given, no more requests are sent once it is exceeded
+        and the results collected so far are returned. This is not an error of the device,
+        it is returned separately as the third item.
         """
         results = defaultdict(dict)
         enforce_constraints = config.enforce_constraints
 
         all_binds = []
         error = None
+        deadline_exceeded = False
         for to_fetch in all_oids:
-            binds, current_error = self.fetch_oids(config, to_fetch, enforce_constraints=enforce_constraints)
+            binds, current_error, deadline_exceeded = self.fetch_oids(
+                config, to_fetch, enforce_constraints=enforce_constraints, deadline=deadline
+            )
             all_binds.extend(binds)
             error = current_error if not error else error
+            if deadline_exceeded:
+                break
 
         for oid in bulk_oids:
+            if deadline_exceeded or self.deadline_exceeded(deadline):
+                deadline_exceeded = True
+                break
+
             try:
                 self.log.debug('Running SNMP command getBulk on OID %r', oid)
                 binds_iterator = config.call_cmd(
@@ -223,9 +246,9 @@ class SnmpCheck(AgentCheck):
         self.log.debug('Raw results: %s', results)
         # Freeze the result
         results.default_factory = None
-        return results, error
+        return results, error, deadline_exceeded
 
-    def fetch_oids(self, config, oids, enforce_constraints):
+    def fetch_oids(self, config, oids, enforce_constraints, deadline=None):
         # UPDATE: We used to perform only a snmpgetnext command to fetch metric values.
         # It returns the wrong value when the OID passeed is referring to a specific leaf.
         # For example:
@@ -233,9 +256,14 @@ class SnmpCheck(AgentCheck):
         # iso.3.6.1.2.1.25.4.2.1.7.224 = INTEGER: 2
         # SOLUTION: perform a snmpget command and fallback with snmpgetnext if not found
         error = None
+        deadline_exceeded = False
         first_oid = 0
         all_binds = []
         while first_oid < len(oids):
+            if self.deadline_exceeded(deadline):
+                deadline_exceeded = True
+                break
+
             try:
                 oids_batch = oids[first_oid : first_oid + self.oid_batch_size]
                 self.log.debug('Running SNMP command get on OIDS %s', oids_batch)
@@ -279,7 +307,7 @@ class SnmpCheck(AgentCheck):
             # if we fail move onto next batch
             first_oid += self.oid_batch_size
 
-        return all_binds, error
+        return all_binds, error, deadline_exceeded
 
     def fetch_sysobject_oid(self, config):
         """Return the sysObjectID of the instance."""
@@ -350,27 +378,116 @@ class SnmpCheck(AgentCheck):
         if config.ip_network:
             if self._thread is None:
                 self._start_discovery()
-            for host, discovered in list(config.discovered_instances.items()):
-                if self._check_with_config(discovered):
-                    config.failing_instances[host] += 1
-                    if config.failing_instances[host] >= config.allowed_failures:
-                        # Remove it from discovered instances, we'll re-discover it later if it reappears
-                        config.discovered_instances.pop(host)
-                        # Reset the failure counter as well
-                        config.failing_instances.pop(host)
-                else:
-                    # Reset the counter if not's failing
-                    config.failing_instances.pop(host, None)
             tags = ['network:{}'.format(config.ip_network)]
             tags.extend(config.tags)
+            self._check_discovered_instances(config, tags)
             self.gauge('snmp.discovered_devices_count', len(config.discovered_instances), tags=tags)
         else:
             self._check_with_config(config)
 
-    def _check_with_config(self, config):
+    def cancel(self):
+        self._running = False
+        if self._pool is not None:
+            self._pool.cancel()
+            self._pool = None
+
+    def _schedule_discovered_instances(self, config):
+        """
+        Return the discovered hosts with the offset, in seconds from the start of the run, at which to poll
+        them, in order. The ones skipped at the last run are polled right away, the others at a stable offset
+        hashed from their address within the first `discovery_stagger` seconds of the run. This spreads the
+        polls across the run, and neighbouring addresses (often devices of the same kind, as slow to respond)
+        apart.
+        """
+        stagger = min(config.discovery_stagger, config.discovery_time_budget)
+
+        schedule = []
+        # The discovery thread adds hosts concurrently
+        for host in list(config.discovered_instances):
+            slot = crc32(host.encode('utf-8')) & 0xFFFFFFFF
+            offset = 0 if host in self._skipped_devices else stagger * slot / 0x100000000
+            schedule.append((offset, slot, host))
+
+        return [(offset, host) for offset, _, host in sorted(schedule)]
+
+    def _check_discovered_instances(self, config, tags):
+        """
+        Poll the discovered devices concurrently within the time budget of the run. The devices
+        that could not be started in time are skipped for this run and polled first at the next one.
+        """
+        if self._pool is None:
+            self._pool = BoundedThreadPool(config.discovery_workers, name=self.name)
+
+        run_start = time.time()
+        run_deadline = run_start + config.discovery_time_budget
+        durations = {}
+
+        def poll(host, discovered):
+            start = time.time()
+            deadline = run_deadline
+            if config.discovery_device_timeout is not None:
+                deadline = min(deadline, start + config.discovery_device_timeout)
+            try:
+                return self._check_with_config(discovered, deadline=deadline)
+            finally:
+                durations[host] = time.time() - start
+
+        results = []
+        for offset, host in self._schedule_discovered_instances(config):
+            delay = run_start + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            if not self._running:
+                break
+
+            discovered = config.discovered_instances[host]
+            timeout = max(run_deadline - time.time(), 0)
+            results.append((host, self._pool.apply_async(poll, (host, discovered), timeout=timeout)))
+
+        skipped = set()
+        deadline_exceeded = set()
+        for host, result in results:
+            # The polls that started stop sending requests at their deadline
+            result.wait()
+            try:
+                error, device_deadline_exceeded = result.get()
+            except PoolTimeoutError:
+                skipped.add(host)
+                continue
+
+            # Running out of time is not a failure of the device
+            if device_deadline_exceeded:
+                deadline_exceeded.add(host)
+
+            if error:
+                config.failing_instances[host] += 1
+                if config.failing_instances[host] >= config.allowed_failures:
+                    # Remove it from discovered instances, we'll re-discover it later if it reappears
+                    config.discovered_instances.pop(host, None)
+                    # Reset the failure counter as well
+                    config.failing_instances.pop(host)
+            else:
+                # Reset the counter if not's failing
+                config.failing_instances.pop(host, None)
+
+        self._skipped_devices = skipped
+        if skipped:
+            self.log.debug('Skipped polling %d devices, out of time budget: %s', len(skipped), sorted(skipped))
+        if deadline_exceeded:
+            self.log.debug(
+                'Stopped polling %d devices at their deadline: %s', len(deadline_exceeded), sorted(deadline_exceeded)
+            )
+
+        for host, duration in iteritems(durations):
+            self.gauge('snmp.discovery.device_poll_duration', duration, tags=tags + ['snmp_device:{}'.format(host)])
+        self.count('snmp.discovery.devices_skipped', len(skipped), tags=tags)
+        self.count('snmp.discovery.devices_deadline_exceeded', len(deadline_exceeded), tags=tags)
+
+    def _check_with_config(self, config, deadline=None):
         # Reset errors
         instance = config.instance
         error = results = None
+        deadline_exceeded = False
         try:
             if not (config.all_oids or config.bulk_oids):
                 sys_object_oid = self.fetch_sysobject_oid(config)
@@ -379,7 +496,9 @@ class SnmpCheck(AgentCheck):
 
             if config.all_oids or config.bulk_oids:
                 self.log.debug('Querying device %s', config.ip_address)
-                results, error = self.fetch_results(config, config.all_oids, config.bulk_oids)
+                results, error, deadline_exceeded = self.fetch_results(
+                    config, config.all_oids, config.bulk_oids, deadline=deadline
+                )
                 self.report_metrics(config.parsed_metrics, results, config.tags)
         except CheckException as e:
             error = str(e)
@@ -398,7 +517,7 @@ class SnmpCheck(AgentCheck):
                 if results:
                     status = self.WARNING
             self.service_check(self.SC_STATUS, status, tags=sc_tags, message=error)
-        return error
+        return error, deadline_exceeded
 
     def report_metrics(self, metrics, results, tags):
         """
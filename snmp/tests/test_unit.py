@@ -3,6 +3,7 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 import os
+import threading
 import time
 
 import mock
@@ -251,6 +252,170 @@ def test_cache_building(write_mock, read_mock):
     write_mock.assert_called_once_with('', '["192.168.0.1"]')
 
 
+def _discovery_check(**options):
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    instance.pop('ip_address')
+    instance['network_address'] = '192.168.0.0/29'
+    instance.update(options)
+    check = SnmpCheck('snmp', {}, [instance])
+    # Don't start the discovery thread, the devices are set by the tests
+    check._thread = mock.Mock()
+    check._config.discovered_instances = {
+        '192.168.0.{}'.format(i): mock.Mock(ip_address='192.168.0.{}'.format(i)) for i in range(1, 5)
+    }
+    return check, instance
+
+
+def test_discovered_devices_polled_concurrently(aggregator):
+    check, instance = _discovery_check(discovery_workers=4)
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def poll(config, deadline=None):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.1)
+        with lock:
+            active[0] -= 1
+        return None, False
+
+    check._check_with_config = mock.Mock(side_effect=poll)
+    check.check(instance)
+    check.cancel()
+
+    assert active[1] == 4
+    assert check._check_with_config.call_count == 4
+    tags = ['network:192.168.0.0/29'] + check._config.tags
+    for host in check._config.discovered_instances:
+        aggregator.assert_metric(
+            'snmp.discovery.device_poll_duration', count=1, tags=tags + ['snmp_device:{}'.format(host)]
+        )
+    aggregator.assert_metric('snmp.discovery.devices_skipped', value=0, tags=tags)
+    aggregator.assert_metric('snmp.discovery.devices_deadline_exceeded', value=0, tags=tags)
+    aggregator.assert_metric('snmp.discovered_devices_count', value=4, tags=tags)
+
+
+def test_discovered_devices_time_budget(aggregator):
+    check, instance = _discovery_check(discovery_workers=1, discovery_time_budget=0.1)
+
+    def poll(config, deadline=None):
+        time.sleep(0.2)
+        return None, False
+
+    check._check_with_config = mock.Mock(side_effect=poll)
+
+    check.check(instance)
+    assert check._check_with_config.call_count == 1
+    polled = check._check_with_config.call_args[0][0]
+    tags = ['network:192.168.0.0/29'] + check._config.tags
+    aggregator.assert_metric('snmp.discovery.devices_skipped', value=3, tags=tags)
+    # Skipped devices are not failing
+    assert not check._config.failing_instances
+    assert len(check._config.discovered_instances) == 4
+
+    # The skipped devices are polled first at the next run
+    check._check_with_config.reset_mock()
+    check.check(instance)
+    check.cancel()
+    assert check._check_with_config.call_count == 1
+    assert check._check_with_config.call_args[0][0] is not polled
+
+
+def test_discovered_devices_deadline():
+    check, instance = _discovery_check(discovery_device_timeout=5)
+    check._check_with_config = mock.Mock(return_value=(None, False))
+
+    start = time.time()
+    check.check(instance)
+    check.cancel()
+
+    for call in check._check_with_config.call_args_list:
+        assert start + 5 <= call[1]['deadline'] <= time.time() + 5
+
+
+def test_discovered_devices_schedule():
+    check, _ = _discovery_check()
+    schedule = check._schedule_discovered_instances(check._config)
+    order = [host for _, host in schedule]
+    assert sorted(order) == sorted(check._config.discovered_instances)
+    # Not staggered by default
+    assert [offset for offset, _ in schedule] == [0] * 4
+
+    # Stable across runs, whatever the discovery order
+    check._config.discovered_instances = dict(reversed(list(check._config.discovered_instances.items())))
+    assert check._schedule_discovered_instances(check._config) == schedule
+
+    check._skipped_devices = {order[-1]}
+    assert [host for _, host in check._schedule_discovered_instances(check._config)] == order[-1:] + order[:-1]
+
+
+def test_discovered_devices_stagger():
+    check, _ = _discovery_check(discovery_stagger=10, discovery_time_budget=60)
+    schedule = check._schedule_discovered_instances(check._config)
+
+    offsets = [offset for offset, _ in schedule]
+    assert offsets == sorted(offsets)
+    assert all(0 <= offset < 10 for offset in offsets)
+    assert len(set(offsets)) == 4
+    assert check._schedule_discovered_instances(check._config) == schedule
+
+    # Skipped devices are polled right away
+    skipped = schedule[-1][1]
+    check._skipped_devices = {skipped}
+    assert check._schedule_discovered_instances(check._config)[0] == (0, skipped)
+
+    # The offsets are capped by the time budget
+    check, _ = _discovery_check(discovery_stagger=10, discovery_time_budget=1)
+    assert all(offset < 1 for offset, _ in check._schedule_discovered_instances(check._config))
+
+
+def test_discovered_devices_staggered_polls():
+    check, instance = _discovery_check(discovery_stagger=0.2)
+    started = {}
+
+    def poll(config, deadline=None):
+        started.setdefault(config.ip_address, time.time())
+        return None, False
+
+    check._check_with_config = mock.Mock(side_effect=poll)
+
+    start = time.time()
+    check.check(instance)
+    check.cancel()
+
+    for offset, host in check._schedule_discovered_instances(check._config):
+        assert started[host] - start >= offset
+
+
+def test_fetch_results_deadline():
+    instance = common.generate_instance_config(common.SUPPORTED_METRIC_TYPES)
+    check = SnmpCheck('snmp', {}, [instance])
+    config = mock.Mock(ip_address='192.168.0.1')
+
+    results, error, deadline_exceeded = check.fetch_results(config, [['1.2.3']], ['1.2.4'], deadline=time.time() - 1)
+
+    assert results == {}
+    assert error is None
+    assert deadline_exceeded
+    config.call_cmd.assert_not_called()
+
+
+def test_discovered_devices_deadline_exceeded(aggregator):
+    check, instance = _discovery_check(discovery_allowed_failures=1)
+    check._check_with_config = mock.Mock(return_value=(None, True))
+
+    check.check(instance)
+    check.cancel()
+
+    # Devices stopped at their deadline are not failing
+    assert not check._config.failing_instances
+    assert len(check._config.discovered_instances) == 4
+    tags = ['network:192.168.0.0/29'] + check._config.tags
+    aggregator.assert_metric('snmp.discovery.devices_deadline_exceeded', value=4, tags=tags)
+    aggregator.assert_metric('snmp.discovery.devices_skipped', value=0, tags=tags)
+
+
 def test_trie():
     trie = OIDTrie()
     trie.set((1, 2), 'bar')
@@ -15,16 +15,16 @@ from datetime import datetime, timedelta
 from pyVim import connect
 from pyVmomi import vim  # pylint: disable=E0611
 from pyVmomi import vmodl  # pylint: disable=E0611
-from six import itervalues
+from six import iteritems, itervalues
 from six.moves import range
 
 from datadog_checks.base import ensure_unicode, to_string
 from datadog_checks.base.checks import AgentCheck
-from datadog_checks.base.checks.libs.thread_pool import SENTINEL, Pool
 from datadog_checks.base.checks.libs.timer import Timer
 from datadog_checks.base.checks.libs.vmware.all_metrics import ALL_METRICS
 from datadog_checks.base.checks.libs.vmware.basic_metrics import BASIC_METRICS
 from datadog_checks.base.config import is_affirmative
+from datadog_checks.base.utils.thread_pool import BoundedThreadPool
 
 from .cache_config import CacheConfig
 from .common import REALTIME_RESOURCES, SOURCE_TYPE
@@ -40,6 +40,10 @@ REAL_TIME_INTERVAL = 20
 VM_MONITORING_FLAG = 'DatadogMonitored'
 # The size of the ThreadPool used to process the request queue
 DEFAULT_SIZE_POOL = 4
+# The maximum number of jobs queued in the ThreadPool before queuing more blocks, 0 for no limit
+DEFAULT_POOL_QUEUE_SIZE = 0
+# The number of seconds after which a job of the ThreadPool that has not started is dropped, 0 to never drop jobs
+DEFAULT_POOL_TASK_TIMEOUT = 0
 # The maximum number of historical metrics allowed to be queried
 DEFAULT_MAX_HIST_METRICS = 64
 # The interval in seconds between two refresh of the entities list
@@ -176,7 +180,9 @@ class VSphereCheck(AgentCheck):
     def start_pool(self):
         self.log.info("Starting Thread Pool")
         pool_size = int(self.init_config.get('threads_count', DEFAULT_SIZE_POOL))
-        self.pool = Pool(pool_size)
+        queue_size = int(self.init_config.get('pool_queue_size', DEFAULT_POOL_QUEUE_SIZE))
+        task_timeout = float(self.init_config.get('pool_task_timeout', DEFAULT_POOL_TASK_TIMEOUT)) or None
+        self.pool = BoundedThreadPool(pool_size, name='vsphere', queue_size=queue_size, task_timeout=task_timeout)
 
     def terminate_pool(self):
         self.log.info("Terminating Thread Pool")
@@ -186,12 +192,28 @@ class VSphereCheck(AgentCheck):
 
     def stop_pool(self):
         self.log.info("Stopping Thread Pool, waiting for queued jobs to finish")
-        for _ in self.pool._workers:
-            self.pool._workq.put(SENTINEL)
         self.pool.close()
         self.pool.join()
         assert self.pool.get_nworkers() == 0
 
+    def report_pool(self, phase, custom_tags):
+        tags = ['phase:{}'.format(phase)]
+        tags.extend(custom_tags)
+        stats = self.pool.report(self, 'datadog.agent.vsphere.pool', tags=tags)
+        if stats['dropped']:
+            self.log.warning(
+                "%s queued vCenter queries of the %s phase were dropped after waiting more than %s seconds, "
+                "consider increasing `pool_task_timeout`",
+                stats['dropped'],
+                phase,
+                self.pool.task_timeout,
+            )
+
+    def cancel(self):
+        if self.pool is not None:
+            self.log.info("Check cancelled, cancelling queued jobs")
+            self.pool.cancel()
+
     def _query_event(self, instance):
         i_key = self._instance_key(instance)
         last_time = self.latest_event_query.get(i_key)
@@ -833,6 +855,8 @@ class VSphereCheck(AgentCheck):
         perfManager = server_instance.content.perfManager
         results = perfManager.QueryPerf(query_specs)
         if results:
+            # Samples of each metric, submitted in batches once all results are processed
+            metric_samples = defaultdict(list)
             for mor_perfs in results:
                 mor_name = str(mor_perfs.entity)
                 try:
@@ -887,7 +911,10 @@ class VSphereCheck(AgentCheck):
 
                     # vsphere "rates" should be submitted as gauges (rate is
                     # precomputed).
-                    self.gauge("vsphere.{}".format(ensure_unicode(metric_name)), value, hostname=hostname, tags=tags)
+                    metric_samples[metric_name].append((value, tags, hostname))
+
+            for metric_name, samples in iteritems(metric_samples):
+                self.submit_batch('gauge', "vsphere.{}".format(ensure_unicode(metric_name)), samples)
 
         # ## <TEST-INSTRUMENTATION>
         custom_tags = instance.get('tags', []) + ['instance:{}'.format(i_key)]
@@ -977,6 +1004,7 @@ class VSphereCheck(AgentCheck):
             self.gauge('vsphere.vm.count', vm_count, tags=tags)
 
     def check(self, instance):
+        custom_tags = instance.get('tags', []) + ['instance:{}'.format(self._instance_key(instance))]
         try:
             self.exception_printed = 0
 
@@ -994,6 +1022,7 @@ class VSphereCheck(AgentCheck):
             # Remove old objects that might be gone from the Mor cache
             self.mor_cache.purge(self._instance_key(instance), self.clean_morlist_interval)
             self.stop_pool()
+            self.report_pool('morlist', custom_tags)
 
             # Second part: do the job
             self.start_pool()
@@ -1003,6 +1032,7 @@ class VSphereCheck(AgentCheck):
                 self.set_external_tags(self.get_external_host_tags())
 
             self.stop_pool()
+            self.report_pool('metrics', custom_tags)
 
             if self.exception_printed > 0:
                 self.log.error("One thread in the pool crashed, check the logs")
@@ -55,6 +55,32 @@ def test__init__(instance):
     assert check.excluded_host_tags == []
 
 
+def test_pool_task_timeout(instance):
+    check = VSphereCheck('vsphere', {}, {}, [instance])
+    check.start_pool()
+    assert check.pool.task_timeout is None
+    check.stop_pool()
+
+    check = VSphereCheck('vsphere', {'pool_task_timeout': 120}, {}, [instance])
+    check.start_pool()
+    assert check.pool.task_timeout == 120
+    check.stop_pool()
+
+
+def test_pool_dropped_tasks_warning(instance, aggregator):
+    check = VSphereCheck('vsphere', {'threads_count': 1, 'pool_task_timeout': 0.01}, {}, [instance])
+    check.log = MagicMock()
+    check.start_pool()
+    check.pool.apply_async(time.sleep, args=(0.1,))
+    check.pool.apply_async(int)
+    check.stop_pool()
+    check.report_pool('metrics', [])
+
+    aggregator.assert_metric('datadog.agent.vsphere.pool.tasks.dropped', 1, tags=['phase:metrics'])
+    check.log.warning.assert_called_once()
+    assert check.log.warning.call_args[0][1:] == (1, 'metrics', 0.01)
+
+
 def test_excluded_host_tags(vsphere, instance, aggregator):
     # Check default value and precedence of instance config over init config
     check = VSphereCheck('vsphere', {}, {}, [instance])